@@ -19,14 +19,16 @@ from ultralytics import YOLO
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Depends, HTTPException, status
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.base import BaseHTTPMiddleware
 import uvicorn
 import asyncio
 import logging
 import threading
-from typing import Dict, List, Optional, Tuple
+from collections import deque
+from queue import Empty, Full, Queue
+from typing import Deque, Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 import jwt
@@ -34,10 +36,50 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
+try:
+    import av
+    from av.codec.hwaccel import HWAccel
+    NVDEC_AVAILABLE = True
+except ImportError:
+    NVDEC_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import torch
+    import torch.nn.functional as F
+    CUDA_AVAILABLE = torch.cuda.is_available()
+except ImportError:
+    CUDA_AVAILABLE = False
+
+try:
+    from torchvision.io import encode_jpeg as nvjpeg_encode
+    NVJPEG_AVAILABLE = CUDA_AVAILABLE
+except ImportError:
+    NVJPEG_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Decode video files on the GPU (NVDEC) when PyAV is installed
+HW_DECODE = os.getenv("VIDEO_HW_DECODE", "1") == "1"
+JPEG_QUALITY = 85
+# Baseline, non-optimized JPEG: no extra Huffman pass per frame
+JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY,
+               int(cv2.IMWRITE_JPEG_OPTIMIZE), 0,
+               int(cv2.IMWRITE_JPEG_PROGRESSIVE), 0]
+MJPEG_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+# Resize frames to the model input on the GPU instead of Ultralytics' CPU letterbox
+GPU_PREPROCESS = CUDA_AVAILABLE and os.getenv("YOLO_GPU_PREPROCESS", "1") == "1"
+# Replay captured CUDA graphs of the PyTorch forward (opt-in, needs GPU preprocessing and a .pt model)
+CUDA_GRAPHS = GPU_PREPROCESS and os.getenv("YOLO_CUDA_GRAPHS", "0") == "1"
+GATE_CONFIG_FILE = "gate_config_saved.json"
+
 # Security Configuration
 SECRET_KEY = "your-production-secret-key-change-this-in-production"
 ALGORITHM = "HS256"
@@ -136,7 +178,7 @@ class Person:
     # Guard identification fields
     anchor_entry_time: Optional[float] = None
     total_anchor_time: float = 0.0
-    location_history: Optional[List[Dict]] = None
+    location_history: Optional[Deque[Dict]] = None
     guard_classification_time: Optional[float] = None
 
 @dataclass
@@ -201,17 +243,35 @@ CONFIG = {
     "PERSON_CONFIDENCE": 0.5,
     "GUARD_CONFIDENCE": 0.5,
     "IOU_THRESHOLD": 0.02,
+
+    # Inference
+    "INFER_IMGSZ": 640,           # Model input size when the model does not record one
+    "STREAM_FPS": 30,             # Target output frame rate for /stream and /ws
 }
 
 # Global variables
 model = None
 video_cap = None
+graph_runner = None  # CudaGraphRunner when CUDA_GRAPHS is enabled and capture succeeded
+infer_size: Tuple[int, int] = (CONFIG["INFER_IMGSZ"], CONFIG["INFER_IMGSZ"])  # (height, width) of the model input
+
+# Latest frame as a complete multipart part, shared by every /stream client
+latest_part: Optional[bytes] = None
+frame_event: Optional[asyncio.Event] = None  # Pulsed each time a new frame is published
+# One bounded queue of encoded status messages per /ws client
+status_subscribers: Set[asyncio.Queue] = set()
+producer_task: Optional[asyncio.Task] = None
+
+# Decoded frames handed from the capture thread to the producer
+capture_queue: Queue = Queue(maxsize=2)
+capture_stop = threading.Event()
+capture_thread: Optional[threading.Thread] = None
 current_frame = None
 frame_width = 640
 frame_height = 360
 
 # State management
-state_lock = threading.Lock()
+state_lock = threading.RLock()  # Re-entered by helpers such as update_statistics
 persons: Dict[str, Person] = {}
 groups: Dict[str, Group] = {}
 tickets: Dict[str, Ticket] = {}
@@ -300,21 +360,136 @@ def verify_websocket_token(token: str):
     except jwt.PyJWTError:
         return None
 
+def dumps_json(data) -> bytes:
+    """Encode compact JSON (enums as their values), with orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), default=lambda o: o.value).encode()
+
 def get_gate_config_copy():
     """Thread-safe copy of gate configuration"""
     with gate_config_lock:
         return gate_config.copy()
 
+# Normalized (x, y, width, height) used when an area is missing from the config
+GATE_AREA_DEFAULTS = (("gate_area", (0.3, 0.2, 0.4, 0.6)), ("guard_anchor", (0.1, 0.15, 0.15, 0.7)))
+
+def compile_gate_areas(config: Dict, width: int, height: int) -> np.ndarray:
+    """Gate area and guard anchor as pixel edges [gx1, gy1, gx2, gy2, ax1, ay1, ax2, ay2]"""
+    edges = []
+    for name, (x, y, w, h) in GATE_AREA_DEFAULTS:
+        area = config.get(name, {})
+        x, y = area.get("x", x), area.get("y", y)
+        w, h = area.get("width", w), area.get("height", h)
+        edges += [x * width, y * height, (x + w) * width, (y + h) * height]
+    return np.array(edges, dtype=np.float32)
+
+def recompile_gate_areas():
+    """Refresh the pixel-space gate areas after a config or resolution change"""
+    global gate_areas_px
+    with gate_config_lock:
+        gate_areas_px = compile_gate_areas(gate_config, frame_width, frame_height)
+
 def update_gate_config(new_config):
     """Thread-safe update of gate configuration"""
+    global gate_config_json
     with gate_config_lock:
         gate_config.update(new_config)
+        gate_config_json = dumps_json(gate_config)
+    recompile_gate_areas()
+
+# Pixel-space areas read by process_detections every frame
+gate_areas_px = compile_gate_areas(gate_config, frame_width, frame_height)
+
+# Serialized gate_config, refreshed on update, and the version last written to GATE_CONFIG_FILE
+gate_config_json = dumps_json(gate_config)
+saved_gate_config_json: Optional[bytes] = None
+
+# Overlay corners per frame size, tagged with the area dicts they were computed from;
+# update_gate_config replaces those dicts, so a changed config never matches
+overlay_rects: Dict[Tuple[int, int], Tuple[list, list]] = {}
 
 def get_video_source():
     """Get current video source"""
     with video_source_lock:
         return video_source
 
+class HardwareVideoCapture:
+    """cv2.VideoCapture-compatible file reader that decodes with NVDEC via PyAV"""
+    
+    def __init__(self, path: str):
+        # Falls back to libavcodec software decoding when no CUDA device is present
+        self.container = av.open(path, hwaccel=HWAccel(device_type="cuda", allow_software_fallback=True))
+        self.stream = self.container.streams.video[0]
+        self._frames = self.container.decode(self.stream)
+    
+    def isOpened(self):
+        return self.container is not None
+    
+    def read(self):
+        try:
+            frame = next(self._frames)
+        except (StopIteration, av.error.EOFError):
+            return False, None
+        return True, frame.to_ndarray(format="bgr24")
+    
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.stream.codec_context.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.stream.codec_context.height
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.stream.average_rate or 0)
+        return 0
+    
+    def set(self, prop, value):
+        # Only rewinding is supported, which is all the stream loops need
+        if prop == cv2.CAP_PROP_POS_FRAMES and value == 0:
+            self.container.seek(0)
+            self._frames = self.container.decode(self.stream)
+            return True
+        return False
+    
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+def open_video_file(file_path: str):
+    """Open a video file, decoding on the GPU when available"""
+    if NVDEC_AVAILABLE and HW_DECODE:
+        try:
+            return HardwareVideoCapture(file_path)
+        except Exception as e:
+            logger.warning(f"Hardware decode unavailable for {file_path}, using OpenCV: {e}")
+    return cv2.VideoCapture(file_path)
+
+def open_capture(source: str):
+    """Open a video source string; returns (capture, is_webcam) or (None, False) if invalid"""
+    if source.startswith("webcam:"):
+        # Extract camera index: webcam:0, webcam:1, etc.
+        cam_index = int(source.split(":")[1]) if ":" in source else 0
+        logger.info(f"Opening webcam {cam_index}")
+        return cv2.VideoCapture(cam_index), True
+    if source.startswith("file:"):
+        # Extract file path: file:videoplayback.mp4
+        file_path = source.split(":", 1)[1]
+        if not os.path.isabs(file_path):
+            file_path = os.path.join("..", file_path)
+        logger.info(f"Opening video file: {file_path}")
+        return open_video_file(file_path), False
+    # Default: try as direct path or camera index
+    if os.path.exists(source):
+        logger.info(f"Opening video file: {source}")
+        return open_video_file(source), False
+    try:
+        cam_idx = int(source)
+    except ValueError:
+        logger.error(f"Invalid source format: {source}")
+        return None, False
+    logger.info(f"Opening webcam {cam_idx}")
+    return cv2.VideoCapture(cam_idx), True
+
 def set_video_source(new_source: str):
     """Update video source and reopen capture"""
     global video_cap, frame_width, frame_height, video_source
@@ -328,36 +503,14 @@ def set_video_source(new_source: str):
         
         # Open new source
         try:
-            if new_source.startswith("webcam:"):
-                # Extract camera index: webcam:0, webcam:1, etc.
-                cam_index = int(new_source.split(":")[1]) if ":" in new_source else 0
-                video_cap = cv2.VideoCapture(cam_index)
-                logger.info(f"Opening webcam {cam_index}")
-            elif new_source.startswith("file:"):
-                # Extract file path: file:videoplayback.mp4
-                file_path = new_source.split(":", 1)[1]
-                if not os.path.isabs(file_path):
-                    file_path = os.path.join("..", file_path)
-                video_cap = cv2.VideoCapture(file_path)
-                logger.info(f"Opening video file: {file_path}")
-            else:
-                # Default: try as direct path or camera index
-                if os.path.exists(new_source):
-                    video_cap = cv2.VideoCapture(new_source)
-                    logger.info(f"Opening video file: {new_source}")
-                else:
-                    # Try as camera index
-                    try:
-                        cam_idx = int(new_source)
-                        video_cap = cv2.VideoCapture(cam_idx)
-                        logger.info(f"Opening webcam {cam_idx}")
-                    except ValueError:
-                        logger.error(f"Invalid source format: {new_source}")
-                        return False
+            video_cap, _ = open_capture(new_source)
+            if video_cap is None:
+                return False
             
             if video_cap.isOpened():
                 frame_width = int(video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
                 frame_height = int(video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                recompile_gate_areas()
                 logger.info(f"Video source changed to: {new_source} ({frame_width}x{frame_height})")
                 return True
             else:
@@ -394,6 +547,10 @@ def is_in_area(center: Tuple[float, float], area: Dict) -> bool:
     return (area["x"] <= x <= area["x"] + area["width"] and
             area["y"] <= y <= area["y"] + area["height"])
 
+def in_rect_mask(cx: np.ndarray, cy: np.ndarray, rect: np.ndarray) -> np.ndarray:
+    """Vectorized point-in-rectangle test against [x1, y1, x2, y2] edges"""
+    return (cx >= rect[0]) & (cx <= rect[2]) & (cy >= rect[1]) & (cy <= rect[3])
+
 def detect_groups(current_persons: Dict[str, Person], current_time: float) -> Dict[str, Group]:
     """Detect groups based on spatio-temporal criteria"""
     new_groups = {}
@@ -819,7 +976,7 @@ def identify_guards_by_location():
     for person_id, person in persons.items():
         # Initialize location history if needed
         if person.location_history is None:
-            person.location_history = []
+            person.location_history = deque()
         
         # Record current location
         person.location_history.append({
@@ -828,11 +985,9 @@ def identify_guards_by_location():
             'in_gate': person.in_gate_area
         })
         
-        # Keep only last 10 seconds of history
-        person.location_history = [
-            h for h in person.location_history 
-            if current_time - h['time'] < 10.0
-        ]
+        # Keep only last 10 seconds of history; entries are in time order
+        while current_time - person.location_history[0]['time'] >= 10.0:
+            person.location_history.popleft()
         
         # Track time in guard anchor
         if person.in_guard_anchor:
@@ -886,38 +1041,45 @@ def identify_guards_by_location():
                     person.anchor_entry_time = None
                     person.total_anchor_time = 0.0
 
-def process_detections(detections, gate_config):
-    """Main processing function for detections"""
+def process_detections(detections, gate_areas):
+    """Main processing function for detections; gate_areas comes from compile_gate_areas"""
     current_time = time.time()
     
     with state_lock:
         # Update persons from detections
+        # detections is an (N, 6) array of [x1, y1, x2, y2, conf, cls] in pixels
+        boxes = detections[(detections[:, 5] == 0) & (detections[:, 4] > CONFIG["PERSON_CONFIDENCE"])]
+        centers_x = (boxes[:, 0] + boxes[:, 2]) * 0.5
+        centers_y = (boxes[:, 1] + boxes[:, 3]) * 0.5
+        in_gate = in_rect_mask(centers_x, centers_y, gate_areas[:4])
+        in_anchor = in_rect_mask(centers_x, centers_y, gate_areas[4:])
+        
+        # Person records hold normalized coordinates
+        bboxes = boxes[:, :4] / np.array([frame_width, frame_height, frame_width, frame_height], dtype=np.float32)
+        centers_x /= frame_width
+        centers_y /= frame_height
+        
         current_persons = {}
-        for detection in detections:
-            if detection.get("cls_id") == 0 and detection.get("conf", 0) > CONFIG["PERSON_CONFIDENCE"]:
-                bbox = detection.get("bbox", [0, 0, 0, 0])
-                center_x = (bbox[0] + bbox[2]) / 2 / frame_width
-                center_y = (bbox[1] + bbox[3]) / 2 / frame_height
-                
-                person_id = str(uuid.uuid4())  # In real implementation, use stable ID tracking
-                
-                person = Person(
-                    id=person_id,
-                    bbox=[bbox[0]/frame_width, bbox[1]/frame_height, bbox[2]/frame_width, bbox[3]/frame_height],
-                    center=(center_x, center_y),
-                    confidence=detection.get("conf", 0),
-                    type=PersonType.PERSON,  # Will be updated by guard identification
-                    first_seen=current_time,
-                    last_seen=current_time,
-                    in_gate_area=is_in_area((center_x, center_y), gate_config["gate_area"]),
-                    in_guard_anchor=is_in_area((center_x, center_y), gate_config["guard_anchor"]),
-                    anchor_entry_time=None,
-                    total_anchor_time=0.0,
-                    location_history=None,
-                    guard_classification_time=None
-                )
-                
-                current_persons[person_id] = person
+        for i in range(len(boxes)):
+            person_id = str(uuid.uuid4())  # In real implementation, use stable ID tracking
+            
+            person = Person(
+                id=person_id,
+                bbox=bboxes[i].tolist(),
+                center=(float(centers_x[i]), float(centers_y[i])),
+                confidence=float(boxes[i, 4]),
+                type=PersonType.PERSON,  # Will be updated by guard identification
+                first_seen=current_time,
+                last_seen=current_time,
+                in_gate_area=bool(in_gate[i]),
+                in_guard_anchor=bool(in_anchor[i]),
+                anchor_entry_time=None,
+                total_anchor_time=0.0,
+                location_history=None,
+                guard_classification_time=None
+            )
+            
+            current_persons[person_id] = person
         
         # Calculate persons to remove BEFORE updating
         persons_to_remove = [pid for pid in persons.keys() if pid not in current_persons]
@@ -1038,22 +1200,261 @@ def process_detections(detections, gate_config):
         "timestamp": current_time
     }
 
+def model_input_size(model_path: str) -> Tuple[int, int]:
+    """(height, width) the model was built for; Ultralytics engines record it in a metadata header"""
+    if model_path.endswith(".engine"):
+        try:
+            with open(model_path, "rb") as f:
+                meta_len = int.from_bytes(f.read(4), byteorder="little")
+                imgsz = json.loads(f.read(meta_len).decode())["imgsz"]
+            return (imgsz[0], imgsz[1]) if isinstance(imgsz, list) else (imgsz, imgsz)
+        except (OSError, ValueError, KeyError, TypeError, UnicodeDecodeError) as e:
+            logger.warning(f"No input size in {model_path} metadata, using {CONFIG['INFER_IMGSZ']}: {e}")
+    return CONFIG["INFER_IMGSZ"], CONFIG["INFER_IMGSZ"]
+
+def unletterbox(data: np.ndarray, letterbox) -> np.ndarray:
+    """Map [x1, y1, x2, y2, ...] boxes from the letterboxed model input back to frame pixels"""
+    gain, pad = letterbox
+    data[:, :4] -= pad
+    data[:, :4] /= gain
+    return data
+
+def parse_detections(result, letterbox=None) -> np.ndarray:
+    """Convert one Ultralytics result into an (N, 6) [x1, y1, x2, y2, conf, cls] array"""
+    if result.boxes is None:
+        return np.empty((0, 6), dtype=np.float32)
+    data = result.boxes.data.cpu().numpy()
+    if letterbox is not None:
+        unletterbox(data, letterbox)
+    return data
+
+def preprocess_batch(frames):
+    """Letterbox same-size BGR frames to the model input on the GPU; returns (batch, (gain, pad))"""
+    height, width = frames[0].shape[:2]
+    in_height, in_width = infer_size
+    # Scale to fit and pad the rest, as Ultralytics does, so the aspect ratio is kept
+    gain = min(in_height / height, in_width / width)
+    new_height, new_width = round(height * gain), round(width * gain)
+    top, left = (in_height - new_height) // 2, (in_width - new_width) // 2
+    
+    batch = torch.from_numpy(np.stack(frames)).to("cuda")
+    # BGR NHWC uint8 -> RGB NCHW float in [0, 1], the layout Ultralytics takes as-is
+    batch = batch.flip(-1).permute(0, 3, 1, 2).float().div_(255)
+    batch = F.interpolate(batch, size=(new_height, new_width), mode="bilinear", align_corners=False)
+    batch = F.pad(batch, (left, in_width - new_width - left, top, in_height - new_height - top), value=114 / 255)
+    return batch, (gain, np.array([left, top, left, top], dtype=np.float32))
+
+class CudaGraphRunner:
+    """Replays a CUDA graph of the detector forward captured once per fixed batch size"""
+    
+    def __init__(self, net, imgsz: Tuple[int, int], batch_sizes=(1,)):
+        from ultralytics.utils import ops
+        self.nms = ops.non_max_suppression
+        self.graphs = {}
+        dtype = next(net.parameters()).dtype
+        
+        # Warm up and capture on a side stream, as torch.cuda.graph requires
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream), torch.no_grad():
+            for batch_size in batch_sizes:
+                static_in = torch.zeros((batch_size, 3, *imgsz), device="cuda", dtype=dtype)
+                for _ in range(3):
+                    net(static_in)
+                graph = torch.cuda.CUDAGraph()
+                with torch.cuda.graph(graph):
+                    static_out = net(static_in)
+                # Eval forward returns (predictions, feature maps); NMS only needs the first
+                if isinstance(static_out, (list, tuple)):
+                    static_out = static_out[0]
+                self.graphs[batch_size] = (graph, static_in, static_out)
+        torch.cuda.current_stream().wait_stream(stream)
+        self.max_batch = max(batch_sizes)
+    
+    def detect(self, batch) -> List[np.ndarray]:
+        """Run a preprocessed batch; returns one (N, 6) array per frame in model-input pixels"""
+        count = batch.shape[0]
+        # Pad up to the smallest captured batch that fits
+        graph, static_in, static_out = self.graphs[min(size for size in self.graphs if size >= count)]
+        static_in[:count].copy_(batch)
+        graph.replay()
+        # Same thresholds as Ultralytics' predictor defaults
+        return [det.cpu().numpy() for det in self.nms(static_out[:count], conf_thres=0.25, iou_thres=0.7)]
+
+def build_graph_runner(yolo) -> Optional[CudaGraphRunner]:
+    """Capture CUDA graphs for a PyTorch YOLO model, or None if that is not possible"""
+    try:
+        net = yolo.model.fuse().to("cuda").eval()
+        return CudaGraphRunner(net, infer_size)
+    except Exception as e:
+        logger.warning(f"CUDA graph capture unavailable, using eager inference: {e}")
+        return None
+
+def run_model(frames) -> List[np.ndarray]:
+    """Run one batched model call; returns one (N, 6) detection array per frame"""
+    if GPU_PREPROCESS and all(frame.shape == frames[0].shape for frame in frames):
+        batch, letterbox = preprocess_batch(frames)
+        if graph_runner is not None and len(frames) <= graph_runner.max_batch:
+            return [unletterbox(data, letterbox) for data in graph_runner.detect(batch)]
+        return [parse_detections(result, letterbox) for result in model(batch, verbose=False)]
+    return [parse_detections(result) for result in model(frames, imgsz=infer_size, verbose=False)]
+
+def process_frame(frame) -> Tuple[Dict, Optional[bytes]]:
+    """Infer, update gate state, draw overlays and encode one frame; returns (status, JPEG bytes)"""
+    detections = run_model([frame])[0]
+    gate_config_copy = get_gate_config_copy()
+    status = process_detections(detections, gate_areas_px)
+    
+    if gate_config_copy.get("enabled", True):
+        frame = draw_gate_overlay(frame, gate_config_copy)
+    return status, encode_jpeg(frame)
+
+def read_frame(cap, rewind: bool):
+    """Read a frame, rewinding a file source once when it reaches the end"""
+    ret, frame = cap.read()
+    if not ret and rewind:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        ret, frame = cap.read()
+        if not ret:
+            raise RuntimeError("Video file returned no frames after rewinding")
+    return ret, frame
+
+def render_stream_frame(cap, rewind: bool) -> Tuple[bool, Optional[bytes]]:
+    """Read, overlay and encode one frame of a per-request stream; returns (read ok, multipart part)"""
+    ret, frame = read_frame(cap, rewind)
+    if not ret:
+        return False, None
+    
+    gate_config_copy = get_gate_config_copy()
+    if gate_config_copy.get("enabled", True):
+        frame = draw_gate_overlay(frame, gate_config_copy)
+    frame_bytes = encode_jpeg(frame)
+    return True, mjpeg_part(frame_bytes) if frame_bytes else None
+
+class FramePacer:
+    """Schedules frames on a fixed timeline so processing time counts against the frame interval"""
+    
+    def __init__(self, fps: float):
+        self.interval = 1.0 / fps
+        self.reset()
+    
+    def reset(self):
+        self.start = time.monotonic()
+        self.frames = 0
+    
+    async def wait(self):
+        self.frames += 1
+        delay = self.start + self.frames * self.interval - time.monotonic()
+        if delay < -1.0:
+            # Over a second behind: restart the timeline instead of bursting to catch up
+            self.reset()
+        await asyncio.sleep(max(0.0, delay))
+
+def capture_loop():
+    """Read the configured source on a dedicated thread and hand frames to the producer"""
+    while not capture_stop.is_set():
+        try:
+            # Read under the lock so set_video_source cannot release the capture mid-read
+            with video_source_lock:
+                cap = video_cap
+                is_file = video_source.startswith("file:")
+                available = cap is not None and cap.isOpened()
+                if available:
+                    # Files rewind at the end; a webcam that drops a frame is retried
+                    ret, frame = read_frame(cap, rewind=is_file)
+        except Exception as e:
+            logger.error(f"Error reading video source: {e}")
+            capture_stop.wait(1)
+            continue
+        
+        if not available:
+            logger.warning("Video capture not available, waiting...")
+            capture_stop.wait(1)
+            continue
+        if not ret:
+            capture_stop.wait(0.1)
+            continue
+        
+        if is_file:
+            # Files wait for the producer so playback is not skipped
+            while not capture_stop.is_set():
+                try:
+                    capture_queue.put(frame, timeout=0.5)
+                    break
+                except Full:
+                    continue
+        else:
+            # Live sources drop the oldest frame to keep latency bounded
+            try:
+                capture_queue.get_nowait()
+            except Empty:
+                pass
+            try:
+                capture_queue.put_nowait(frame)
+            except Full:
+                pass
+
+async def frame_producer():
+    """Decode, infer and encode each frame once, then publish it to all clients"""
+    global latest_part
+    loop = asyncio.get_running_loop()
+    pacer = FramePacer(CONFIG["STREAM_FPS"])
+    
+    while True:
+        try:
+            try:
+                frame = await loop.run_in_executor(None, capture_queue.get, True, 1.0)
+            except Empty:
+                continue
+            
+            # The whole per-frame pipeline runs in the threadpool, off the event loop
+            status, frame_bytes = await loop.run_in_executor(None, process_frame, frame)
+            if frame_bytes:
+                latest_part = mjpeg_part(frame_bytes)
+            
+            # Wake every waiting stream, then re-arm for the next frame
+            frame_event.set()
+            frame_event.clear()
+            
+            # Encode the status once for all WebSocket clients (and not at all without any);
+            # a slow client drops its oldest message
+            if status_subscribers:
+                message = dumps_json(status).decode()
+                for subscriber in status_subscribers:
+                    if subscriber.full():
+                        subscriber.get_nowait()
+                    subscriber.put_nowait(message)
+            
+            await pacer.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in frame producer: {e}")
+            await asyncio.sleep(1)
+
 # Rest of the FastAPI endpoints remain the same...
 # (continuing with the existing endpoints)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize the system on startup"""
-    global model, video_cap, frame_width, frame_height
+    global model, video_cap, frame_width, frame_height, frame_event, producer_task
+    global capture_thread, graph_runner, infer_size
     
     logger.info("Starting Advanced Body Checking System...")
+    frame_event = asyncio.Event()
     
-    # Load model
-    model_path = "../weight.pt"
+    # Load model, preferring the INT8 TensorRT engine built by export_optimized_model.py
+    model_path = "../weight.engine" if os.path.exists("../weight.engine") else "../weight.pt"
     if os.path.exists(model_path):
         logger.info(f"Loading model from {model_path}")
-        model = YOLO(model_path)
+        model = YOLO(model_path, task="detect")
+        # Static TensorRT engines only accept the input size they were exported with
+        infer_size = model_input_size(model_path)
         logger.info("Model loaded successfully")
+        # TensorRT engines have no PyTorch graph to capture
+        if CUDA_GRAPHS and model_path.endswith(".pt"):
+            graph_runner = await asyncio.to_thread(build_graph_runner, model)
     else:
         logger.error(f"Model file not found: {model_path}")
         return
@@ -1066,20 +1467,37 @@ async def startup_event():
         logger.error(f"Failed to initialize video source: {default_source}")
         return
     
+    capture_stop.clear()
+    capture_thread = threading.Thread(target=capture_loop, name="video-capture", daemon=True)
+    capture_thread.start()
+    producer_task = asyncio.create_task(frame_producer())
+    
     logger.info("System initialized successfully!")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     global video_cap
+    capture_stop.set()
+    if capture_thread:
+        capture_thread.join(timeout=2)
+    if producer_task:
+        producer_task.cancel()
     if video_cap:
         video_cap.release()
     logger.info("System shutdown complete")
 
+# Encoded /health body, rebuilt at most once per second
+_health_cache = {"body": b"", "timestamp": 0.0}
+
 @app.get("/health")
 async def health_check():
     """Public health check endpoint - minimal info only"""
-    return {"status": "healthy", "timestamp": time.time()}
+    now = time.time()
+    if now - _health_cache["timestamp"] > 1.0:
+        _health_cache["body"] = dumps_json({"status": "healthy", "timestamp": now})
+        _health_cache["timestamp"] = now
+    return Response(_health_cache["body"], media_type="application/json")
 
 @app.get("/internal/health")
 @limiter.limit("30/minute")
@@ -1129,59 +1547,19 @@ async def websocket_endpoint(websocket: WebSocket):
     
     logger.info(f"WebSocket connection established for user: {username}")
     
+    subscriber = asyncio.Queue(maxsize=2)
+    status_subscribers.add(subscriber)
     try:
         while True:
-            # Read frame from configured source
-            with video_source_lock:
-                current_source = video_source
-                cap = video_cap
-            
-            if not cap or not cap.isOpened():
-                logger.warning("Video capture not available, waiting...")
-                await asyncio.sleep(1)
-                continue
-            
-            ret, frame = cap.read()
-            if not ret:
-                # Check if it's a file (can restart) or webcam (wait)
-                if current_source.startswith("file:"):
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    continue
-                else:
-                    # Webcam - wait and retry
-                    await asyncio.sleep(0.1)
-                    continue
-            
-            # Run inference
-            results = model(frame, verbose=False)
-            
-            # Process detections
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        detection = {
-                            "cls_id": int(box.cls[0]),
-                            "conf": float(box.conf[0]),
-                            "bbox": box.xyxy[0].tolist()
-                        }
-                        detections.append(detection)
-            
-            # Process with advanced system
-            gate_config_copy = get_gate_config_copy()
-            status = process_detections(detections, gate_config_copy)
-            
-            # Send status
-            await websocket.send_json(status)
-            
-            # Small delay to prevent overwhelming
-            await asyncio.sleep(0.1)
+            # Send each status the producer publishes
+            await websocket.send_text(await subscriber.get())
             
     except WebSocketDisconnect:
         logger.info(f"WebSocket closed by client: {username}")
     except Exception as e:
         logger.error(f"Error in WebSocket loop for {username}: {e}")
+    finally:
+        status_subscribers.discard(subscriber)
 
 @app.get("/stream")
 @limiter.limit("30/minute")
@@ -1198,98 +1576,93 @@ async def stream_video(request: Request, source: str = None, user: Optional[str]
     if not source:
         source = get_video_source()
     
-    def generate_frames():
+    async def stream_shared_frames():
+        while True:
+            await frame_event.wait()
+            if latest_part is None:
+                continue
+            yield latest_part
+    
+    # The configured source is already decoded and encoded once by the producer
+    if producer_task is not None and source == get_video_source():
+        return StreamingResponse(stream_shared_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+    
+    async def generate_frames():
         local_cap = None
-        is_webcam = False
         
         try:
-            # Parse source parameter
-            if source.startswith("webcam:"):
-                # Extract camera index: webcam:0, webcam:1, etc.
-                cam_index = int(source.split(":")[1]) if ":" in source else 0
-                local_cap = cv2.VideoCapture(cam_index)
-                is_webcam = True
-                logger.debug(f"Stream: Opening webcam {cam_index}")
-            elif source.startswith("file:"):
-                # Extract file path: file:videoplayback.mp4
-                file_path = source.split(":", 1)[1]
-                if not os.path.isabs(file_path):
-                    file_path = os.path.join("..", file_path)
-                local_cap = cv2.VideoCapture(file_path)
-                is_webcam = False
-                logger.debug(f"Stream: Opening video file: {file_path}")
-            else:
-                # Default: try as file path
-                if os.path.exists(source):
-                    local_cap = cv2.VideoCapture(source)
-                    is_webcam = False
-                else:
-                    # Try as camera index
-                    try:
-                        cam_idx = int(source)
-                        local_cap = cv2.VideoCapture(cam_idx)
-                        is_webcam = True
-                    except ValueError:
-                        logger.error(f"Invalid source format: {source}")
-                        return
+            # Connecting to an unreachable source blocks until the capture times out
+            local_cap, is_webcam = await asyncio.to_thread(open_capture, source)
             
             if not local_cap or not local_cap.isOpened():
                 logger.error(f"Failed to open source: {source}")
                 return
             
+            pacer = FramePacer(CONFIG["STREAM_FPS"])
             while True:
-                ret, frame = local_cap.read()
+                # Decode, overlay and encode run off the event loop; files rewind at the end
+                ret, part = await asyncio.to_thread(render_stream_frame, local_cap, not is_webcam)
                 if not ret:
-                    if is_webcam:
-                        # For webcam, wait a bit and try again
-                        time.sleep(0.1)
-                        continue
-                    else:
-                        # For video file, restart from beginning
-                        local_cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                        continue
-                
-                # Draw gate overlays
-                gate_config_copy = get_gate_config_copy()
-                if gate_config_copy.get("enabled", True):
-                    frame = draw_gate_overlay(frame, gate_config_copy)
+                    # For webcam, wait a bit and try again
+                    await asyncio.sleep(0.1)
+                    continue
                 
-                # Encode frame
-                ret, buffer = cv2.imencode('.jpg', frame)
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                if part:
+                    yield part
+                await pacer.wait()
         finally:
-            # Don't close - keep stream alive
-            # local_cap will be released when generator exits
-            pass
+            # Generator exits when the client disconnects
+            if local_cap:
+                await asyncio.to_thread(local_cap.release)
     
     return StreamingResponse(generate_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
 
+def mjpeg_part(frame_bytes: bytes) -> bytes:
+    """Wrap a JPEG as one multipart/x-mixed-replace part, copying it once"""
+    return b''.join((MJPEG_PART_HEADER, frame_bytes, b'\r\n'))
+
+def encode_jpeg(frame) -> Optional[bytes]:
+    """JPEG-encode a BGR frame on the GPU with NVJPEG, falling back to OpenCV"""
+    global NVJPEG_AVAILABLE
+    if NVJPEG_AVAILABLE:
+        try:
+            # BGR HWC -> RGB CHW on the device; needs torchvision >= 0.19 for CUDA encoding
+            tensor = torch.from_numpy(frame).to("cuda").flip(-1).permute(2, 0, 1).contiguous()
+            return nvjpeg_encode(tensor, quality=JPEG_QUALITY).cpu().numpy().tobytes()
+        except Exception as e:
+            logger.warning(f"NVJPEG encode failed, using OpenCV: {e}")
+            NVJPEG_AVAILABLE = False
+    ret, buffer = cv2.imencode('.jpg', frame, JPEG_PARAMS)
+    return buffer.tobytes() if ret else None
+
+def gate_overlay_rects(gate_config, width, height):
+    """Pixel corners ((x1, y1), (x2, y2)) of the gate area and guard anchor, cached per frame size"""
+    areas = [gate_config.get(name) for name, _ in GATE_AREA_DEFAULTS]
+    cached = overlay_rects.get((width, height))
+    if cached and all(a is b for a, b in zip(cached[0], areas)):
+        return cached[1]
+    
+    rects = []
+    for area, (_, (x, y, w, h)) in zip(areas, GATE_AREA_DEFAULTS):
+        area = area or {}
+        x, y = area.get("x", x), area.get("y", y)
+        w, h = area.get("width", w), area.get("height", h)
+        rects.append(((int(x * width), int(y * height)), (int((x + w) * width), int((y + h) * height))))
+    overlay_rects[(width, height)] = (areas, rects)
+    return rects
+
 def draw_gate_overlay(frame, gate_config):
     """Draw gate area and guard anchor overlays"""
     height, width = frame.shape[:2]
+    (gate_tl, gate_br), (anchor_tl, anchor_br) = gate_overlay_rects(gate_config, width, height)
     
     # Gate Area
-    gate_area = gate_config.get("gate_area", {})
-    x1 = int(gate_area.get("x", 0.3) * width)
-    y1 = int(gate_area.get("y", 0.2) * height)
-    x2 = int((gate_area.get("x", 0.3) + gate_area.get("width", 0.4)) * width)
-    y2 = int((gate_area.get("y", 0.2) + gate_area.get("height", 0.6)) * height)
-    
-    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
-    cv2.putText(frame, "GATE AREA", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    cv2.rectangle(frame, gate_tl, gate_br, (0, 255, 0), 3)
+    cv2.putText(frame, "GATE AREA", (gate_tl[0], gate_tl[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
     
     # Guard Anchor
-    guard_anchor = gate_config.get("guard_anchor", {})
-    x1 = int(guard_anchor.get("x", 0.1) * width)
-    y1 = int(guard_anchor.get("y", 0.15) * height)
-    x2 = int((guard_anchor.get("x", 0.1) + guard_anchor.get("width", 0.15)) * width)
-    y2 = int((guard_anchor.get("y", 0.15) + guard_anchor.get("height", 0.7)) * height)
-    
-    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-    cv2.putText(frame, "GUARD ANCHOR", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    cv2.rectangle(frame, anchor_tl, anchor_br, (0, 0, 255), 3)
+    cv2.putText(frame, "GUARD ANCHOR", (anchor_tl[0], anchor_tl[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
     
     return frame
 
@@ -1309,16 +1682,25 @@ async def update_gate_config_endpoint(request: Request, user: str = Depends(requ
 @app.get("/config/gate")
 async def get_gate_config_endpoint(user: str = Depends(verify_token)):
     """Get current gate configuration"""
-    return {"config": get_gate_config_copy()}
+    return Response(b'{"config":' + gate_config_json + b'}', media_type="application/json")
 
 @app.post("/config/gate/save")
 @limiter.limit("30/minute")
 async def save_gate_config(request: Request, user: str = Depends(require_role("admin"))):
     """Save current gate configuration to file - admin only"""
+    global saved_gate_config_json
     try:
-        config = get_gate_config_copy()
-        with open("gate_config_saved.json", "w") as f:
-            json.dump(config, f, indent=2)
+        with gate_config_lock:
+            config = gate_config.copy()
+            config_json = gate_config_json
+        
+        # Skip the write when the file already holds this config
+        if config_json != saved_gate_config_json or not os.path.exists(GATE_CONFIG_FILE):
+            tmp_file = GATE_CONFIG_FILE + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(config, f, indent=2)
+            os.replace(tmp_file, GATE_CONFIG_FILE)
+            saved_gate_config_json = config_json
         log_admin_action("CONFIG_SAVE", user, {"config": config})
         return {"status": "saved", "config": config}
     except Exception as e:
@@ -1330,8 +1712,8 @@ async def save_gate_config(request: Request, user: str = Depends(require_role("a
 async def load_gate_config(request: Request, user: str = Depends(require_role("admin"))):
     """Load gate configuration from file - admin only"""
     try:
-        if os.path.exists("gate_config_saved.json"):
-            with open("gate_config_saved.json", "r") as f:
+        if os.path.exists(GATE_CONFIG_FILE):
+            with open(GATE_CONFIG_FILE, "r") as f:
                 config = json.load(f)
             update_gate_config(config)
             log_admin_action("CONFIG_LOAD", user, {"config": config})
@@ -1438,4 +1820,6 @@ async def cancel_ticket(request: Request, ticket_id: str, user: str = Depends(re
         return {"status": "error", "message": str(e)}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002)
+    # Single worker: the model, capture and producer are process singletons.
+    # loop="auto" picks uvloop where it is installed (not on Windows).
+    uvicorn.run(app, host="0.0.0.0", port=8002, loop="auto", http="httptools", ws="websockets")
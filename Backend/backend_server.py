@@ -9,12 +9,17 @@ from fastapi.staticfiles import StaticFiles
 import uvicorn
 import logging
 import os
+import importlib.util
 from pathlib import Path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Only check that the gate checker is installed; importing it pulls in the
+# detection stack, which this mock server never uses
+GATE_CHECKER_AVAILABLE = importlib.util.find_spec("gate_sop_checker") is not None
+
 app = FastAPI(title="Verolux Backend", version="1.0.0")
 
 # CORS middleware
@@ -107,6 +112,11 @@ async def websocket_gate_check(websocket: WebSocket):
     """WebSocket endpoint for gate checks"""
     await websocket.accept()
     
+    if not GATE_CHECKER_AVAILABLE:
+        await websocket.send_json({"type": "error", "message": "Gate checker not available"})
+        await websocket.close(code=1011)
+        return
+    
     try:
         while True:
             # Send mock gate check data
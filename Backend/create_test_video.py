@@ -23,14 +23,14 @@ def create_test_video():
     
     print(f"Creating test video: {width}x{height}, {fps} FPS, {duration}s")
     
+    # Background gradient is the same for every frame, so build it once
+    rows = (50 + np.arange(height) / height * 100).astype(np.uint8)
+    background = np.repeat(rows[:, None, None], width * 3).reshape(height, width, 3)
+    frame = np.empty_like(background)
+    
     for frame_num in range(total_frames):
-        # Create frame
-        frame = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        # Add background gradient
-        for y in range(height):
-            color_value = int(50 + (y / height) * 100)
-            frame[y, :] = [color_value, color_value, color_value]
+        # Start from the background gradient
+        np.copyto(frame, background)
         
         # Add moving rectangle (simulating a person)
         rect_x = int((frame_num / total_frames) * (width - 100))
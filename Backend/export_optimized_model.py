@@ -9,7 +9,39 @@ import sys
 import argparse
 from pathlib import Path
 
-def export_tensorrt_int8(model_path: str, output_dir: str = "models"):
+def build_calibration_dataset(video_path: str, names: dict, output_dir: str, num_frames: int = 200) -> str:
+    """Sample frames from a video into a dataset YAML for INT8 calibration"""
+    import cv2
+    
+    images_dir = Path(output_dir) / "calibration" / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or num_frames
+    step = max(1, total // num_frames)
+    saved = 0
+    for index in range(0, total, step):
+        if saved >= num_frames:
+            break
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = cap.read()
+        if not ret:
+            break
+        cv2.imwrite(str(images_dir / f"frame_{saved:04d}.jpg"), frame)
+        saved += 1
+    cap.release()
+    
+    yaml_path = Path(output_dir) / "calibration" / "calib.yaml"
+    lines = [f"path: {images_dir.parent.resolve()}", "train: images", "val: images", "names:"]
+    lines += [f"  {cls_id}: {name}" for cls_id, name in names.items()]
+    yaml_path.write_text("\n".join(lines) + "\n")
+    
+    print(f"🎞️  Calibration set: {saved} frames from {video_path}")
+    return str(yaml_path)
+
+
+def export_tensorrt_int8(model_path: str, output_dir: str = "models", calib_video: str = None,
+                         imgsz: int = 640, batch: int = 1):
     """Export to TensorRT INT8 (fastest, requires calibration)"""
     try:
         from ultralytics import YOLO
@@ -17,6 +49,9 @@ def export_tensorrt_int8(model_path: str, output_dir: str = "models"):
         print(f"🚀 Loading model: {model_path}")
         model = YOLO(model_path)
         
+        # Calibrate on frames from the deployment video instead of the default dataset
+        calib_data = build_calibration_dataset(calib_video, model.names, output_dir) if calib_video else None
+        
         print("📦 Exporting to TensorRT INT8...")
         export_path = model.export(
             format='engine',        # TensorRT
@@ -24,10 +59,12 @@ def export_tensorrt_int8(model_path: str, output_dir: str = "models"):
             int8=True,              # Enable INT8 quantization
             workspace=4,            # GPU memory in GB
             verbose=True,
-            batch=1,
-            imgsz=416,              # Optimized size for 30 FPS
+            batch=batch,            # Max batch when dynamic
+            dynamic=batch > 1,      # Accept any batch up to `batch`
+            imgsz=imgsz,            # Must match the server's INFER_IMGSZ
             simplify=True,
-            device=0                # GPU 0
+            device=0,               # GPU 0
+            **({"data": calib_data} if calib_data else {})
         )
         
         print(f"✅ INT8 TensorRT model exported: {export_path}")
@@ -37,10 +74,10 @@ def export_tensorrt_int8(model_path: str, output_dir: str = "models"):
     except Exception as e:
         print(f"❌ INT8 export failed: {e}")
         print("   Trying FP16 instead...")
-        return export_tensorrt_fp16(model_path, output_dir)
+        return export_tensorrt_fp16(model_path, output_dir, imgsz)
 
 
-def export_tensorrt_fp16(model_path: str, output_dir: str = "models"):
+def export_tensorrt_fp16(model_path: str, output_dir: str = "models", imgsz: int = 640):
     """Export to TensorRT FP16 (fast, no calibration needed)"""
     try:
         from ultralytics import YOLO
@@ -56,7 +93,7 @@ def export_tensorrt_fp16(model_path: str, output_dir: str = "models"):
             workspace=4,
             verbose=True,
             batch=1,
-            imgsz=416,
+            imgsz=imgsz,
             simplify=True,
             device=0
         )
@@ -157,6 +194,25 @@ def main():
         help='Output directory'
     )
     
+    parser.add_argument(
+        '--calib-video',
+        type=str,
+        default=None,
+        help='Video to sample INT8 calibration frames from'
+    )
+    parser.add_argument(
+        '--imgsz',
+        type=int,
+        default=640,
+        help='TensorRT engine input size (the server reads it from the engine)'
+    )
+    parser.add_argument(
+        '--batch',
+        type=int,
+        default=1,
+        help='INT8 engine max batch size (dynamic when > 1)'
+    )
+    
     args = parser.parse_args()
     
     # Check if model exists
@@ -179,11 +235,11 @@ def main():
     
     # Export based on format
     if args.format == 'int8' or args.format == 'all':
-        export_tensorrt_int8(args.model, args.output_dir)
+        export_tensorrt_int8(args.model, args.output_dir, args.calib_video, args.imgsz, args.batch)
         print()
     
     if args.format == 'fp16' or args.format == 'all':
-        export_tensorrt_fp16(args.model, args.output_dir)
+        export_tensorrt_fp16(args.model, args.output_dir, args.imgsz)
         print()
     
     if args.format == 'onnx' or args.format == 'all':
@@ -203,6 +259,9 @@ def main():
     print("   2. Restart backend_server.py")
     print("   3. Monitor FPS improvement in WebSocket responses")
     print()
+    print("   advanced_body_checking.py loads ../weight.engine automatically; build it with:")
+    print("   --model ../weight.pt --format int8 --calib-video ../videoplayback.mp4 --imgsz 640")
+    print()
 
 
 if __name__ == "__main__":
@@ -184,10 +184,11 @@ class MultiCameraSyncManager:
             if results and len(results):
                 r0 = results[0]
                 if hasattr(r0, 'boxes') and r0.boxes is not None:
-                    for b in r0.boxes:
+                    names = r0.names if isinstance(getattr(r0, 'names', None), dict) else {}
+                    # One device-to-host copy for all boxes: rows of [x1, y1, x2, y2, conf, cls]
+                    for row in r0.boxes.data.cpu().numpy().tolist():
                         # Get coordinates
-                        xyxy = b.xyxy[0].tolist() if hasattr(b, "xyxy") else b[:4].tolist()
-                        x1, y1, x2, y2 = map(int, xyxy)
+                        x1, y1, x2, y2 = map(int, row[:4])
                         
                         # Clamp to frame bounds
                         x1 = max(0, min(x1, w-1))
@@ -196,14 +197,11 @@ class MultiCameraSyncManager:
                         y2 = max(y1, min(y2, h-1))
                         
                         # Get class and confidence
-                        cls_id = int(b.cls[0].item()) if hasattr(b, "cls") else 0
-                        conf = float(b.conf[0].item()) if hasattr(b, "conf") else 0.0
+                        cls_id = int(row[5])
+                        conf = float(row[4])
                         
                         # Get class name
-                        if hasattr(r0, 'names') and r0.names:
-                            name = r0.names[cls_id] if isinstance(r0.names, dict) and cls_id in r0.names else "person"
-                        else:
-                            name = "person"
+                        name = names.get(cls_id, "person")
                         
                         # Only include person detections
                         if name.lower() == "person" and conf > 0.35:
@@ -5,18 +5,389 @@ Comprehensive analytics and reporting
 """
 
 import os
+import csv
+import math
+import io
 import json
+import time
+import asyncio
+import hashlib
+import inspect
+import logging
 import sqlite3
-import pandas as pd
+import uuid
+import threading
+import functools
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Tuple
 from dataclasses import dataclass
+from contextlib import contextmanager
 import numpy as np
-from collections import defaultdict, Counter
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Response, BackgroundTasks, Depends
+from fastapi.responses import FileResponse, StreamingResponse
 import uvicorn
 
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Preceding same-length windows used as the anomaly detection baseline; windows
+# of up to a day are compared with the same hours on each of the previous days
+ANOMALY_HISTORY_WINDOWS = 7
+
+# Seconds between background rollup refreshes and Parquet flushes
+MAINTENANCE_INTERVAL = 60
+
+# Report result cache: rolling windows expire quickly, windows that closed
+# more than CLOSED_WINDOW_GRACE ago no longer change and are kept longer
+REPORT_CACHE_TTL = 60
+CLOSED_WINDOW_CACHE_TTL = 3600
+CLOSED_WINDOW_GRACE = timedelta(minutes=5)
+REPORT_CACHE_MAXSIZE = 1024
+
+# Rows fetched from SQLite per batch when streaming exports
+EXPORT_BATCH_SIZE = 1000
+
+# Rows copied from SQLite to Parquet per chunk during a flush
+PARQUET_FLUSH_BATCH_SIZE = 50000
+
+# Longest time window a report endpoint accepts
+MAX_REPORT_WINDOW = timedelta(days=366)
+
+# Finished report jobs kept for polling before the oldest are dropped
+REPORT_JOB_MAXSIZE = 256
+
+# SQLite page cache per report connection (negative = KiB)
+SQLITE_CACHE_SIZE = -65536
+
+# Report queries live at module level so every call sends identical SQL text,
+# which sqlite3's per-connection statement cache can reuse without re-parsing
+_Q_OBJECT_COUNTS = '''
+    SELECT object_class, COUNT(*) as count
+    FROM detection_events 
+    WHERE timestamp BETWEEN ? AND ?
+    GROUP BY object_class
+'''
+
+_Q_OBJECT_COUNTS_BY_CAMERA = '''
+    SELECT object_class, COUNT(*) as count
+    FROM detection_events 
+    WHERE timestamp BETWEEN ? AND ?
+    AND camera_id = ?
+    GROUP BY object_class
+'''
+
+_Q_ZONE_OCCUPANCY = '''
+    SELECT timestamp, object_count, duration
+    FROM zone_events 
+    WHERE zone_id = ? AND timestamp BETWEEN ? AND ?
+    AND event_type = 'occupancy'
+    ORDER BY timestamp
+'''
+
+# Rollup-backed queries read whole hours from detection_rollup_hourly and
+# only the partial hours at either end of the window from detection_events.
+# Parameters per source: rollup [full_start, full_end), raw [start, full_start)
+# and raw [full_end, end].
+_Q_PEAK_TRAFFIC = '''
+    SELECT 
+        hour_of_day,
+        SUM(n) as detection_count
+    FROM (
+        SELECT hour_of_day, count AS n
+        FROM detection_rollup_hourly
+        WHERE camera_id = ? AND bucket_start >= ? AND bucket_start < ?
+        UNION ALL
+        SELECT hour_of_day, 1 AS n
+        FROM detection_events
+        WHERE camera_id = ? AND timestamp >= ? AND timestamp < ?
+        UNION ALL
+        SELECT hour_of_day, 1 AS n
+        FROM detection_events
+        WHERE camera_id = ? AND timestamp >= ? AND timestamp <= ?
+    )
+    GROUP BY hour_of_day
+    ORDER BY detection_count DESC
+'''
+
+_Q_SHIFT_TOTALS = '''
+    SELECT 
+        CASE 
+            WHEN hour_of_day BETWEEN 6 AND 14 THEN 'morning'
+            WHEN hour_of_day BETWEEN 14 AND 22 THEN 'afternoon'
+            ELSE 'night'
+        END as shift,
+        object_class,
+        SUM(n) as count
+    FROM (
+        SELECT hour_of_day, object_class, count AS n
+        FROM detection_rollup_hourly
+        WHERE bucket_start >= ? AND bucket_start < ?
+        UNION ALL
+        SELECT hour_of_day, object_class, 1 AS n
+        FROM detection_events
+        WHERE timestamp >= ? AND timestamp < ?
+        UNION ALL
+        SELECT hour_of_day, object_class, 1 AS n
+        FROM detection_events
+        WHERE timestamp >= ? AND timestamp <= ?
+    )
+    GROUP BY shift, object_class
+'''
+
+_Q_ROLLUP_HOURLY = '''
+    INSERT INTO detection_rollup_hourly
+        (bucket_start, camera_id, object_class, hour_of_day, count, sum_conf)
+    SELECT 
+        strftime('%Y-%m-%d %H:00:00', timestamp),
+        camera_id,
+        object_class,
+        hour_of_day,
+        COUNT(*),
+        SUM(confidence)
+    FROM detection_events
+    WHERE id > ? AND id <= ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT (bucket_start, camera_id, object_class) DO UPDATE SET
+        count = count + excluded.count,
+        sum_conf = sum_conf + excluded.sum_conf
+'''
+
+# Upsert of deltas counted in memory by _IngestAggregator
+_Q_ROLLUP_APPLY = '''
+    INSERT INTO detection_rollup_hourly
+        (bucket_start, camera_id, object_class, hour_of_day, count, sum_conf)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (bucket_start, camera_id, object_class) DO UPDATE SET
+        count = count + excluded.count,
+        sum_conf = sum_conf + excluded.sum_conf
+'''
+
+# Object classes counted as PPE in the compliance report
+PPE_CLASSES = ('helmet', 'vest', 'safety_glasses', 'gloves')
+
+# One idx_det_class_ts range lookup per PPE class instead of a window scan
+_Q_PPE_DETECTIONS = f'''
+    WITH ppe(object_class) AS (VALUES {", ".join("(?)" for _ in PPE_CLASSES)})
+    SELECT 
+        d.object_class,
+        COUNT(*) as count,
+        AVG(d.confidence) as avg_confidence
+    FROM ppe
+    JOIN detection_events d ON d.object_class = ppe.object_class
+    WHERE d.timestamp BETWEEN ? AND ?
+    GROUP BY d.object_class
+'''
+
+_Q_PERSON_COUNT = '''
+    SELECT COUNT(*) as person_count
+    FROM detection_events 
+    WHERE timestamp BETWEEN ? AND ?
+    AND object_class = 'person'
+'''
+
+_Q_CLASS_STATS = '''
+    SELECT 
+        object_class,
+        COUNT(*) as count,
+        AVG(confidence) as avg_confidence
+    FROM detection_events 
+    WHERE timestamp BETWEEN ? AND ?
+    GROUP BY object_class
+'''
+
+# Per class counts in each historical window, split like the rollup-backed
+# queries above; spans rows are (k, start, full_start, full_end, end). History
+# windows are half-open so the nearest never reaches into the current window.
+_Q_CLASS_HISTORY = f'''
+    WITH spans(k, window_start, full_start, full_end, window_end) AS (
+        VALUES {", ".join("(?, ?, ?, ?, ?)" for _ in range(ANOMALY_HISTORY_WINDOWS))}
+    )
+    SELECT object_class, k, SUM(n)
+    FROM (
+        SELECT r.object_class, s.k, r.count AS n
+        FROM spans s
+        JOIN detection_rollup_hourly r
+            ON r.bucket_start >= s.full_start AND r.bucket_start < s.full_end
+        UNION ALL
+        SELECT d.object_class, s.k, 1 AS n
+        FROM spans s
+        JOIN detection_events d
+            ON d.timestamp >= s.window_start AND d.timestamp < s.full_start
+        UNION ALL
+        SELECT d.object_class, s.k, 1 AS n
+        FROM spans s
+        JOIN detection_events d
+            ON d.timestamp >= s.full_end AND d.timestamp < s.window_end
+    )
+    GROUP BY object_class, k
+'''
+
+_Q_EVENT_TIMELINE = '''
+    SELECT 
+        id,
+        timestamp,
+        camera_id,
+        object_class,
+        confidence,
+        zone_id
+    FROM detection_events 
+    WHERE timestamp BETWEEN ? AND ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
+# Later timeline pages resume below the (timestamp, id) of the previous page's
+# last event, so every page is an idx_det_ts range walk rather than an OFFSET
+_Q_EVENT_TIMELINE_BEFORE = '''
+    SELECT 
+        id,
+        timestamp,
+        camera_id,
+        object_class,
+        confidence,
+        zone_id
+    FROM detection_events 
+    WHERE timestamp BETWEEN ? AND ?
+      AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
+_Q_EVENT_EXPORT = '''
+    SELECT 
+        timestamp,
+        camera_id,
+        object_class,
+        confidence,
+        zone_id,
+        person_id
+    FROM detection_events 
+    WHERE timestamp BETWEEN ? AND ?
+    ORDER BY timestamp DESC
+'''
+
+_Q_CAMERA_SUMMARY = '''
+    SELECT 
+        camera_id,
+        COUNT(*) as total_events,
+        COUNT(DISTINCT object_class) as unique_objects,
+        AVG(confidence) as avg_confidence
+    FROM detection_events 
+    WHERE timestamp BETWEEN ? AND ?
+    GROUP BY camera_id
+'''
+
+_Q_ALERT_METRICS = '''
+    SELECT 
+        alert_type,
+        severity,
+        COUNT(*) as count,
+        AVG(response_time) as avg_response_time
+    FROM alert_events 
+    WHERE timestamp BETWEEN ? AND ?
+    GROUP BY alert_type, severity
+'''
+
+
+# Detection columns mirrored into the Parquet dataset, in flush order
+_PARQUET_COLUMNS = (
+    "id", "timestamp", "camera_id", "object_class",
+    "confidence", "zone_id", "person_id", "hour_of_day",
+)
+
+_Q_PARQUET_FLUSH_CHUNK = f'''
+    SELECT {", ".join(_PARQUET_COLUMNS)}
+    FROM detection_events
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+'''
+
+_Q_OLDEST_UNFLUSHED = '''
+    SELECT MIN(timestamp)
+    FROM detection_events
+    WHERE id > ?
+'''
+
+def _rows_to_dicts(cursor: sqlite3.Cursor, rows: List[tuple]) -> List[Dict]:
+    """Convert fetched rows to dict records using the cursor's column names
+    
+    Works for both SQLite and DuckDB cursors; DuckDB has no sqlite3.Row.
+    """
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+def _full_hours(start: datetime, end: datetime) -> Tuple[datetime, datetime]:
+    """Return the [full_start, full_end) span of whole hours inside a window
+    
+    When no whole hour fits, the span is empty and sits at the window end so
+    the raw edge ranges cover the full window.
+    """
+    full_start = start.replace(minute=0, second=0, microsecond=0)
+    if full_start < start:
+        full_start += timedelta(hours=1)
+    full_end = end.replace(minute=0, second=0, microsecond=0)
+    
+    if full_start >= full_end:
+        return end, end
+    return full_start, full_end
+
+def _history_spans(start: datetime, end: datetime) -> List[Any]:
+    """Flattened _Q_CLASS_HISTORY spans for the windows preceding [start, end]
+    
+    Each window has the same length as the current one and is shifted back by
+    whole days, at least as many as the window is long, so none of them overlap.
+    """
+    period = timedelta(days=max(1, math.ceil((end - start) / timedelta(days=1))))
+    full_start, full_end = _full_hours(start, end)
+    
+    params = []
+    for k in range(1, ANOMALY_HISTORY_WINDOWS + 1):
+        shift = k * period
+        params += [k, start - shift, full_start - shift, full_end - shift, end - shift]
+    return params
+
+def _cached_report(method):
+    """Cache a report method's result keyed on its name and arguments"""
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        del arguments['self']
+        key = (method.__name__,) + tuple(arguments.values())
+        
+        now = time.monotonic()
+        with self._report_cache_lock:
+            entry = self._report_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+            
+        result = method(self, *args, **kwargs)
+        
+        window_end = arguments.get('end_time') or arguments.get('end_date')
+        closed = window_end is not None and window_end < datetime.now() - CLOSED_WINDOW_GRACE
+        ttl = CLOSED_WINDOW_CACHE_TTL if closed else REPORT_CACHE_TTL
+        
+        with self._report_cache_lock:
+            if len(self._report_cache) >= REPORT_CACHE_MAXSIZE:
+                for expired in [k for k, (expires, _) in self._report_cache.items() if expires <= now]:
+                    del self._report_cache[expired]
+                if len(self._report_cache) >= REPORT_CACHE_MAXSIZE:
+                    del self._report_cache[next(iter(self._report_cache))]
+                    
+            self._report_cache[key] = (now + ttl, result)
+        return result
+        
+    return wrapper
+
 @dataclass
 class DetectionEvent:
     """Single detection event"""
@@ -28,11 +399,63 @@ class DetectionEvent:
     zone_id: Optional[str] = None
     person_id: Optional[str] = None
 
+class _IngestAggregator:
+    """Hourly rollup deltas for detections logged by this process
+    
+    Counts are kept for one contiguous run of detection ids so refresh_rollup
+    can upsert them without reading those rows back from detection_events.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start_run(None)
+        
+    def _start_run(self, first_id: Optional[int]):
+        self.first_id = first_id
+        self.last_id = None if first_id is None else first_id - 1
+        # (bucket_start, camera_id, object_class) -> [hour_of_day, count, sum_conf]
+        self.buckets: Dict[tuple, list] = {}
+        
+    def add(self, event_id: int, detection: DetectionEvent):
+        """Count a detection that was just committed with id event_id"""
+        key = (detection.timestamp.strftime('%Y-%m-%d %H:00:00'),
+               detection.camera_id, detection.object_class)
+        with self._lock:
+            if self.last_id is None or event_id != self.last_id + 1:
+                # Another writer got in between; refresh_rollup folds those from SQL
+                self._start_run(event_id)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = [detection.timestamp.hour, 1, detection.confidence]
+            else:
+                bucket[1] += 1
+                bucket[2] += detection.confidence
+            self.last_id = event_id
+            
+    def drain(self) -> Tuple[Optional[int], Optional[int], List[tuple]]:
+        """Return (first_id, last_id, rollup rows) for the current run and reset"""
+        with self._lock:
+            first_id, last_id, buckets = self.first_id, self.last_id, self.buckets
+            self._start_run(None)
+            
+        rows = [(*key, hour, count, sum_conf) for key, (hour, count, sum_conf) in buckets.items()]
+        return first_id, last_id, rows
+
 class VeroluxReportingSystem:
     """Comprehensive reporting system for Verolux Enterprise"""
     
-    def __init__(self, db_path: str = "verolux_analytics.db"):
+    def __init__(self, db_path: str = "verolux_analytics.db",
+                 parquet_dir: Optional[str] = "analytics/detections"):
         self.db_path = db_path
+        # Columnar copy of detection_events, partitioned by day (dt=YYYY-MM-DD)
+        self.parquet_dir = parquet_dir if DUCKDB_AVAILABLE else None
+        # (method, *arguments) -> (expires_at, result)
+        self._report_cache: Dict[tuple, tuple] = {}
+        # Report jobs fill the cache from the threadpool while requests read it
+        self._report_cache_lock = threading.Lock()
+        # Per-thread connection shared by report queries inside connection()
+        self._local = threading.local()
+        self._ingest = _IngestAggregator()
         self.init_database()
         
     def init_database(self):
@@ -53,7 +476,51 @@ class VeroluxReportingSystem:
                 bbox_x2 REAL,
                 bbox_y2 REAL,
                 zone_id TEXT,
-                person_id TEXT
+                person_id TEXT,
+                hour_of_day INTEGER
+            )
+        ''')
+        
+        # Databases created before hour_of_day existed need the column and a backfill
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(detection_events)')}
+        if 'hour_of_day' not in columns:
+            cursor.execute('ALTER TABLE detection_events ADD COLUMN hour_of_day INTEGER')
+            cursor.execute('''
+                UPDATE detection_events
+                SET hour_of_day = CAST(strftime('%H', timestamp) AS INTEGER)
+            ''')
+            
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_det_hour
+            ON detection_events (hour_of_day, timestamp)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_det_ts
+            ON detection_events (timestamp)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_det_class_ts
+            ON detection_events (object_class, timestamp)
+        ''')
+        
+        # Hourly pre-aggregates of detection_events for peak and shift reports
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS detection_rollup_hourly (
+                bucket_start DATETIME,
+                camera_id TEXT,
+                object_class TEXT,
+                hour_of_day INTEGER,
+                count INTEGER,
+                sum_conf REAL,
+                PRIMARY KEY (bucket_start, camera_id, object_class)
+            )
+        ''')
+        
+        # Last detection_events id folded into each rollup
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                rollup TEXT PRIMARY KEY,
+                last_id INTEGER
             )
         ''')
         
@@ -85,18 +552,268 @@ class VeroluxReportingSystem:
             )
         ''')
         
+        # Progress of the Parquet export of detection_events
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS parquet_export_state (
+                dataset TEXT PRIMARY KEY,
+                last_id INTEGER,
+                last_timestamp DATETIME
+            )
+        ''')
+        
         conn.commit()
         conn.close()
         
+    def flush_to_parquet(self) -> int:
+        """Append detections logged since the last flush to the Parquet dataset
+        
+        Rows are copied in PARQUET_FLUSH_BATCH_SIZE chunks; each chunk is
+        written as its own part files and recorded in parquet_export_state
+        before the next one is read, so memory stays bounded and an
+        interrupted flush resumes where it stopped.
+        """
+        if not self.parquet_dir:
+            return 0
+            
+        conn = sqlite3.connect(self.db_path)
+        duck = None
+        flushed = 0
+        try:
+            state = conn.execute(
+                "SELECT last_id FROM parquet_export_state WHERE dataset = 'detection_events'"
+            ).fetchone()
+            last_id = state[0] if state else 0
+            parquet_dir = self.parquet_dir.replace("'", "''")
+            
+            while True:
+                rows = conn.execute(_Q_PARQUET_FLUSH_CHUNK, [last_id, PARQUET_FLUSH_BATCH_SIZE]).fetchall()
+                if not rows:
+                    break
+                if duck is None:
+                    os.makedirs(self.parquet_dir, exist_ok=True)
+                    duck = duckdb.connect()
+                    
+                # Columnar hand-off instead of one INSERT per row
+                chunk = {
+                    name: np.array(values, dtype=object)
+                    for name, values in zip(_PARQUET_COLUMNS, zip(*rows))
+                }
+                duck.register("chunk", chunk)
+                
+                # Each chunk writes new part files named after its first row id
+                duck.execute(f'''
+                    COPY (
+                        SELECT *, CAST(timestamp AS DATE) AS dt FROM (
+                            SELECT
+                                CAST(id AS BIGINT) AS id,
+                                CAST(timestamp AS TIMESTAMP) AS timestamp,
+                                CAST(camera_id AS VARCHAR) AS camera_id,
+                                CAST(object_class AS VARCHAR) AS object_class,
+                                CAST(confidence AS DOUBLE) AS confidence,
+                                CAST(zone_id AS VARCHAR) AS zone_id,
+                                CAST(person_id AS VARCHAR) AS person_id,
+                                CAST(hour_of_day AS INTEGER) AS hour_of_day
+                            FROM chunk
+                        )
+                    )
+                    TO '{parquet_dir}'
+                    (FORMAT PARQUET, PARTITION_BY (dt), OVERWRITE_OR_IGNORE,
+                     FILENAME_PATTERN 'part-{rows[0][0]}-{{i}}')
+                ''')
+                last_timestamp = duck.execute(
+                    "SELECT MAX(CAST(timestamp AS TIMESTAMP)) FROM chunk"
+                ).fetchone()[0]
+                duck.unregister("chunk")
+                
+                last_id = rows[-1][0]
+                conn.execute('''
+                    INSERT INTO parquet_export_state (dataset, last_id, last_timestamp)
+                    VALUES ('detection_events', ?, ?)
+                    ON CONFLICT(dataset) DO UPDATE SET
+                        last_id = excluded.last_id,
+                        last_timestamp = MAX(last_timestamp, excluded.last_timestamp)
+                ''', [last_id, last_timestamp])
+                conn.commit()
+                flushed += len(rows)
+        finally:
+            if duck is not None:
+                duck.close()
+            conn.close()
+            
+        return flushed
+        
+    def _connect(self) -> sqlite3.Connection:
+        """Open a SQLite connection configured for report queries"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+        return conn
+        
+    def clear_report_cache(self):
+        """Drop all cached report results"""
+        with self._report_cache_lock:
+            self._report_cache.clear()
+        
+    def refresh_rollup(self):
+        """Fold detections logged since the last refresh into the hourly rollup
+        
+        Detections this process logged are applied from the in-memory counts;
+        only rows from other writers are aggregated out of detection_events.
+        """
+        with self._acquire() as conn:
+            self._refresh_rollup(conn)
+            
+    def _refresh_rollup(self, conn: sqlite3.Connection):
+        """Fold new detections into the rollup on conn, skipping the write lock when there are none"""
+        first_id, last_id, deltas = self._ingest.drain()
+        if not deltas:
+            state = conn.execute(
+                "SELECT last_id FROM rollup_state WHERE rollup = 'detection_rollup_hourly'"
+            ).fetchone()
+            max_id = conn.execute("SELECT MAX(id) FROM detection_events").fetchone()[0]
+            if max_id is None or max_id <= (state[0] if state else 0):
+                return
+                
+        try:
+            # Serialize refreshes so concurrent callers never fold a row twice
+            conn.execute("BEGIN IMMEDIATE")
+            state = conn.execute(
+                "SELECT last_id FROM rollup_state WHERE rollup = 'detection_rollup_hourly'"
+            ).fetchone()
+            folded = previous = state[0] if state else 0
+            
+            # The counted run is only usable if it starts right after the watermark
+            if deltas and first_id == folded + 1:
+                conn.executemany(_Q_ROLLUP_APPLY, deltas)
+                folded = last_id
+                
+            max_id = conn.execute("SELECT MAX(id) FROM detection_events").fetchone()[0]
+            if max_id is not None and max_id > folded:
+                conn.execute(_Q_ROLLUP_HOURLY, [folded, max_id])
+                folded = max_id
+                
+            if folded != previous:
+                conn.execute('''
+                    INSERT INTO rollup_state (rollup, last_id)
+                    VALUES ('detection_rollup_hourly', ?)
+                    ON CONFLICT(rollup) DO UPDATE SET last_id = excluded.last_id
+                ''', [folded])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+            
+    def _refresh_rollup_for_report(self, conn: sqlite3.Connection):
+        """Refresh the rollup before a rollup query, once per connection() block"""
+        if conn is getattr(self._local, "conn", None):
+            if self._local.rollup_refreshed:
+                return
+            self._local.rollup_refreshed = True
+        self._refresh_rollup(conn)
+        
+    @contextmanager
+    def connection(self):
+        """Share one SQLite connection across the report queries in this block
+        
+        Report methods called on the same thread reuse it instead of opening
+        their own, which also keeps SQLite's page cache warm between queries.
+        A DuckDB connection opened inside the block is shared the same way.
+        """
+        shared = getattr(self._local, "conn", None)
+        if shared is not None:
+            yield shared
+            return
+            
+        conn = self._connect()
+        self._local.conn = conn
+        self._local.rollup_refreshed = False
+        try:
+            yield conn
+        finally:
+            duck = getattr(self._local, "duck", None)
+            if duck is not None:
+                self._local.duck = None
+                duck.close()
+            self._local.conn = None
+            conn.close()
+            
+    @contextmanager
+    def _acquire(self):
+        """Use the shared connection when one is active, else a short-lived one"""
+        shared = getattr(self._local, "conn", None)
+        if shared is not None:
+            yield shared
+            return
+            
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+            
+    def _connect_duckdb(self):
+        """Open a DuckDB connection with detection_events as a view over the Parquet dataset"""
+        duck = duckdb.connect()
+        pattern = os.path.join(self.parquet_dir, "**", "*.parquet").replace("'", "''")
+        duck.execute(f'''
+            CREATE VIEW detection_events AS
+            SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)
+        ''')
+        return duck
+        
+    def _parquet_watermark(self, conn) -> Optional[datetime]:
+        """Time before which the Parquet dataset holds every detection"""
+        state = conn.execute(
+            "SELECT last_id, last_timestamp FROM parquet_export_state WHERE dataset = 'detection_events'"
+        ).fetchone()
+        if not state:
+            return None
+            
+        watermark = datetime.fromisoformat(state[1])
+        pending = conn.execute(_Q_OLDEST_UNFLUSHED, [state[0]]).fetchone()[0]
+        if pending is not None:
+            watermark = min(watermark, datetime.fromisoformat(pending))
+        return watermark
+        
+    @contextmanager
+    def _window_connection(self, end_time: datetime):
+        """Connection for an aggregate query over detection_events
+        
+        Windows the Parquet dataset is complete for are answered by DuckDB
+        over the columnar dataset. The dataset is complete up to the newest
+        flushed row, but never past the oldest row still waiting in SQLite:
+        a row logged late with an earlier timestamp keeps every window that
+        contains it on SQLite until it has been flushed.
+        """
+        with self._acquire() as conn:
+            complete_until = None
+            if self.parquet_dir:
+                complete_until = self._parquet_watermark(conn)
+                
+            if not (complete_until and end_time < complete_until):
+                yield conn
+            elif conn is getattr(self._local, "conn", None):
+                # Kept open until the connection() block ends
+                if getattr(self._local, "duck", None) is None:
+                    self._local.duck = self._connect_duckdb()
+                yield self._local.duck
+            else:
+                duck = self._connect_duckdb()
+                try:
+                    yield duck
+                finally:
+                    duck.close()
+                
     def log_detection(self, detection: DetectionEvent):
         """Log a detection event"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
             INSERT INTO detection_events 
-            (timestamp, camera_id, object_class, confidence, bbox_x1, bbox_y1, bbox_x2, bbox_y2, zone_id, person_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            (timestamp, camera_id, object_class, confidence, bbox_x1, bbox_y1, bbox_x2, bbox_y2, zone_id, person_id,
+             hour_of_day)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             detection.timestamp,
             detection.camera_id,
@@ -104,268 +821,218 @@ class VeroluxReportingSystem:
             detection.confidence,
             detection.bbox[0], detection.bbox[1], detection.bbox[2], detection.bbox[3],
             detection.zone_id,
-            detection.person_id
+            detection.person_id,
+            detection.timestamp.hour
         ))
         
         conn.commit()
         conn.close()
+        self._ingest.add(cursor.lastrowid, detection)
         
+    @_cached_report
     def get_object_counts(self, start_time: datetime, end_time: datetime, 
                          camera_id: Optional[str] = None) -> Dict[str, int]:
         """Get object counts for a time period"""
-        conn = sqlite3.connect(self.db_path)
-        
-        query = '''
-            SELECT object_class, COUNT(*) as count
-            FROM detection_events 
-            WHERE timestamp BETWEEN ? AND ?
-        '''
-        params = [start_time, end_time]
+        with self._window_connection(end_time) as conn:
+            if camera_id:
+                rows = conn.execute(_Q_OBJECT_COUNTS_BY_CAMERA, [start_time, end_time, camera_id]).fetchall()
+            else:
+                rows = conn.execute(_Q_OBJECT_COUNTS, [start_time, end_time]).fetchall()
         
-        if camera_id:
-            query += ' AND camera_id = ?'
-            params.append(camera_id)
-            
-        query += ' GROUP BY object_class'
-        
-        df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
-        
-        return dict(zip(df['object_class'], df['count']))
+        return dict(rows)
         
+    @_cached_report
     def get_zone_occupancy(self, zone_id: str, start_time: datetime, 
                           end_time: datetime) -> List[Dict]:
         """Get zone occupancy data"""
-        conn = sqlite3.connect(self.db_path)
+        with self._acquire() as conn:
+            rows = conn.execute(_Q_ZONE_OCCUPANCY, [zone_id, start_time, end_time]).fetchall()
         
-        query = '''
-            SELECT timestamp, object_count, duration
-            FROM zone_events 
-            WHERE zone_id = ? AND timestamp BETWEEN ? AND ?
-            AND event_type = 'occupancy'
-            ORDER BY timestamp
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=[zone_id, start_time, end_time])
-        conn.close()
-        
-        return df.to_dict('records')
+        return [dict(row) for row in rows]
         
+    @_cached_report
     def get_peak_traffic_times(self, camera_id: str, start_date: datetime, 
                               end_date: datetime) -> Dict[str, Any]:
         """Get peak traffic times for a camera"""
-        conn = sqlite3.connect(self.db_path)
+        full_start, full_end = _full_hours(start_date, end_date)
+        with self._acquire() as conn:
+            self._refresh_rollup_for_report(conn)
+            rows = conn.execute(_Q_PEAK_TRAFFIC, [
+                camera_id, full_start, full_end,
+                camera_id, start_date, full_start,
+                camera_id, full_end, end_date
+            ]).fetchall()
         
-        query = '''
-            SELECT 
-                strftime('%H', timestamp) as hour,
-                COUNT(*) as detection_count
-            FROM detection_events 
-            WHERE camera_id = ? AND timestamp BETWEEN ? AND ?
-            GROUP BY strftime('%H', timestamp)
-            ORDER BY detection_count DESC
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=[camera_id, start_date, end_date])
-        conn.close()
-        
-        if df.empty:
+        if not rows:
             return {"peak_hours": [], "hourly_counts": {}}
             
-        peak_hours = df.head(3)['hour'].tolist()
-        hourly_counts = dict(zip(df['hour'], df['detection_count']))
+        # Report hours as zero-padded labels ("09") as the API always has
+        hourly_counts = {f"{hour:02d}": count for hour, count in rows}
+        peak_hours = list(hourly_counts)[:3]
         
         return {
             "peak_hours": peak_hours,
             "hourly_counts": hourly_counts,
-            "busiest_hour": df.iloc[0]['hour'],
-            "total_detections": df['detection_count'].sum()
+            "busiest_hour": peak_hours[0],
+            "total_detections": sum(hourly_counts.values())
         }
         
+    @_cached_report
     def get_shift_totals(self, start_date: datetime, end_date: datetime) -> Dict[str, Dict]:
         """Get aggregated counts by shift"""
-        conn = sqlite3.connect(self.db_path)
+        full_start, full_end = _full_hours(start_date, end_date)
+        with self._acquire() as conn:
+            self._refresh_rollup_for_report(conn)
+            rows = conn.execute(_Q_SHIFT_TOTALS, [
+                full_start, full_end,
+                start_date, full_start,
+                full_end, end_date
+            ]).fetchall()
         
-        query = '''
-            SELECT 
-                CASE 
-                    WHEN strftime('%H', timestamp) BETWEEN '06' AND '14' THEN 'morning'
-                    WHEN strftime('%H', timestamp) BETWEEN '14' AND '22' THEN 'afternoon'
-                    ELSE 'night'
-                END as shift,
-                object_class,
-                COUNT(*) as count
-            FROM detection_events 
-            WHERE timestamp BETWEEN ? AND ?
-            GROUP BY shift, object_class
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=[start_date, end_date])
-        conn.close()
-        
-        shift_totals = defaultdict(lambda: defaultdict(int))
-        for _, row in df.iterrows():
-            shift_totals[row['shift']][row['object_class']] = row['count']
+        shift_totals = {}
+        for shift, object_class, count in rows:
+            shift_totals.setdefault(shift, {})[object_class] = count
             
-        return dict(shift_totals)
+        return shift_totals
         
+    @_cached_report
     def get_compliance_report(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
         """Get PPE compliance and safety report"""
-        conn = sqlite3.connect(self.db_path)
-        
-        # Get PPE-related detections
-        query = '''
-            SELECT 
-                object_class,
-                COUNT(*) as count,
-                AVG(confidence) as avg_confidence
-            FROM detection_events 
-            WHERE timestamp BETWEEN ? AND ?
-            AND object_class IN ('helmet', 'vest', 'safety_glasses', 'gloves')
-            GROUP BY object_class
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=[start_time, end_time])
-        conn.close()
-        
-        total_ppe_detections = df['count'].sum() if not df.empty else 0
-        
-        # Get total person detections for compliance calculation
-        conn = sqlite3.connect(self.db_path)
-        person_query = '''
-            SELECT COUNT(*) as person_count
-            FROM detection_events 
-            WHERE timestamp BETWEEN ? AND ?
-            AND object_class = 'person'
-        '''
-        
-        person_df = pd.read_sql_query(person_query, conn, params=[start_time, end_time])
-        conn.close()
-        
-        total_persons = person_df['person_count'].iloc[0] if not person_df.empty else 0
+        with self._window_connection(end_time) as conn:
+            # Get PPE-related detections
+            cursor = conn.execute(_Q_PPE_DETECTIONS, [*PPE_CLASSES, start_time, end_time])
+            ppe_detections = _rows_to_dicts(cursor, cursor.fetchall())
+            
+            total_ppe_detections = sum(row['count'] for row in ppe_detections)
+            
+            # Get total person detections for compliance calculation
+            total_persons = conn.execute(_Q_PERSON_COUNT, [start_time, end_time]).fetchone()[0]
         
         compliance_rate = (total_ppe_detections / total_persons * 100) if total_persons > 0 else 0
         
         return {
-            "ppe_detections": df.to_dict('records') if not df.empty else [],
+            "ppe_detections": ppe_detections,
             "total_ppe_detections": int(total_ppe_detections),
             "total_persons": int(total_persons),
             "compliance_rate": round(compliance_rate, 2)
         }
         
+    @_cached_report
     def get_anomaly_summary(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
         """Get anomaly detection summary"""
-        conn = sqlite3.connect(self.db_path)
+        with self._acquire() as conn:
+            self._refresh_rollup_for_report(conn)
+            # Get current window statistics
+            rows = conn.execute(_Q_CLASS_STATS, [start_time, end_time]).fetchall()
+            
+            if not rows:
+                return {"anomalies": [], "baseline": {}}
+                
+            # Same-length windows before this one, whole hours from the rollup
+            history = conn.execute(_Q_CLASS_HISTORY, _history_spans(start_time, end_time)).fetchall()
         
-        # Get baseline statistics
-        query = '''
-            SELECT 
-                object_class,
-                COUNT(*) as count,
-                AVG(confidence) as avg_confidence
-            FROM detection_events 
-            WHERE timestamp BETWEEN ? AND ?
-            GROUP BY object_class
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=[start_time, end_time])
-        conn.close()
+        baseline = {
+            object_class: {
+                "normal_count": int(count),
+                "avg_confidence": round(avg_confidence, 2)
+            }
+            for object_class, count, avg_confidence in rows
+        }
         
-        if df.empty:
-            return {"anomalies": [], "baseline": {}}
-            
-        # Calculate baseline (mean + 2*std for anomaly detection)
-        baseline = {}
-        for _, row in df.iterrows():
-            baseline[row['object_class']] = {
-                "normal_count": int(row['count']),
-                "avg_confidence": round(row['avg_confidence'], 2)
+        # (n_classes, n_windows) matrix of historical counts; missing windows are zero
+        classes = [row[0] for row in rows]
+        class_index = {object_class: i for i, object_class in enumerate(classes)}
+        counts = np.array([row[1] for row in rows], dtype=float)
+        samples = np.zeros((len(classes), ANOMALY_HISTORY_WINDOWS))
+        for object_class, k, count in history:
+            if object_class in class_index:
+                samples[class_index[object_class], k - 1] = count
+                
+        mean = samples.mean(axis=1)
+        std = samples.std(axis=1)
+        
+        # Flag counts beyond mean + 2 std, and at least 50% above the mean;
+        # classes never seen in the history window have no baseline to judge
+        medium = np.maximum(mean + 2 * std, mean * 1.5)
+        high = np.maximum(mean + 3 * std, mean * 2)
+        flagged = (mean > 0) & (counts > medium)
+        
+        anomalies = [
+            {
+                "object_class": classes[i],
+                "count": int(counts[i]),
+                "expected_count": round(float(mean[i]), 2),
+                "severity": "high" if counts[i] > high[i] else "medium"
             }
-            
-        # Simple anomaly detection (counts significantly above baseline)
-        anomalies = []
-        for _, row in df.iterrows():
-            if row['count'] > row['count'] * 1.5:  # 50% above normal
-                anomalies.append({
-                    "object_class": row['object_class'],
-                    "count": int(row['count']),
-                    "severity": "high" if row['count'] > row['count'] * 2 else "medium"
-                })
+            for i in np.flatnonzero(flagged)
+        ]
                 
         return {
             "anomalies": anomalies,
             "baseline": baseline
         }
         
+    @_cached_report
     def get_event_timeline(self, start_time: datetime, end_time: datetime, 
-                          limit: int = 100) -> List[Dict]:
-        """Get chronological event timeline"""
-        conn = sqlite3.connect(self.db_path)
+                          limit: int = 100, before: Optional[Tuple[str, int]] = None) -> List[Dict]:
+        """Get chronological event timeline, newest first
         
-        query = '''
-            SELECT 
-                timestamp,
-                camera_id,
-                object_class,
-                confidence,
-                zone_id
-            FROM detection_events 
-            WHERE timestamp BETWEEN ? AND ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=[start_time, end_time, limit])
-        conn.close()
+        before is the (timestamp, id) of the last event on the previous page.
+        """
+        with self._acquire() as conn:
+            if before:
+                rows = conn.execute(_Q_EVENT_TIMELINE_BEFORE,
+                                    [start_time, end_time, *before, limit]).fetchall()
+            else:
+                rows = conn.execute(_Q_EVENT_TIMELINE, [start_time, end_time, limit]).fetchall()
+        
+        return [dict(row) for row in rows]
         
-        return df.to_dict('records')
+    def iter_event_rows(self, start_time: datetime, end_time: datetime,
+                        batch_size: Optional[int] = None) -> Iterator[Tuple[List[str], List[tuple]]]:
+        """Yield (columns, rows) batches of detection events for streaming exports"""
+        batch_size = batch_size or EXPORT_BATCH_SIZE
+        conn = self._connect()
         
+        try:
+            cursor = conn.execute(_Q_EVENT_EXPORT, [start_time, end_time])
+            columns = [d[0] for d in cursor.description]
+            # The first batch is yielded even when empty so exports can write their header
+            rows = cursor.fetchmany(batch_size)
+            while True:
+                yield columns, rows
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+        finally:
+            conn.close()
+            
+    @_cached_report
     def get_camera_summary(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Get camera summary with event counts"""
-        conn = sqlite3.connect(self.db_path)
-        
-        query = '''
-            SELECT 
-                camera_id,
-                COUNT(*) as total_events,
-                COUNT(DISTINCT object_class) as unique_objects,
-                AVG(confidence) as avg_confidence
-            FROM detection_events 
-            WHERE timestamp BETWEEN ? AND ?
-            GROUP BY camera_id
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=[start_date, end_date])
-        conn.close()
+        with self._window_connection(end_date) as conn:
+            cursor = conn.execute(_Q_CAMERA_SUMMARY, [start_date, end_date])
+            cameras = _rows_to_dicts(cursor, cursor.fetchall())
         
         return {
-            "cameras": df.to_dict('records'),
-            "total_cameras": len(df),
-            "total_events": int(df['total_events'].sum()) if not df.empty else 0
+            "cameras": cameras,
+            "total_cameras": len(cameras),
+            "total_events": sum(camera['total_events'] for camera in cameras)
         }
         
+    @_cached_report
     def get_alert_metrics(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
         """Get alert and notification metrics"""
-        conn = sqlite3.connect(self.db_path)
+        with self._acquire() as conn:
+            alert_summary = [dict(row) for row in conn.execute(_Q_ALERT_METRICS, [start_time, end_time])]
         
-        query = '''
-            SELECT 
-                alert_type,
-                severity,
-                COUNT(*) as count,
-                AVG(response_time) as avg_response_time
-            FROM alert_events 
-            WHERE timestamp BETWEEN ? AND ?
-            GROUP BY alert_type, severity
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=[start_time, end_time])
-        conn.close()
+        response_times = [row['avg_response_time'] for row in alert_summary
+                          if row['avg_response_time'] is not None]
         
         return {
-            "alert_summary": df.to_dict('records') if not df.empty else [],
-            "total_alerts": int(df['count'].sum()) if not df.empty else 0,
-            "avg_response_time": float(df['avg_response_time'].mean()) if not df.empty else 0
+            "alert_summary": alert_summary,
+            "total_alerts": sum(row['count'] for row in alert_summary),
+            "avg_response_time": float(np.mean(response_times)) if response_times else 0
         }
         
     def generate_report(self, report_type: str, start_time: datetime, 
@@ -379,43 +1046,45 @@ class VeroluxReportingSystem:
             "generated_at": datetime.now().isoformat()
         }
         
-        if report_type == "object_counts":
-            base_report.update(self.get_object_counts(start_time, end_time, kwargs.get('camera_id')))
+        # One connection serves every query the report makes
+        with self.connection():
+            if report_type == "object_counts":
+                base_report.update(self.get_object_counts(start_time, end_time, kwargs.get('camera_id')))
             
-        elif report_type == "zone_occupancy":
-            base_report.update(self.get_zone_occupancy(kwargs['zone_id'], start_time, end_time))
+            elif report_type == "zone_occupancy":
+                base_report.update(self.get_zone_occupancy(kwargs['zone_id'], start_time, end_time))
             
-        elif report_type == "peak_traffic":
-            base_report.update(self.get_peak_traffic_times(kwargs['camera_id'], start_time, end_time))
+            elif report_type == "peak_traffic":
+                base_report.update(self.get_peak_traffic_times(kwargs['camera_id'], start_time, end_time))
             
-        elif report_type == "shift_totals":
-            base_report.update(self.get_shift_totals(start_time, end_time))
+            elif report_type == "shift_totals":
+                base_report.update(self.get_shift_totals(start_time, end_time))
             
-        elif report_type == "compliance":
-            base_report.update(self.get_compliance_report(start_time, end_time))
+            elif report_type == "compliance":
+                base_report.update(self.get_compliance_report(start_time, end_time))
             
-        elif report_type == "anomaly":
-            base_report.update(self.get_anomaly_summary(start_time, end_time))
+            elif report_type == "anomaly":
+                base_report.update(self.get_anomaly_summary(start_time, end_time))
             
-        elif report_type == "timeline":
-            base_report["events"] = self.get_event_timeline(start_time, end_time, kwargs.get('limit', 100))
+            elif report_type == "timeline":
+                base_report["events"] = self.get_event_timeline(start_time, end_time, kwargs.get('limit', 100))
             
-        elif report_type == "camera_summary":
-            base_report.update(self.get_camera_summary(start_time, end_time))
+            elif report_type == "camera_summary":
+                base_report.update(self.get_camera_summary(start_time, end_time))
             
-        elif report_type == "alerts":
-            base_report.update(self.get_alert_metrics(start_time, end_time))
+            elif report_type == "alerts":
+                base_report.update(self.get_alert_metrics(start_time, end_time))
             
-        elif report_type == "comprehensive":
-            # Generate all reports
-            base_report.update({
-                "object_counts": self.get_object_counts(start_time, end_time),
-                "shift_totals": self.get_shift_totals(start_time, end_time),
-                "compliance": self.get_compliance_report(start_time, end_time),
-                "anomaly": self.get_anomaly_summary(start_time, end_time),
-                "camera_summary": self.get_camera_summary(start_time, end_time),
-                "alerts": self.get_alert_metrics(start_time, end_time)
-            })
+            elif report_type == "comprehensive":
+                # Generate all reports
+                base_report.update({
+                    "object_counts": self.get_object_counts(start_time, end_time),
+                    "shift_totals": self.get_shift_totals(start_time, end_time),
+                    "compliance": self.get_compliance_report(start_time, end_time),
+                    "anomaly": self.get_anomaly_summary(start_time, end_time),
+                    "camera_summary": self.get_camera_summary(start_time, end_time),
+                    "alerts": self.get_alert_metrics(start_time, end_time)
+                })
             
         return base_report
 
@@ -425,119 +1094,308 @@ app = FastAPI(title="Verolux Enterprise Reporting API")
 # Initialize reporting system
 reporting_system = VeroluxReportingSystem()
 
+def _naive_local(value: datetime) -> datetime:
+    """Convert an offset-aware datetime to naive server-local time; naive values pass through"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+@functools.lru_cache(maxsize=256)
+def _parse_window_strings(start: str, end: str) -> Tuple[datetime, datetime]:
+    """Parse and validate an ISO start/end pair; repeated pairs hit the cache"""
+    try:
+        start_dt = datetime.fromisoformat(start)
+        end_dt = datetime.fromisoformat(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid ISO datetime: {e}")
+        
+    # Stored timestamps and the cache cutoff are naive local time (datetime.now()),
+    # so offset-aware input is converted to that same base
+    start_dt, end_dt = _naive_local(start_dt), _naive_local(end_dt)
+        
+    if start_dt > end_dt:
+        raise HTTPException(status_code=400, detail="Start of window is after its end")
+    if end_dt - start_dt > MAX_REPORT_WINDOW:
+        raise HTTPException(status_code=400,
+                            detail=f"Window longer than {MAX_REPORT_WINDOW.days} days")
+        
+    return start_dt, end_dt
+
+def parse_window(
+    start_time: str = Query(..., description="Start time (ISO format)"),
+    end_time: str = Query(..., description="End time (ISO format)")
+) -> Tuple[datetime, datetime]:
+    """Dependency for endpoints taking a start_time/end_time window"""
+    return _parse_window_strings(start_time, end_time)
+
+def parse_date_window(
+    start_date: str = Query(..., description="Start date (ISO format)"),
+    end_date: str = Query(..., description="End date (ISO format)")
+) -> Tuple[datetime, datetime]:
+    """Dependency for endpoints taking a start_date/end_date window"""
+    return _parse_window_strings(start_date, end_date)
+
+def _parse_timeline_cursor(before: str) -> Tuple[str, int]:
+    """Split a timeline cursor back into the (timestamp, id) it was built from"""
+    timestamp, _, event_id = before.rpartition(",")
+    try:
+        return timestamp, int(event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid timeline cursor")
+
+def _etag_response(request: Request, payload: Any) -> Response:
+    """Return payload as JSON with an ETag, or 304 if the client already has it"""
+    body = json.dumps(payload, default=str).encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+        
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+async def _maintenance_loop():
+    """Background task that refreshes the rollup and exports to the columnar store"""
+    while True:
+        try:
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+            await asyncio.to_thread(reporting_system.refresh_rollup)
+            flushed = await asyncio.to_thread(reporting_system.flush_to_parquet)
+            if flushed:
+                logger.debug(f"Flushed {flushed} detections to Parquet")
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Report maintenance error: {e}")
+
+@app.on_event("startup")
+async def start_maintenance():
+    """Start periodic rollup refresh and Parquet export"""
+    asyncio.create_task(_maintenance_loop())
+
 @app.get("/reports/object-counts")
 async def get_object_counts(
-    start_time: str = Query(..., description="Start time (ISO format)"),
-    end_time: str = Query(..., description="End time (ISO format)"),
+    request: Request,
+    window: Tuple[datetime, datetime] = Depends(parse_window),
     camera_id: str = Query(None, description="Optional camera ID filter")
 ):
     """Get object counts report"""
-    start_dt = datetime.fromisoformat(start_time)
-    end_dt = datetime.fromisoformat(end_time)
+    start_dt, end_dt = window
     
-    return reporting_system.get_object_counts(start_dt, end_dt, camera_id)
+    return _etag_response(request, reporting_system.get_object_counts(start_dt, end_dt, camera_id))
 
 @app.get("/reports/zone-occupancy")
 async def get_zone_occupancy(
+    request: Request,
     zone_id: str = Query(..., description="Zone ID"),
-    start_time: str = Query(..., description="Start time (ISO format)"),
-    end_time: str = Query(..., description="End time (ISO format)")
+    window: Tuple[datetime, datetime] = Depends(parse_window)
 ):
     """Get zone occupancy report"""
-    start_dt = datetime.fromisoformat(start_time)
-    end_dt = datetime.fromisoformat(end_time)
+    start_dt, end_dt = window
     
-    return reporting_system.get_zone_occupancy(zone_id, start_dt, end_dt)
+    return _etag_response(request, reporting_system.get_zone_occupancy(zone_id, start_dt, end_dt))
 
 @app.get("/reports/peak-traffic")
 async def get_peak_traffic(
+    request: Request,
     camera_id: str = Query(..., description="Camera ID"),
-    start_date: str = Query(..., description="Start date (ISO format)"),
-    end_date: str = Query(..., description="End date (ISO format)")
+    window: Tuple[datetime, datetime] = Depends(parse_date_window)
 ):
     """Get peak traffic times report"""
-    start_dt = datetime.fromisoformat(start_date)
-    end_dt = datetime.fromisoformat(end_date)
+    start_dt, end_dt = window
     
-    return reporting_system.get_peak_traffic_times(camera_id, start_dt, end_dt)
+    return _etag_response(request, reporting_system.get_peak_traffic_times(camera_id, start_dt, end_dt))
 
 @app.get("/reports/shift-totals")
 async def get_shift_totals(
-    start_date: str = Query(..., description="Start date (ISO format)"),
-    end_date: str = Query(..., description="End date (ISO format)")
+    request: Request,
+    window: Tuple[datetime, datetime] = Depends(parse_date_window)
 ):
     """Get shift totals report"""
-    start_dt = datetime.fromisoformat(start_date)
-    end_dt = datetime.fromisoformat(end_date)
+    start_dt, end_dt = window
     
-    return reporting_system.get_shift_totals(start_dt, end_dt)
+    return _etag_response(request, reporting_system.get_shift_totals(start_dt, end_dt))
 
 @app.get("/reports/compliance")
 async def get_compliance_report(
-    start_time: str = Query(..., description="Start time (ISO format)"),
-    end_time: str = Query(..., description="End time (ISO format)")
+    request: Request,
+    window: Tuple[datetime, datetime] = Depends(parse_window)
 ):
     """Get compliance and safety report"""
-    start_dt = datetime.fromisoformat(start_time)
-    end_dt = datetime.fromisoformat(end_time)
+    start_dt, end_dt = window
     
-    return reporting_system.get_compliance_report(start_dt, end_dt)
+    return _etag_response(request, reporting_system.get_compliance_report(start_dt, end_dt))
 
 @app.get("/reports/anomaly")
 async def get_anomaly_report(
-    start_time: str = Query(..., description="Start time (ISO format)"),
-    end_time: str = Query(..., description="End time (ISO format)")
+    request: Request,
+    window: Tuple[datetime, datetime] = Depends(parse_window)
 ):
     """Get anomaly detection summary"""
-    start_dt = datetime.fromisoformat(start_time)
-    end_dt = datetime.fromisoformat(end_time)
+    start_dt, end_dt = window
     
-    return reporting_system.get_anomaly_summary(start_dt, end_dt)
+    return _etag_response(request, reporting_system.get_anomaly_summary(start_dt, end_dt))
 
 @app.get("/reports/timeline")
 async def get_event_timeline(
-    start_time: str = Query(..., description="Start time (ISO format)"),
-    end_time: str = Query(..., description="End time (ISO format)"),
-    limit: int = Query(100, description="Maximum number of events")
+    request: Request,
+    window: Tuple[datetime, datetime] = Depends(parse_window),
+    limit: int = Query(100, ge=1, description="Maximum number of events"),
+    before: Optional[str] = Query(None, description="next_cursor from the previous page")
 ):
     """Get event timeline"""
-    start_dt = datetime.fromisoformat(start_time)
-    end_dt = datetime.fromisoformat(end_time)
+    start_dt, end_dt = window
+    cursor = _parse_timeline_cursor(before) if before else None
     
-    return reporting_system.get_event_timeline(start_dt, end_dt, limit)
+    events = reporting_system.get_event_timeline(start_dt, end_dt, limit, cursor)
+    next_cursor = None
+    if len(events) == limit:
+        next_cursor = f"{events[-1]['timestamp']},{events[-1]['id']}"
+        
+    return _etag_response(request, {"events": events, "next_cursor": next_cursor})
 
 @app.get("/reports/comprehensive")
 async def get_comprehensive_report(
-    start_time: str = Query(..., description="Start time (ISO format)"),
-    end_time: str = Query(..., description="End time (ISO format)")
+    request: Request,
+    window: Tuple[datetime, datetime] = Depends(parse_window)
 ):
     """Get comprehensive report with all analytics"""
-    start_dt = datetime.fromisoformat(start_time)
-    end_dt = datetime.fromisoformat(end_time)
+    start_dt, end_dt = window
     
-    return reporting_system.generate_report("comprehensive", start_dt, end_dt)
+    return _etag_response(request, reporting_system.generate_report("comprehensive", start_dt, end_dt))
+
+def _flatten_report(report: Any, prefix: str = "") -> Iterator[Tuple[str, Any]]:
+    """Yield (dotted.field, value) pairs for every leaf of a report"""
+    if isinstance(report, dict):
+        for key, value in report.items():
+            yield from _flatten_report(value, f"{prefix}{key}.")
+    elif isinstance(report, list):
+        for index, value in enumerate(report):
+            yield from _flatten_report(value, f"{prefix}{index}.")
+    else:
+        yield prefix.rstrip("."), report
+
+def _iter_events_csv(start_dt: datetime, end_dt: datetime) -> Iterator[str]:
+    """Stream detection events as CSV, one fetched batch at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    
+    for columns, rows in reporting_system.iter_event_rows(start_dt, end_dt):
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def _iter_events_ndjson(start_dt: datetime, end_dt: datetime) -> Iterator[str]:
+    """Stream detection events as newline-delimited JSON"""
+    for columns, rows in reporting_system.iter_event_rows(start_dt, end_dt):
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+
+def _iter_report_csv(report: Dict[str, Any]) -> Iterator[str]:
+    """Stream a generated report as field,value CSV rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["field", "value"])
+    writer.writerows(_flatten_report(report))
+    yield buffer.getvalue()
+
+# Background report jobs: job_id -> status record
+report_jobs: Dict[str, Dict[str, Any]] = {}
+report_jobs_lock = threading.Lock()
+
+def _run_report_job(job_id: str, report_type: str, start_dt: datetime, end_dt: datetime):
+    """Generate a report for a queued job and store the outcome"""
+    with report_jobs_lock:
+        report_jobs[job_id]["status"] = "running"
+        
+    try:
+        result = reporting_system.generate_report(report_type, start_dt, end_dt)
+    except Exception as e:
+        logger.error(f"Report job {job_id} failed: {e}")
+        with report_jobs_lock:
+            report_jobs[job_id].update(status="failed", error=str(e),
+                                       finished_at=datetime.now().isoformat())
+        return
+        
+    with report_jobs_lock:
+        report_jobs[job_id].update(status="completed", result=result,
+                                   finished_at=datetime.now().isoformat())
+
+def _create_report_job(report_type: str) -> str:
+    """Register a pending report job, evicting the oldest finished jobs"""
+    job_id = uuid.uuid4().hex
+    
+    with report_jobs_lock:
+        finished = [jid for jid, job in report_jobs.items() if job["status"] in ("completed", "failed")]
+        while len(report_jobs) >= REPORT_JOB_MAXSIZE and finished:
+            del report_jobs[finished.pop(0)]
+            
+        report_jobs[job_id] = {
+            "job_id": job_id,
+            "report_type": report_type,
+            "status": "pending",
+            "created_at": datetime.now().isoformat()
+        }
+        
+    return job_id
+
+@app.post("/reports/comprehensive", status_code=202)
+async def submit_comprehensive_report(
+    background_tasks: BackgroundTasks,
+    window: Tuple[datetime, datetime] = Depends(parse_window)
+):
+    """Queue a comprehensive report and return a job to poll"""
+    start_dt, end_dt = window
+    
+    job_id = _create_report_job("comprehensive")
+    background_tasks.add_task(_run_report_job, job_id, "comprehensive", start_dt, end_dt)
+    
+    return {"job_id": job_id, "status": "pending", "status_url": f"/reports/jobs/{job_id}"}
+
+@app.get("/reports/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    """Get status, and the result once completed, of a queued report"""
+    with report_jobs_lock:
+        job = report_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Report job not found")
+        return dict(job)
 
 @app.post("/reports/export")
 async def export_report(
     report_type: str = Query(..., description="Report type"),
-    start_time: str = Query(..., description="Start time (ISO format)"),
-    end_time: str = Query(..., description="End time (ISO format)"),
+    window: Tuple[datetime, datetime] = Depends(parse_window),
     format: str = Query("json", description="Export format (json, csv)")
 ):
     """Export report to file"""
-    start_dt = datetime.fromisoformat(start_time)
-    end_dt = datetime.fromisoformat(end_time)
+    start_dt, end_dt = window
     
-    report = reporting_system.generate_report(report_type, start_dt, end_dt)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     
     if format == "csv":
-        # Convert to CSV
-        filename = f"verolux_report_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        # Implementation for CSV export would go here
-        return {"message": "CSV export not implemented yet", "filename": filename}
-    else:
-        # Return JSON
-        return report
+        filename = f"verolux_report_{report_type}_{timestamp}.csv"
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+        
+        # Timelines export every event in the window, streamed from the database
+        if report_type == "timeline":
+            content = _iter_events_csv(start_dt, end_dt)
+        else:
+            report = await asyncio.to_thread(reporting_system.generate_report, report_type, start_dt, end_dt)
+            content = _iter_report_csv(report)
+            
+        return StreamingResponse(content, media_type="text/csv", headers=headers)
+        
+    if report_type == "timeline":
+        filename = f"verolux_report_{report_type}_{timestamp}.ndjson"
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+        return StreamingResponse(_iter_events_ndjson(start_dt, end_dt),
+                                 media_type="application/x-ndjson", headers=headers)
+        
+    # Return JSON; report queries block, so they run off the event loop
+    return await asyncio.to_thread(reporting_system.generate_report, report_type, start_dt, end_dt)
 
 if __name__ == "__main__":
     print("🚀 Starting Verolux Enterprise Reporting System")
@@ -4,18 +4,42 @@ Automatically rotates secrets with zero downtime
 Integrates with HashiCorp Vault, GCP Secret Manager, or AWS Secrets Manager
 """
 import os
+import sys
 import time
 import logging
 import json
-import hashlib
-from typing import Optional, Dict, List
+import threading
+from typing import Optional, Dict, List, Set
+from urllib.parse import quote, unquote
 from dataclasses import dataclass, field
 from enum import Enum
-from datetime import datetime, timedelta
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
 
+def _dumps(data: dict) -> bytes:
+    """Encode metadata as indented JSON"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
+
+def _loads(raw: bytes) -> dict:
+    """Decode JSON metadata"""
+    return orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+
+
+def _file_stem(secret_name: str) -> str:
+    """Filename for a secret; Vault and AWS style names contain '/'"""
+    return quote(secret_name, safe="")
+
+
 class SecretType(Enum):
     """Types of secrets to manage"""
     DATABASE_PASSWORD = "database_password"
@@ -34,7 +58,23 @@ class SecretBackend(Enum):
     LOCAL_FILE = "local_file"  # For development only!
 
 
-@dataclass
+def _rotation_urgency(days: float, interval: int) -> str:
+    """Urgency level for a secret rotated `days` ago on an `interval`-day schedule"""
+    if days >= interval:
+        return "overdue"
+    elif days >= interval * 0.9:
+        return "urgent"
+    elif days >= interval * 0.75:
+        return "soon"
+    else:
+        return "ok"
+
+
+# Slotted dataclasses need Python 3.10; older interpreters keep a __dict__
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class SecretMetadata:
     """Metadata for a secret"""
     secret_name: str
@@ -58,29 +98,20 @@ class SecretMetadata:
     @property
     def rotation_urgency(self) -> str:
         """Get rotation urgency level"""
-        days = self.days_since_rotation
-        interval = self.rotation_interval_days
-        
-        if days >= interval:
-            return "overdue"
-        elif days >= interval * 0.9:
-            return "urgent"
-        elif days >= interval * 0.75:
-            return "soon"
-        else:
-            return "ok"
+        return _rotation_urgency(self.days_since_rotation, self.rotation_interval_days)
     
-    def to_dict(self) -> dict:
-        """Convert to dictionary"""
+    def to_dict(self, now: float) -> dict:
+        """Convert to dictionary, with ages measured at `now`"""
+        days = (now - self.last_rotated) / 86400
         return {
             "secret_name": self.secret_name,
             "secret_type": self.secret_type.value,
             "created_at": self.created_at,
             "last_rotated": self.last_rotated,
             "rotation_interval_days": self.rotation_interval_days,
-            "days_since_rotation": round(self.days_since_rotation, 2),
-            "needs_rotation": self.needs_rotation,
-            "rotation_urgency": self.rotation_urgency,
+            "days_since_rotation": days,
+            "needs_rotation": days >= self.rotation_interval_days,
+            "rotation_urgency": _rotation_urgency(days, self.rotation_interval_days),
             "version": self.version,
             "backend": self.backend.value
         }
@@ -108,11 +139,26 @@ class SecretRotationManager:
         Args:
             backend: Secret storage backend
             rotation_interval_days: Default rotation interval
-            metadata_file: Path to metadata storage
+            metadata_file: Path to metadata storage; secrets are kept one
+                file each in the directory of the same name without extension
         """
         self.backend = backend
         self.rotation_interval_days = rotation_interval_days
         self.metadata_file = metadata_file
+        self.metadata_dir = os.path.splitext(metadata_file)[0]
+        
+        # Serializes rotations and metadata writes; re-entrant for batch rotation
+        self._lock = threading.RLock()
+        self._save_pending = False
+        # Secrets whose metadata file is out of date
+        self._dirty: Set[str] = set()
+        
+        # Backend clients, created once on first use
+        self._client_lock = threading.Lock()
+        self._vault_client = None
+        self._gcp_client = None
+        self._aws_client = None
+        self._gcp_secrets: Set[str] = set()
         
         # Load or initialize metadata
         self.secrets: Dict[str, SecretMetadata] = {}
@@ -121,16 +167,26 @@ class SecretRotationManager:
         logger.info(f"Secret rotation manager initialized with {self.backend.value} backend")
     
     def _load_metadata(self):
-        """Load secret metadata from file"""
-        if not os.path.exists(self.metadata_file):
-            logger.info("No existing secret metadata found")
-            return
+        """Load secret metadata, migrating a legacy single-file store"""
+        records = {}
         
         try:
-            with open(self.metadata_file, 'r') as f:
-                data = json.load(f)
+            if os.path.isdir(self.metadata_dir):
+                for entry in os.scandir(self.metadata_dir):
+                    if entry.name.endswith(".json"):
+                        with open(entry.path, 'rb') as f:
+                            records[unquote(entry.name[:-len(".json")])] = _loads(f.read())
+            elif os.path.exists(self.metadata_file):
+                with open(self.metadata_file, 'rb') as f:
+                    records = _loads(f.read())
+                # Split into per-secret files on the next save
+                self._dirty.update(records)
+            
+            if not records:
+                logger.info("No existing secret metadata found")
+                return
             
-            for name, meta in data.items():
+            for name, meta in records.items():
                 self.secrets[name] = SecretMetadata(
                     secret_name=meta["secret_name"],
                     secret_type=SecretType(meta["secret_type"]),
@@ -146,18 +202,24 @@ class SecretRotationManager:
         except Exception as e:
             logger.error(f"Error loading secret metadata: {e}")
     
+    def _write_metadata_file(self, secret_name: str, record: dict):
+        """Write one secret's metadata; write then rename so readers never see a partial file"""
+        path = os.path.join(self.metadata_dir, f"{_file_stem(secret_name)}.json")
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(_dumps(record))
+        os.replace(tmp_file, path)
+    
     def _save_metadata(self):
-        """Save secret metadata to file"""
+        """Save metadata of secrets changed since the last save"""
         try:
-            data = {
-                name: meta.to_dict()
-                for name, meta in self.secrets.items()
-            }
-            
-            os.makedirs(os.path.dirname(self.metadata_file), exist_ok=True)
+            now = time.time()
+            os.makedirs(self.metadata_dir, exist_ok=True)
             
-            with open(self.metadata_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            for name in list(self._dirty):
+                self._write_metadata_file(name, self.secrets[name].to_dict(now))
+                self._dirty.discard(name)
+            self._save_pending = False
             
             logger.debug("Secret metadata saved")
             
@@ -186,7 +248,8 @@ class SecretRotationManager:
     def rotate_secret(self, 
                      secret_name: str,
                      secret_type: SecretType,
-                     new_secret: Optional[str] = None) -> str:
+                     new_secret: Optional[str] = None,
+                     defer_save: bool = False) -> str:
         """
         Rotate a secret
         
@@ -194,6 +257,7 @@ class SecretRotationManager:
             secret_name: Name/identifier of secret
             secret_type: Type of secret
             new_secret: Optional pre-generated secret
+            defer_save: Leave metadata unsaved for the caller to persist once
             
         Returns:
             New secret value
@@ -204,24 +268,29 @@ class SecretRotationManager:
         if not new_secret:
             new_secret = self.generate_secret(secret_type)
         
-        # Store new secret in backend
-        self._store_secret(secret_name, new_secret)
-        
-        # Update metadata
-        if secret_name in self.secrets:
-            metadata = self.secrets[secret_name]
-            metadata.last_rotated = time.time()
-            metadata.version += 1
-        else:
-            metadata = SecretMetadata(
-                secret_name=secret_name,
-                secret_type=secret_type,
-                rotation_interval_days=self.rotation_interval_days,
-                backend=self.backend
-            )
-            self.secrets[secret_name] = metadata
-        
-        self._save_metadata()
+        with self._lock:
+            # Store new secret in backend
+            self._store_secret(secret_name, new_secret)
+            
+            # Update metadata
+            if secret_name in self.secrets:
+                metadata = self.secrets[secret_name]
+                metadata.last_rotated = time.time()
+                metadata.version += 1
+            else:
+                metadata = SecretMetadata(
+                    secret_name=secret_name,
+                    secret_type=secret_type,
+                    rotation_interval_days=self.rotation_interval_days,
+                    backend=self.backend
+                )
+                self.secrets[secret_name] = metadata
+            self._dirty.add(secret_name)
+                
+            if defer_save:
+                self._save_pending = True
+            else:
+                self._save_metadata()
         
         logger.info(
             f"Secret {secret_name} rotated to version {metadata.version} "
@@ -242,15 +311,39 @@ class SecretRotationManager:
             # Local file (development only - NOT SECURE)
             self._store_local(secret_name, secret_value)
     
+    def _get_vault_client(self):
+        """Vault client shared across rotations"""
+        with self._client_lock:
+            if self._vault_client is None:
+                import hvac
+                
+                vault_url = os.environ.get("VAULT_ADDR", "http://localhost:8200")
+                vault_token = os.environ.get("VAULT_TOKEN", "root")
+                self._vault_client = hvac.Client(url=vault_url, token=vault_token)
+            return self._vault_client
+    
+    def _get_gcp_client(self):
+        """GCP Secret Manager client shared across rotations"""
+        with self._client_lock:
+            if self._gcp_client is None:
+                from google.cloud import secretmanager
+                
+                self._gcp_client = secretmanager.SecretManagerServiceClient()
+            return self._gcp_client
+    
+    def _get_aws_client(self):
+        """AWS Secrets Manager client shared across rotations"""
+        with self._client_lock:
+            if self._aws_client is None:
+                import boto3
+                
+                self._aws_client = boto3.client('secretsmanager')
+            return self._aws_client
+    
     def _store_vault(self, secret_name: str, secret_value: str):
         """Store secret in HashiCorp Vault"""
         try:
-            import hvac
-            
-            vault_url = os.environ.get("VAULT_ADDR", "http://localhost:8200")
-            vault_token = os.environ.get("VAULT_TOKEN", "root")
-            
-            client = hvac.Client(url=vault_url, token=vault_token)
+            client = self._get_vault_client()
             
             client.secrets.kv.v2.create_or_update_secret(
                 path=f"verolux/{secret_name}",
@@ -266,26 +359,26 @@ class SecretRotationManager:
     def _store_gcp(self, secret_name: str, secret_value: str):
         """Store secret in GCP Secret Manager"""
         try:
-            from google.cloud import secretmanager
-            
             project_id = os.environ.get("GCP_PROJECT_ID")
-            client = secretmanager.SecretManagerServiceClient()
+            client = self._get_gcp_client()
             
             parent = f"projects/{project_id}"
             secret_id = f"verolux-{secret_name}"
+            parent_secret = f"{parent}/secrets/{secret_id}"
             
-            # Create secret if doesn't exist
-            try:
-                client.create_secret(
-                    parent=parent,
-                    secret_id=secret_id,
-                    secret={"replication": {"automatic": {}}}
-                )
-            except:
-                pass  # Secret already exists
+            # Create secret if doesn't exist; later versions reuse it
+            if parent_secret not in self._gcp_secrets:
+                try:
+                    client.create_secret(
+                        parent=parent,
+                        secret_id=secret_id,
+                        secret={"replication": {"automatic": {}}}
+                    )
+                except:
+                    pass  # Secret already exists
+                self._gcp_secrets.add(parent_secret)
             
             # Add secret version
-            parent_secret = f"{parent}/secrets/{secret_id}"
             client.add_secret_version(
                 parent=parent_secret,
                 payload={"data": secret_value.encode()}
@@ -300,9 +393,7 @@ class SecretRotationManager:
     def _store_aws(self, secret_name: str, secret_value: str):
         """Store secret in AWS Secrets Manager"""
         try:
-            import boto3
-            
-            client = boto3.client('secretsmanager')
+            client = self._get_aws_client()
             
             try:
                 # Try to update existing secret
@@ -335,7 +426,7 @@ class SecretRotationManager:
         os.makedirs(secrets_dir, exist_ok=True)
         
         # Store secret (encrypted would be better, but this is just for dev)
-        secret_file = os.path.join(secrets_dir, f"{secret_name}.txt")
+        secret_file = os.path.join(secrets_dir, f"{_file_stem(secret_name)}.txt")
         with open(secret_file, 'w') as f:
             f.write(secret_value)
         
@@ -350,15 +441,16 @@ class SecretRotationManager:
             Dictionary of secret statuses
         """
         status = {}
+        now = time.time()
         
         for name, metadata in self.secrets.items():
+            days = (now - metadata.last_rotated) / 86400
+            interval = metadata.rotation_interval_days
             status[name] = {
-                "needs_rotation": metadata.needs_rotation,
-                "urgency": metadata.rotation_urgency,
-                "days_since_rotation": round(metadata.days_since_rotation, 2),
-                "days_until_rotation": round(
-                    metadata.rotation_interval_days - metadata.days_since_rotation, 2
-                ),
+                "needs_rotation": days >= interval,
+                "urgency": _rotation_urgency(days, interval),
+                "days_since_rotation": round(days, 2),
+                "days_until_rotation": round(interval - days, 2),
                 "version": metadata.version
             }
         
@@ -388,15 +480,22 @@ class SecretRotationManager:
         
         rotated = {}
         
-        for metadata in due_secrets:
+        with self._lock:
             try:
-                new_secret = self.rotate_secret(
-                    metadata.secret_name,
-                    metadata.secret_type
-                )
-                rotated[metadata.secret_name] = new_secret
-            except Exception as e:
-                logger.error(f"Failed to rotate {metadata.secret_name}: {e}")
+                for metadata in due_secrets:
+                    try:
+                        new_secret = self.rotate_secret(
+                            metadata.secret_name,
+                            metadata.secret_type,
+                            defer_save=True
+                        )
+                        rotated[metadata.secret_name] = new_secret
+                    except Exception as e:
+                        logger.error(f"Failed to rotate {metadata.secret_name}: {e}")
+            finally:
+                # Persist the whole batch with one write
+                if self._save_pending:
+                    self._save_metadata()
         
         logger.info(f"Successfully rotated {len(rotated)}/{len(due_secrets)} secrets")
         
@@ -404,9 +503,7 @@ class SecretRotationManager:
     
     def get_rotation_summary(self) -> dict:
         """Get summary of rotation status"""
-        all_secrets = list(self.secrets.values())
-        
-        if not all_secrets:
+        if not self.secrets:
             return {
                 "total_secrets": 0,
                 "needs_rotation": 0,
@@ -414,14 +511,24 @@ class SecretRotationManager:
                 "urgent": 0
             }
         
-        needs_rotation = len([s for s in all_secrets if s.needs_rotation])
-        overdue = len([s for s in all_secrets if s.rotation_urgency == "overdue"])
-        urgent = len([s for s in all_secrets if s.rotation_urgency == "urgent"])
-        
-        avg_days = sum(s.days_since_rotation for s in all_secrets) / len(all_secrets)
+        # One pass over the secrets with a single clock read
+        now = time.time()
+        overdue = urgent = 0
+        total_days = 0.0
+        for s in self.secrets.values():
+            days = (now - s.last_rotated) / 86400
+            total_days += days
+            if days >= s.rotation_interval_days:
+                overdue += 1
+            elif days >= s.rotation_interval_days * 0.9:
+                urgent += 1
+        
+        # Secrets need rotation exactly when they are overdue
+        needs_rotation = overdue
+        avg_days = total_days / len(self.secrets)
         
         return {
-            "total_secrets": len(all_secrets),
+            "total_secrets": len(self.secrets),
             "needs_rotation": needs_rotation,
             "overdue": overdue,
             "urgent": urgent,
@@ -430,8 +537,16 @@ class SecretRotationManager:
         }
 
 
-# Global instance
-secret_rotation_manager = SecretRotationManager()
+# Global instance, created on first use so importing this module stays cheap
+_manager: Optional[SecretRotationManager] = None
+
+
+def get_secret_rotation_manager() -> SecretRotationManager:
+    """Get the shared secret rotation manager, loading its metadata on first call"""
+    global _manager
+    if _manager is None:
+        _manager = SecretRotationManager()
+    return _manager
 
 
 
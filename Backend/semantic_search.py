@@ -5,23 +5,45 @@ Advanced AI-powered search that understands context and meaning
 """
 
 import os
+import glob
 import json
+import uuid
+import calendar
 import numpy as np
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, Query
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 import sqlite3
+import threading
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import re
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
 # Configuration
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(APP_DIR, "verolux1st.db")
 MODEL_NAME = "all-MiniLM-L6-v2"  # Lightweight sentence transformer model
+ONNX_MODEL_DIR = os.path.join(APP_DIR, "models", "all-MiniLM-L6-v2-onnx-int8")
+EMBEDDING_CACHE_DIR = os.path.join(APP_DIR, "embeddings")
+# Opt-in: the int8 encoder is exported and quantized on first start, and its
+# embeddings differ slightly from the PyTorch model the index was built with
+USE_ONNX = os.getenv("SEMANTIC_USE_ONNX", "0") == "1"
 
 app = FastAPI(title="Verolux1st - Semantic Search API")
 
@@ -37,6 +59,9 @@ app.add_middleware(
 # Global model instance
 semantic_model = None
 
+# Batch size for encoding corpus rows
+ENCODE_BATCH_SIZE = 64
+
 class SearchQuery(BaseModel):
     query: str
     search_type: str = "all"  # all, detections, reports, analytics, violations
@@ -52,10 +77,200 @@ class SearchResult(BaseModel):
     timestamp: str
     metadata: Dict[str, Any]
 
+class EmbeddingIndex:
+    """Int8-quantized embeddings for one table's rows, keyed by row id"""
+    
+    def __init__(self):
+        self.texts: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.dirty = False
+        
+    def load(self, prefix: str, encoder: str) -> bool:
+        """Map a previously saved index, if it was built by the same encoder"""
+        try:
+            with open(f"{prefix}.json") as f:
+                saved = json.load(f)
+            arrays = f"{prefix}.{saved['generation']}"
+            codes = np.load(f"{arrays}.codes.npy", mmap_mode='r')
+            scales = np.load(f"{arrays}.scales.npy")
+        except (OSError, ValueError, KeyError):
+            return False
+        if saved.get("encoder") != encoder or not len(saved["ids"]) == len(codes) == len(scales):
+            return False
+            
+        self.texts = saved["texts"]
+        self.positions = {row_id: position for position, row_id in enumerate(saved["ids"])}
+        self.codes, self.scales = codes, scales
+        self.dirty = False
+        return True
+        
+    def save(self, prefix: str, encoder: str):
+        """Write codes, scales and row ids; replacing the sidecar switches readers over at once
+        
+        Arrays go to new files named by a generation id, so indexes other workers
+        have memory-mapped are never rewritten, and a crash before the sidecar is
+        replaced leaves the previous generation intact.
+        """
+        if self.codes is None:
+            return
+        ids = sorted(self.positions, key=self.positions.get)
+        generation = uuid.uuid4().hex
+        arrays = f"{prefix}.{generation}"
+        np.save(f"{arrays}.codes.npy", np.asarray(self.codes))
+        np.save(f"{arrays}.scales.npy", np.asarray(self.scales))
+        with open(f"{prefix}.json.tmp", "w") as f:
+            json.dump({"encoder": encoder, "generation": generation, "ids": ids, "texts": self.texts}, f)
+        os.replace(f"{prefix}.json.tmp", f"{prefix}.json")
+        self.dirty = False
+        
+        # Existing mappings of older generations stay readable after the unlink
+        for path in glob.glob(f"{glob.escape(prefix)}.*.npy"):
+            if not path.startswith(f"{arrays}."):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        
+    def stale(self, ids: List[str], texts: List[str]) -> Dict[str, str]:
+        """Rows that are new or whose text changed since they were cached"""
+        stale = {}
+        for row_id, text in zip(ids, texts):
+            position = self.positions.get(row_id)
+            if position is None or self.texts[position] != text:
+                stale[row_id] = text
+        return stale
+        
+    def store(self, rows: Dict[str, str], embeddings: np.ndarray):
+        """Cache embeddings for rows, in the order rows are given"""
+        codes, scales = quantize_embeddings(embeddings)
+        if self.codes is not None and not self.codes.flags.writeable:
+            # Copy a memory-mapped index before changing rows in place
+            self.codes = np.array(self.codes)
+        self.dirty = True
+        appended = []
+        for i, (row_id, text) in enumerate(rows.items()):
+            position = self.positions.get(row_id)
+            if position is None:
+                self.positions[row_id] = len(self.texts)
+                self.texts.append(text)
+                appended.append(i)
+            else:
+                self.texts[position] = text
+                self.codes[position] = codes[i]
+                self.scales[position] = scales[i]
+                
+        if appended:
+            if self.codes is None:
+                self.codes, self.scales = codes[appended], scales[appended]
+            else:
+                self.codes = np.vstack([self.codes, codes[appended]])
+                self.scales = np.concatenate([self.scales, scales[appended]])
+                
+    def vectors(self, ids: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(codes, scales) for cached rows"""
+        positions = [self.positions[row_id] for row_id in ids]
+        return self.codes[positions], self.scales[positions]
+
+def index_rows(batches: List[Tuple[EmbeddingIndex, List[str], List[str]]],
+               extra_texts: List[str] = ()) -> np.ndarray:
+    """Cache embeddings for several tables' rows with a single encode call
+    
+    batches holds (index, ids, texts) per table. extra_texts, such as the
+    query, ride along in the same forward pass and their embeddings are returned.
+    """
+    pending = [(index, index.stale(ids, texts)) for index, ids, texts in batches]
+    all_texts = list(extra_texts) + [text for _, stale in pending for text in stale.values()]
+    if not all_texts:
+        return np.empty((0, 0), dtype=np.float32)
+        
+    embeddings = get_semantic_embeddings(all_texts)
+    offset = len(extra_texts)
+    for index, stale in pending:
+        if stale:
+            index.store(stale, embeddings[offset:offset + len(stale)])
+            offset += len(stale)
+    return embeddings[:len(extra_texts)]
+
+def detection_text(det) -> str:
+    """Text a detection row is embedded as"""
+    return f"{det['object_type']} detected at {det['location']} with confidence {det['confidence']}. {det['description']}"
+
+def report_text(rep) -> str:
+    """Text a report row is embedded as"""
+    return f"{rep['title']}. {rep['content']}"
+
+def violation_text(vio) -> str:
+    """Text a violation row is embedded as"""
+    return f"{vio['violation_type']} at {vio['location']}. {vio['description']}"
+
+CORPUS_TEXT = {
+    "detections": detection_text,
+    "reports": report_text,
+    "violations": violation_text,
+}
+
+# Corpus embeddings are computed once per row; searches only encode the query
+embedding_indexes: Dict[str, EmbeddingIndex] = {table: EmbeddingIndex() for table in CORPUS_TEXT}
+
+# Row id -> (metadata JSON, parsed metadata), so each string is decoded once
+metadata_cache: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+
+def row_metadata(row) -> Dict[str, Any]:
+    """Parsed metadata for a row, decoded again only if its JSON changed"""
+    raw = row['metadata']
+    cached = metadata_cache.get(row['id'])
+    if cached is None or cached[0] != raw:
+        cached = (raw, json.loads(raw) if raw else {})
+        metadata_cache[row['id']] = cached
+    return cached[1]
+
+class OnnxSentenceEncoder:
+    """MiniLM on ONNX Runtime with int8 MatMuls, pooled the way SBERT does"""
+    
+    def __init__(self, model_dir: str):
+        if not os.path.exists(os.path.join(model_dir, "model_quantized.onnx")):
+            # One-off export and dynamic int8 quantization, reused on later starts
+            model = ORTModelForFeatureExtraction.from_pretrained(
+                f"sentence-transformers/{MODEL_NAME}", export=True)
+            model.save_pretrained(model_dir)
+            AutoTokenizer.from_pretrained(f"sentence-transformers/{MODEL_NAME}").save_pretrained(model_dir)
+            quantizer = ORTQuantizer.from_pretrained(model_dir)
+            quantizer.quantize(save_dir=model_dir,
+                               quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False))
+            
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name="model_quantized.onnx")
+        
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False) -> np.ndarray:
+        """Mean-pooled sentence embeddings, matching SentenceTransformer.encode"""
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(texts[start:start + batch_size], padding=True,
+                                    truncation=True, return_tensors="np")
+            hidden = self.model(**tokens).last_hidden_state
+            mask = tokens["attention_mask"][..., np.newaxis].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9))
+            
+        embeddings = np.concatenate(batches).astype(np.float32)
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
 def load_semantic_model():
     """Load the sentence transformer model for semantic search"""
     global semantic_model
     print("🧠 Loading semantic search model...")
+    if ONNX_AVAILABLE and USE_ONNX:
+        try:
+            semantic_model = OnnxSentenceEncoder(ONNX_MODEL_DIR)
+            print("✅ Semantic search model loaded on ONNX Runtime (int8)!")
+            return True
+        except Exception as e:
+            print(f"⚠️ ONNX encoder unavailable, falling back to PyTorch: {e}")
+            
     try:
         semantic_model = SentenceTransformer(MODEL_NAME)
         print("✅ Semantic search model loaded successfully!")
@@ -64,22 +279,50 @@ def load_semantic_model():
         print(f"❌ Error loading semantic model: {e}")
         return False
 
+# Most recent rows per table considered by a search; the connection's
+# statement cache keeps these prepared between requests
+DET_SQL = "SELECT * FROM detections ORDER BY timestamp DESC LIMIT ?"
+REP_SQL = "SELECT * FROM reports ORDER BY created_at DESC LIMIT ?"
+VIO_SQL = "SELECT * FROM violations ORDER BY timestamp DESC LIMIT ?"
+
+# Keyword recall stage: rows sharing a query term, best BM25 match first
+FTS_CANDIDATES = 200
+KEYWORD_SQL = {
+    table: f'''
+        SELECT t.* FROM {table}_fts f
+        JOIN {table} t ON t.id = f.id
+        WHERE {table}_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ?
+    '''
+    for table in CORPUS_TEXT
+}
+
+# Each worker thread keeps one open connection to DB_PATH
+_conn_local = threading.local()
+
 def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Get this thread's database connection, opening it on first use"""
+    conn = getattr(_conn_local, "conn", None)
+    if conn is None or _conn_local.path != DB_PATH:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-64000")
+        _conn_local.conn, _conn_local.path = conn, DB_PATH
     return conn
 
-def create_sample_data():
-    """Create sample data for demonstration"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create tables if they don't exist
-    cursor.execute('''
+# Timestamps are stored as INTEGER epoch seconds (UTC) so ORDER BY ... LIMIT
+# walks an index; they are formatted back to TIMESTAMP_FORMAT in responses
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIMESTAMP_COLUMNS = {"detections": "timestamp", "reports": "created_at", "violations": "timestamp"}
+
+CORPUS_SCHEMA = {
+    "detections": '''
         CREATE TABLE IF NOT EXISTS detections (
             id TEXT PRIMARY KEY,
-            timestamp TEXT,
+            timestamp INTEGER,
             camera_id TEXT,
             object_type TEXT,
             confidence REAL,
@@ -87,33 +330,69 @@ def create_sample_data():
             description TEXT,
             metadata TEXT
         )
-    ''')
-    
-    cursor.execute('''
+    ''',
+    "reports": '''
         CREATE TABLE IF NOT EXISTS reports (
             id TEXT PRIMARY KEY,
             title TEXT,
             content TEXT,
             report_type TEXT,
-            created_at TEXT,
+            created_at INTEGER,
             author TEXT,
             status TEXT,
             metadata TEXT
         )
-    ''')
-    
-    cursor.execute('''
+    ''',
+    "violations": '''
         CREATE TABLE IF NOT EXISTS violations (
             id TEXT PRIMARY KEY,
             violation_type TEXT,
             description TEXT,
             severity TEXT,
             location TEXT,
-            timestamp TEXT,
+            timestamp INTEGER,
             status TEXT,
             metadata TEXT
         )
-    ''')
+    ''',
+}
+
+def to_epoch(timestamp: str) -> int:
+    """Epoch seconds for a UTC TIMESTAMP_FORMAT string"""
+    return calendar.timegm(datetime.strptime(timestamp, TIMESTAMP_FORMAT).timetuple())
+
+def to_timestamp(epoch: int) -> str:
+    """TIMESTAMP_FORMAT string for stored epoch seconds"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+def migrate_timestamp_columns(conn):
+    """Rebuild tables from older databases that stored timestamps as TEXT"""
+    for table, column in TIMESTAMP_COLUMNS.items():
+        declared = {row['name']: row['type'] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if declared.get(column) != "TEXT":
+            continue
+            
+        # Column affinity can't be altered in place, so copy into the new schema
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_text")
+        conn.execute(CORPUS_SCHEMA[table])
+        columns = ", ".join(declared)
+        converted = ", ".join(
+            f"CAST(strftime('%s', {name}) AS INTEGER)" if name == column else name
+            for name in declared
+        )
+        conn.execute(f"INSERT INTO {table} ({columns}) SELECT {converted} FROM {table}_text")
+        conn.execute(f"DROP TABLE {table}_text")
+
+def create_sample_data():
+    """Create sample data for demonstration"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # Create tables if they don't exist
+    migrate_timestamp_columns(conn)
+    for table, schema in CORPUS_SCHEMA.items():
+        cursor.execute(schema)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} ({TIMESTAMP_COLUMNS[table]} DESC)")
     
     # Insert sample data
     sample_detections = [
@@ -137,7 +416,11 @@ def create_sample_data():
         ("vio_003", "Vehicle Violation", "Vehicle parked in unauthorized area", "low", "Parking Lot", "2024-01-15 12:00:00", "pending", '{"license_plate": "XYZ789", "violation_type": "no_parking_zone"}'),
     ]
     
-    # Insert sample data
+    # Insert sample data with epoch timestamps
+    sample_detections = [(*row[:1], to_epoch(row[1]), *row[2:]) for row in sample_detections]
+    sample_reports = [(*row[:4], to_epoch(row[4]), *row[5:]) for row in sample_reports]
+    sample_violations = [(*row[:5], to_epoch(row[5]), *row[6:]) for row in sample_violations]
+    
     cursor.executemany('''
         INSERT OR REPLACE INTO detections 
         (id, timestamp, camera_id, object_type, confidence, location, description, metadata)
@@ -156,17 +439,63 @@ def create_sample_data():
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     ''', sample_violations)
     
+    refresh_keyword_index(conn)
     conn.commit()
-    conn.close()
     print("✅ Sample data created successfully!")
 
+def refresh_keyword_index(conn):
+    """Rebuild the FTS5 tables searches use to pick candidates for reranking"""
+    for table, text_for in CORPUS_TEXT.items():
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(id UNINDEXED, text)")
+        conn.execute(f"DELETE FROM {table}_fts")
+        rows = conn.execute(f"SELECT * FROM {table}").fetchall()
+        conn.executemany(f"INSERT INTO {table}_fts (id, text) VALUES (?, ?)",
+                         [(row['id'], text_for(row)) for row in rows])
+
+def keyword_match(query: str) -> Optional[str]:
+    """FTS5 expression matching any query term as a prefix"""
+    terms = dict.fromkeys(preprocess_text(query).split())
+    return " OR ".join(f'"{term}"*' for term in terms) or None
+
+def candidate_rows(conn, table: str, recent_sql: str, match: Optional[str], limit: int) -> list:
+    """Keyword-matched rows to rerank, or the most recent rows if none match"""
+    if match:
+        rows = conn.execute(KEYWORD_SQL[table], (match, FTS_CANDIDATES)).fetchall()
+        if rows:
+            return rows
+    return conn.execute(recent_sql, (limit,)).fetchall()
+
+def build_embedding_indexes():
+    """Encode and parse every stored row so searches start with warm caches
+    
+    Indexes saved by an earlier run are memory-mapped from EMBEDDING_CACHE_DIR,
+    so only rows added or changed since then are encoded.
+    """
+    encoder = f"{type(semantic_model).__name__}:{MODEL_NAME}"
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    
+    conn = get_db_connection()
+    batches = []
+    for table, text_for in CORPUS_TEXT.items():
+        embedding_indexes[table].load(os.path.join(EMBEDDING_CACHE_DIR, table), encoder)
+        rows = conn.execute(f"SELECT * FROM {table}").fetchall()
+        for row in rows:
+            row_metadata(row)
+        batches.append((embedding_indexes[table], [row['id'] for row in rows], [text_for(row) for row in rows]))
+    
+    index_rows(batches)
+    for table, index in embedding_indexes.items():
+        if index.dirty:
+            index.save(os.path.join(EMBEDDING_CACHE_DIR, table), encoder)
+    print("✅ Corpus embeddings cached!")
+
+# Runs of punctuation collapse into a single space
+_CLEAN_RE = re.compile(r'[^\w\s]+')
+
 def preprocess_text(text: str) -> str:
     """Preprocess text for better semantic matching"""
-    # Remove special characters and normalize
-    text = re.sub(r'[^\w\s]', ' ', text.lower())
-    # Remove extra whitespace
-    text = ' '.join(text.split())
-    return text
+    # Remove special characters, lowercase and collapse whitespace in one pass
+    return ' '.join(_CLEAN_RE.sub(' ', text.lower()).split())
 
 def get_semantic_embeddings(texts: List[str]) -> np.ndarray:
     """Get semantic embeddings for a list of texts"""
@@ -176,14 +505,31 @@ def get_semantic_embeddings(texts: List[str]) -> np.ndarray:
     # Preprocess texts
     processed_texts = [preprocess_text(text) for text in texts]
     
-    # Get embeddings
-    embeddings = semantic_model.encode(processed_texts)
-    return embeddings
+    # Get unit-length embeddings as one contiguous float32 block
+    embeddings = semantic_model.encode(processed_texts, batch_size=ENCODE_BATCH_SIZE,
+                                       convert_to_numpy=True, normalize_embeddings=True)
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
 
-def calculate_relevance_scores(query_embedding: np.ndarray, content_embeddings: np.ndarray) -> List[float]:
-    """Calculate relevance scores using cosine similarity"""
-    similarities = cosine_similarity([query_embedding], content_embeddings)[0]
-    return similarities.tolist()
+def quantize_embeddings(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization, returning (codes, scales)
+    
+    Each row is recovered as codes * scale, at a quarter of float32's memory.
+    """
+    peak = np.max(np.abs(embeddings), axis=1, keepdims=True)
+    peak[peak == 0] = 1.0
+    codes = np.round(embeddings / peak * 127).astype(np.int8)
+    return codes, (peak[:, 0] / 127).astype(np.float32)
+
+def calculate_relevance_scores(query_embedding: np.ndarray, codes: np.ndarray,
+                               scales: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each quantized row to the query
+    
+    Both sides are unit length, so this is the dequantized dot product. The
+    int8 products sum well below 2**24 and are computed exactly by a float32 GEMV.
+    """
+    query_codes, query_scale = quantize_embeddings(query_embedding[np.newaxis, :])
+    dots = codes.astype(np.float32).dot(query_codes[0].astype(np.float32))
+    return dots * scales * query_scale[0]
 
 @app.on_event("startup")
 async def startup_event():
@@ -194,6 +540,7 @@ async def startup_event():
     
     # Create sample data
     create_sample_data()
+    build_embedding_indexes()
     print("✅ Semantic Search Backend ready!")
 
 @app.get("/health")
@@ -201,99 +548,112 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "model": "SentenceTransformer",
+        "model": type(semantic_model).__name__ if semantic_model else None,
         "model_name": MODEL_NAME,
         "system": "Semantic Search"
     }
 
-@app.post("/search", response_model=List[SearchResult])
+def json_response(payload: Any) -> Response:
+    """Serialize plain data straight to JSON bytes, skipping response-model validation"""
+    if ORJSON_AVAILABLE:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload).encode()
+    return Response(content=body, media_type="application/json")
+
+def detection_result(det, score: float) -> Dict[str, Any]:
+    """Search result for a detection row"""
+    return {
+        "id": det['id'],
+        "title": f"{det['object_type'].title()} Detection",
+        "content": det['description'],
+        "type": "detection",
+        "relevance_score": score,
+        "timestamp": to_timestamp(det['timestamp']),
+        "metadata": row_metadata(det)
+    }
+
+def report_result(rep, score: float) -> Dict[str, Any]:
+    """Search result for a report row"""
+    return {
+        "id": rep['id'],
+        "title": rep['title'],
+        "content": rep['content'],
+        "type": "report",
+        "relevance_score": score,
+        "timestamp": to_timestamp(rep['created_at']),
+        "metadata": row_metadata(rep)
+    }
+
+def violation_result(vio, score: float) -> Dict[str, Any]:
+    """Search result for a violation row"""
+    return {
+        "id": vio['id'],
+        "title": f"{vio['violation_type']} Violation",
+        "content": vio['description'],
+        "type": "violation",
+        "relevance_score": score,
+        "timestamp": to_timestamp(vio['timestamp']),
+        "metadata": row_metadata(vio)
+    }
+
+RESULT_BUILDERS = {
+    "detections": detection_result,
+    "reports": report_result,
+    "violations": violation_result,
+}
+
+# Results are built as plain dicts; SearchResult only documents their shape
+@app.post("/search", responses={200: {"model": List[SearchResult]}})
 async def semantic_search(search_query: SearchQuery):
     """Perform semantic search across all data sources"""
     if semantic_model is None:
         raise HTTPException(status_code=500, detail="Semantic model not loaded")
     
     try:
-        # Get query embedding
-        query_embedding = get_semantic_embeddings([search_query.query])[0]
-        
-        results = []
         conn = get_db_connection()
-        cursor = conn.cursor()
+        match = keyword_match(search_query.query)
+        detections = reports = violations = []
         
-        # Search detections
         if search_query.search_type in ["all", "detections"]:
-            cursor.execute("SELECT * FROM detections ORDER BY timestamp DESC LIMIT ?", (search_query.limit,))
-            detections = cursor.fetchall()
+            detections = candidate_rows(conn, "detections", DET_SQL, match, search_query.limit)
             
-            if detections:
-                # Prepare content for embedding
-                detection_content = []
-                for det in detections:
-                    content = f"{det['object_type']} detected at {det['location']} with confidence {det['confidence']}. {det['description']}"
-                    detection_content.append(content)
-                
-                # Get embeddings and calculate relevance
-                detection_embeddings = get_semantic_embeddings(detection_content)
-                relevance_scores = calculate_relevance_scores(query_embedding, detection_embeddings)
-                
-                for i, det in enumerate(detections):
-                    results.append(SearchResult(
-                        id=det['id'],
-                        title=f"{det['object_type'].title()} Detection",
-                        content=det['description'],
-                        type="detection",
-                        relevance_score=float(relevance_scores[i]),
-                        timestamp=det['timestamp'],
-                        metadata=json.loads(det['metadata']) if det['metadata'] else {}
-                    ))
-        
-        # Search reports
         if search_query.search_type in ["all", "reports"]:
-            cursor.execute("SELECT * FROM reports ORDER BY created_at DESC LIMIT ?", (search_query.limit,))
-            reports = cursor.fetchall()
+            reports = candidate_rows(conn, "reports", REP_SQL, match, search_query.limit)
             
-            if reports:
-                report_content = [f"{rep['title']}. {rep['content']}" for rep in reports]
-                report_embeddings = get_semantic_embeddings(report_content)
-                relevance_scores = calculate_relevance_scores(query_embedding, report_embeddings)
-                
-                for i, rep in enumerate(reports):
-                    results.append(SearchResult(
-                        id=rep['id'],
-                        title=rep['title'],
-                        content=rep['content'],
-                        type="report",
-                        relevance_score=float(relevance_scores[i]),
-                        timestamp=rep['created_at'],
-                        metadata=json.loads(rep['metadata']) if rep['metadata'] else {}
-                    ))
-        
-        # Search violations
         if search_query.search_type in ["all", "violations"]:
-            cursor.execute("SELECT * FROM violations ORDER BY timestamp DESC LIMIT ?", (search_query.limit,))
-            violations = cursor.fetchall()
-            
-            if violations:
-                violation_content = [f"{vio['violation_type']} at {vio['location']}. {vio['description']}" for vio in violations]
-                violation_embeddings = get_semantic_embeddings(violation_content)
-                relevance_scores = calculate_relevance_scores(query_embedding, violation_embeddings)
-                
-                for i, vio in enumerate(violations):
-                    results.append(SearchResult(
-                        id=vio['id'],
-                        title=f"{vio['violation_type']} Violation",
-                        content=vio['description'],
-                        type="violation",
-                        relevance_score=float(relevance_scores[i]),
-                        timestamp=vio['timestamp'],
-                        metadata=json.loads(vio['metadata']) if vio['metadata'] else {}
-                    ))
+            violations = candidate_rows(conn, "violations", VIO_SQL, match, search_query.limit)
         
-        conn.close()
+        # Embed the query and any uncached rows in one forward pass
+        query_embedding = index_rows([
+            (embedding_indexes["detections"], [det['id'] for det in detections],
+             [detection_text(det) for det in detections]),
+            (embedding_indexes["reports"], [rep['id'] for rep in reports],
+             [report_text(rep) for rep in reports]),
+            (embedding_indexes["violations"], [vio['id'] for vio in violations],
+             [violation_text(vio) for vio in violations]),
+        ], [search_query.query])[0]
         
-        # Sort by relevance score and limit results
-        results.sort(key=lambda x: x.relevance_score, reverse=True)
-        return results[:search_query.limit]
+        # Score every candidate, keeping rows alongside for the ones that make the cut
+        scores = []
+        candidates = []
+        for table, rows in (("detections", detections), ("reports", reports), ("violations", violations)):
+            if rows:
+                codes, scales = embedding_indexes[table].vectors([row['id'] for row in rows])
+                scores.append(calculate_relevance_scores(query_embedding, codes, scales))
+                candidates.extend((table, row) for row in rows)
+                
+        if not candidates or search_query.limit <= 0:
+            return json_response([])
+            
+        # Top results by relevance without sorting every candidate
+        scores = np.concatenate(scores)
+        limit = min(search_query.limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        
+        results = [RESULT_BUILDERS[candidates[i][0]](candidates[i][1], float(scores[i])) for i in top]
+        return json_response(results)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
@@ -334,8 +694,6 @@ async def get_search_analytics():
     cursor.execute("SELECT COUNT(*) FROM violations")
     violation_count = cursor.fetchone()[0]
     
-    conn.close()
-    
     return {
         "total_detections": detection_count,
         "total_reports": report_count,
@@ -2,17 +2,32 @@
 Public/Internal Status Page
 Shows real-time system health and historical uptime
 """
+import asyncio
+import heapq
+import json
+import sys
 import time
-from typing import Dict, List, Optional
-from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from dataclasses import asdict, dataclass, field
 from enum import Enum
+from operator import attrgetter
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
 import logging
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Seconds between background snapshot refreshes, and how long a snapshot may be served
+SNAPSHOT_REFRESH_INTERVAL = 5.0
+SNAPSHOT_TTL = 10.0
+
 
 class ComponentStatus(Enum):
     """Component status levels"""
@@ -23,7 +38,26 @@ class ComponentStatus(Enum):
     MAINTENANCE = "maintenance"
 
 
-@dataclass
+# Overall status is the worst component status, in this order
+STATUS_SEVERITY = {
+    ComponentStatus.OPERATIONAL: 0,
+    ComponentStatus.MAINTENANCE: 1,
+    ComponentStatus.DEGRADED: 2,
+    ComponentStatus.PARTIAL_OUTAGE: 3,
+    ComponentStatus.MAJOR_OUTAGE: 4
+}
+
+# Plain dict lookup instead of the enum's `value` descriptor on serialization paths
+STATUS_VALUE = {status: status.value for status in ComponentStatus}
+
+# Incident ordering key
+by_start_time = attrgetter("started_at")
+
+# Slotted dataclasses need Python 3.10; older interpreters keep a __dict__
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class StatusComponent:
     """System component for status page"""
     name: str
@@ -38,14 +72,22 @@ class StatusComponent:
         return {
             "name": self.name,
             "description": self.description,
-            "status": self.status.value,
+            "status": STATUS_VALUE[self.status],
             "response_time_ms": self.response_time_ms,
             "uptime_percent": self.uptime_percent,
             "last_incident": self.last_incident
         }
 
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
+class IncidentUpdate:
+    """Incident timeline entry (encoded by orjson without a dict per entry)"""
+    timestamp: float
+    message: str
+    status: str
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class Incident:
     """Status page incident"""
     incident_id: str
@@ -55,15 +97,11 @@ class Incident:
     severity: str  # "critical", "major", "minor"
     started_at: float
     resolved_at: Optional[float] = None
-    updates: List[Dict] = field(default_factory=list)
+    updates: List[IncidentUpdate] = field(default_factory=list)
     
     def add_update(self, message: str, status: Optional[str] = None):
         """Add incident update"""
-        self.updates.append({
-            "timestamp": time.time(),
-            "message": message,
-            "status": status or self.status
-        })
+        self.updates.append(IncidentUpdate(time.time(), message, status or self.status))
         
         if status:
             self.status = status
@@ -79,8 +117,9 @@ class Incident:
         end_time = self.resolved_at or time.time()
         return (end_time - self.started_at) / 60
     
-    def to_dict(self) -> dict:
-        """Convert to dictionary"""
+    def to_dict(self, now: Optional[float] = None) -> dict:
+        """Convert to dictionary, measuring open incidents up to `now`"""
+        end_time = self.resolved_at or now or time.time()
         return {
             "incident_id": self.incident_id,
             "title": self.title,
@@ -89,7 +128,7 @@ class Incident:
             "severity": self.severity,
             "started_at": self.started_at,
             "resolved_at": self.resolved_at,
-            "duration_minutes": round(self.duration_minutes, 2),
+            "duration_minutes": round((end_time - self.started_at) / 60, 2),
             "updates": self.updates
         }
 
@@ -108,6 +147,7 @@ class StatusPage:
     def __init__(self):
         self.components: Dict[str, StatusComponent] = {}
         self.incidents: Dict[str, Incident] = {}
+        self._snapshot: Optional[Tuple[float, bytes]] = None
         self._init_components()
     
     def _init_components(self):
@@ -164,62 +204,99 @@ class StatusPage:
         return incident
     
     def get_overall_status(self) -> ComponentStatus:
-        """Get overall system status"""
-        statuses = [comp.status for comp in self.components.values()]
-        
-        if any(s == ComponentStatus.MAJOR_OUTAGE for s in statuses):
-            return ComponentStatus.MAJOR_OUTAGE
-        elif any(s == ComponentStatus.PARTIAL_OUTAGE for s in statuses):
-            return ComponentStatus.PARTIAL_OUTAGE
-        elif any(s == ComponentStatus.DEGRADED for s in statuses):
-            return ComponentStatus.DEGRADED
-        elif any(s == ComponentStatus.MAINTENANCE for s in statuses):
-            return ComponentStatus.MAINTENANCE
-        else:
-            return ComponentStatus.OPERATIONAL
+        """Get overall system status (the most severe component status)"""
+        return max((comp.status for comp in self.components.values()),
+                   key=STATUS_SEVERITY.__getitem__, default=ComponentStatus.OPERATIONAL)
     
     def get_status_summary(self) -> dict:
         """Get status page summary"""
+        now = time.time()
         overall = self.get_overall_status()
-        active_incidents = [
-            inc for inc in self.incidents.values()
-            if inc.status != "resolved"
+        
+        components = [
+            {
+                "name": comp.name,
+                "description": comp.description,
+                "status": STATUS_VALUE[comp.status],
+                "response_time_ms": comp.response_time_ms,
+                "uptime_percent": comp.uptime_percent,
+                "last_incident": comp.last_incident
+            }
+            for comp in self.components.values()
         ]
         
+        # Select the newest ten without sorting the whole history; each dict is
+        # built once and shared between the active and recent lists
+        recent = heapq.nlargest(10, self.incidents.values(), key=by_start_time)
+        active = sorted((inc for inc in self.incidents.values() if inc.status != "resolved"),
+                        key=by_start_time, reverse=True)
+        incident_dicts = {inc.incident_id: inc.to_dict(now) for inc in recent + active}
+        active_incidents = [incident_dicts[inc.incident_id] for inc in active]
+        recent_incidents = [incident_dicts[inc.incident_id] for inc in recent]
+        
         return {
-            "overall_status": overall.value,
-            "components": [comp.to_dict() for comp in self.components.values()],
-            "active_incidents": [inc.to_dict() for inc in active_incidents],
-            "recent_incidents": [
-                inc.to_dict() for inc in sorted(
-                    self.incidents.values(),
-                    key=lambda x: x.started_at,
-                    reverse=True
-                )[:10]
-            ],
-            "timestamp": time.time()
+            "overall_status": STATUS_VALUE[overall],
+            "components": components,
+            "active_incidents": active_incidents,
+            "recent_incidents": recent_incidents,
+            "timestamp": now
         }
+    
+    def get_status_json(self) -> bytes:
+        """Get status page summary encoded as JSON"""
+        summary = self.get_status_summary()
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(summary)
+        return json.dumps(summary, default=asdict).encode()
+    
+    def refresh_snapshot(self) -> bytes:
+        """Re-encode the status summary and keep it as the current snapshot"""
+        payload = self.get_status_json()
+        self._snapshot = (time.monotonic(), payload)
+        return payload
+    
+    def get_snapshot(self) -> bytes:
+        """Precomputed status JSON, rebuilt live when missing or expired"""
+        snapshot = self._snapshot
+        if snapshot and time.monotonic() - snapshot[0] < SNAPSHOT_TTL:
+            return snapshot[1]
+        return self.refresh_snapshot()
 
 
 # Global instance
 status_page = StatusPage()
 
+app = FastAPI(title="Verolux - Status Page")
 
+snapshot_task: Optional[asyncio.Task] = None
 
 
+async def refresh_snapshot_loop():
+    """Rebuild the status snapshot off the request path"""
+    while True:
+        await asyncio.sleep(SNAPSHOT_REFRESH_INTERVAL)
+        try:
+            status_page.refresh_snapshot()
+        except Exception as e:
+            logger.error(f"Status snapshot refresh failed: {e}")
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Warm the status snapshot and start refreshing it"""
+    global snapshot_task
+    status_page.refresh_snapshot()
+    snapshot_task = asyncio.create_task(refresh_snapshot_loop())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the snapshot refresh"""
+    if snapshot_task:
+        snapshot_task.cancel()
 
 
-
-
-
-
-
-
-
-
-
-
+@app.get("/status")
+async def get_status():
+    """Status summary served from the precomputed snapshot"""
+    return Response(content=status_page.get_snapshot(), media_type="application/json")
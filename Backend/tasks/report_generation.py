@@ -2,40 +2,63 @@
 Report Generation Tasks
 Generate PDF reports, incident summaries in background
 """
+from celery import chain
 from celery_app import app
 import time
 
+@app.task(bind=True, name='tasks.report_generation.load_incident_data')
+def load_incident_data(self, session_id, progress_task_id=None):
+    """Load the session data an incident report is built from"""
+    self.update_state(task_id=progress_task_id, state='PROGRESS', meta={'progress': 0, 'stage': 'Loading data'})
+    time.sleep(1)
+    return {'session_id': session_id}
+
+@app.task(bind=True, name='tasks.report_generation.render_incident_pdf')
+def render_incident_pdf(self, incident_data, language='en', progress_task_id=None):
+    """Render the incident report PDF"""
+    self.update_state(task_id=progress_task_id, state='PROGRESS', meta={'progress': 30, 'stage': 'Generating PDF'})
+    time.sleep(2)
+    session_id = incident_data['session_id']
+    return {
+        'session_id': session_id,
+        'file_path': f'/reports/Incident_{session_id}_{language}.pdf',
+        'language': language
+    }
+
+@app.task(bind=True, name='tasks.report_generation.upload_incident_report')
+def upload_incident_report(self, report, progress_task_id=None):
+    """Upload a rendered incident report to storage"""
+    self.update_state(task_id=progress_task_id, state='PROGRESS', meta={'progress': 70, 'stage': 'Uploading to storage'})
+    time.sleep(1)
+    return {
+        'status': 'success',
+        'report_id': f"INC-{report['session_id']}",
+        'file_path': report['file_path'],
+        'language': report['language']
+    }
+
 @app.task(bind=True, name='tasks.report_generation.generate_incident_report')
 def generate_incident_report(self, session_id, language='en'):
-    """Generate multi-language incident report"""
-    try:
-        self.update_state(state='PROGRESS', meta={'progress': 0, 'stage': 'Loading data'})
-        time.sleep(1)
-        
-        self.update_state(state='PROGRESS', meta={'progress': 30, 'stage': 'Generating PDF'})
-        time.sleep(2)
-        
-        self.update_state(state='PROGRESS', meta={'progress': 70, 'stage': 'Uploading to storage'})
-        time.sleep(1)
-        
-        self.update_state(state='PROGRESS', meta={'progress': 100, 'stage': 'Complete'})
-        
-        return {
-            'status': 'success',
-            'report_id': f'INC-{session_id}',
-            'file_path': f'/reports/Incident_{session_id}_{language}.pdf',
-            'language': language
-        }
-    except Exception as e:
-        return {'status': 'failed', 'error': str(e)}
+    """Generate multi-language incident report; the result resolves to the uploaded report"""
+    # Separate stage tasks let workers pipeline loading, rendering and uploading across reports;
+    # replacing this task hands its id to the chain, so callers still get the final result.
+    # Only the last stage inherits that id, so every stage reports progress against it explicitly
+    progress_task_id = self.request.id
+    return self.replace(chain(
+        load_incident_data.s(session_id, progress_task_id=progress_task_id),
+        render_incident_pdf.s(language, progress_task_id=progress_task_id),
+        upload_incident_report.s(progress_task_id=progress_task_id)
+    ))
 
 @app.task(name='tasks.report_generation.generate_daily_summary')
 def generate_daily_summary():
     """Generate daily security summary report"""
+    # One clock read, so the date always matches the timestamp (even across midnight)
+    now = time.time()
     return {
         'status': 'success',
-        'report_date': time.strftime('%Y-%m-%d'),
-        'generated_at': time.time()
+        'report_date': time.strftime('%Y-%m-%d', time.localtime(now)),
+        'generated_at': now
     }
 
 @app.task(name='tasks.report_generation.export_analytics_data')
@@ -5,22 +5,14 @@ Provides shared test fixtures for all tests
 import os
 import sys
 import pytest
+import pytest_asyncio
 from typing import Generator, Dict, Any
 from fastapi.testclient import TestClient
-import asyncio
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-
 @pytest.fixture(scope="session")
 def test_app():
     """Create a test FastAPI application instance."""
@@ -29,15 +21,46 @@ def test_app():
     return app
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
+def backend():
+    """The backend_server module, imported on first use rather than at collection."""
+    import backend_server
+    return backend_server
+
+
+@pytest.fixture(scope="session")
 def client(test_app) -> Generator[TestClient, None, None]:
-    """Create a test client for the FastAPI application."""
+    """Create a test client for the FastAPI application (startup runs once per session)."""
     with TestClient(test_app) as test_client:
         yield test_client
 
 
+@pytest_asyncio.fixture
+async def aclient(test_app):
+    """Async HTTP client calling the app in-process, without TestClient's thread portal."""
+    import httpx
+    transport = httpx.ASGITransport(app=test_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+        yield async_client
+
+
 @pytest.fixture(scope="session")
-def mock_yolo_model():
+def mock_yolo_result():
+    """Mock YOLO result list: one person detection at the center."""
+    import numpy as np
+    from types import SimpleNamespace
+    boxes = SimpleNamespace(
+        xyxy=np.array([[100, 100, 200, 300]]),
+        conf=np.array([0.85]),
+        cls=np.array([0])
+    )
+    boxes.cpu = lambda: boxes
+    boxes.numpy = lambda: boxes.xyxy
+    return [SimpleNamespace(boxes=boxes)]
+
+
+@pytest.fixture(scope="session")
+def mock_yolo_model(mock_yolo_result):
     """Mock YOLO model for testing without loading actual model."""
     class MockYOLOModel:
         def __init__(self):
@@ -45,39 +68,22 @@ def mock_yolo_model():
             
         def __call__(self, frame, **kwargs):
             """Return mock detections."""
-            class MockResult:
-                def __init__(self):
-                    self.boxes = MockBoxes()
-                    
-            class MockBoxes:
-                def __init__(self):
-                    import numpy as np
-                    # Mock detection: one person at center
-                    self.xyxy = np.array([[100, 100, 200, 300]])
-                    self.conf = np.array([0.85])
-                    self.cls = np.array([0])
-                    
-                def cpu(self):
-                    return self
-                    
-                def numpy(self):
-                    return self.xyxy
-            
-            return [MockResult()]
+            return mock_yolo_result
     
     return MockYOLOModel()
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def sample_video_frame():
-    """Generate a sample video frame for testing."""
+    """Generate a sample video frame for testing (read-only; copy it to draw on it)."""
     import numpy as np
-    # Create a blank 640x480 BGR image
+    # Create a blank 640x480 BGR image, shared across the session
     frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    frame.setflags(write=False)
     return frame
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def sample_detection():
     """Sample detection data."""
     return {
@@ -88,7 +94,7 @@ def sample_detection():
     }
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def sample_gate_config():
     """Sample gate configuration."""
     return {
@@ -117,7 +123,7 @@ def temp_upload_dir(tmp_path):
     return str(upload_dir)
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def sample_zone_polygon():
     """Sample zone polygon coordinates."""
     return [
@@ -128,15 +134,6 @@ def sample_zone_polygon():
     ]
 
 
-@pytest.fixture(autouse=True)
-def reset_environment():
-    """Reset environment variables before each test."""
-    original_env = os.environ.copy()
-    yield
-    os.environ.clear()
-    os.environ.update(original_env)
-
-
 @pytest.fixture(scope="function")
 def mock_database(tmp_path):
     """Create a temporary test database."""
@@ -147,9 +144,10 @@ def mock_database(tmp_path):
 # Mark all tests as unit by default
 def pytest_collection_modifyitems(config, items):
     """Add markers to tests based on their location."""
+    unit = pytest.mark.unit
     for item in items:
-        if "integration" not in item.keywords:
-            item.add_marker(pytest.mark.unit)
+        if item.get_closest_marker("integration") is None:
+            item.add_marker(unit)
 
 
 
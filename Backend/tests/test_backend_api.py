@@ -2,32 +2,38 @@
 Unit Tests for Backend API Endpoints
 Tests all FastAPI endpoints without requiring actual models
 """
+import os
 import pytest
-from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
-import json
+from unittest.mock import patch
+
+# Keep the API tests on one xdist worker so they share the session-scoped client
+pytestmark = pytest.mark.xdist_group("backend_client")
+
+# Camera-backed WebSocket tests only run when explicitly enabled
+requires_camera = pytest.mark.skipif(not os.environ.get("VEROLUX_CAMERA_TESTS"), reason="requires camera")
 
 
 @pytest.mark.api
+@pytest.mark.asyncio
 class TestHealthEndpoint:
     """Test health check endpoint."""
     
-    def test_health_endpoint_returns_200(self, client):
+    async def test_health_endpoint_returns_200(self, aclient):
         """Test that health endpoint returns 200 status."""
-        response = client.get("/health")
+        response = await aclient.get("/health")
         assert response.status_code == 200
     
-    def test_health_endpoint_returns_json(self, client):
+    async def test_health_endpoint_returns_json(self, aclient):
         """Test that health endpoint returns JSON response."""
-        response = client.get("/health")
+        response = await aclient.get("/health")
         assert response.headers["content-type"] == "application/json"
         data = response.json()
         assert "status" in data
         assert data["status"] == "healthy"
     
-    def test_health_endpoint_includes_uptime(self, client):
+    async def test_health_endpoint_includes_uptime(self, aclient):
         """Test that health endpoint includes uptime information."""
-        response = client.get("/health")
+        response = await aclient.get("/health")
         data = response.json()
         assert "uptime_seconds" in data
         assert isinstance(data["uptime_seconds"], (int, float))
@@ -35,17 +41,18 @@ class TestHealthEndpoint:
 
 
 @pytest.mark.api
+@pytest.mark.asyncio
 class TestInfoEndpoint:
     """Test system info endpoint."""
     
-    def test_info_endpoint_returns_200(self, client):
+    async def test_info_endpoint_returns_200(self, aclient):
         """Test that info endpoint returns 200 status."""
-        response = client.get("/info")
+        response = await aclient.get("/info")
         assert response.status_code == 200
     
-    def test_info_endpoint_structure(self, client):
+    async def test_info_endpoint_structure(self, aclient):
         """Test that info endpoint returns correct structure."""
-        response = client.get("/info")
+        response = await aclient.get("/info")
         data = response.json()
         assert "model" in data
         assert "device" in data
@@ -62,17 +69,12 @@ class TestVideoUploadEndpoint:
         response = client.post("/upload-video")
         assert response.status_code == 422
     
-    @patch('backend_server.UPLOAD_DIR', '/tmp/test_uploads')
-    def test_upload_with_file_returns_200(self, client, tmp_path):
+    def test_upload_with_file_returns_200(self, client):
         """Test successful file upload."""
-        # Create a dummy video file
-        test_file = tmp_path / "test_video.mp4"
-        test_file.write_bytes(b"fake video content")
-        
-        with open(test_file, "rb") as f:
+        with patch('backend_server.UPLOAD_DIR', '/tmp/test_uploads'):
             response = client.post(
                 "/upload-video",
-                files={"video_file": ("test.mp4", f, "video/mp4")}
+                files={"video_file": ("test.mp4", b"fake video content", "video/mp4")}
             )
         
         # Should return 200 or redirect
@@ -83,40 +85,31 @@ class TestVideoUploadEndpoint:
 class TestHelperFunctions:
     """Test helper functions in backend server."""
     
-    def test_parse_video_source_webcam(self):
-        """Test parsing webcam source."""
-        from backend_server import parse_video_source
-        source = parse_video_source("webcam:0")
-        assert source == 0
+    @pytest.mark.parametrize("video_source,expected", [
+        ("webcam:0", 0),
+        ("rtsp://camera.local/stream", "rtsp://camera.local/stream"),
+    ])
+    def test_parse_video_source(self, backend, video_source, expected):
+        """Test webcam and RTSP sources parse to capture arguments."""
+        assert backend.parse_video_source(video_source) == expected
     
-    def test_parse_video_source_rtsp(self):
-        """Test parsing RTSP source."""
-        from backend_server import parse_video_source
-        source = parse_video_source("rtsp://camera.local/stream")
-        assert source == "rtsp://camera.local/stream"
-    
-    def test_parse_video_source_file(self):
-        """Test parsing file source."""
-        from backend_server import parse_video_source
-        source = parse_video_source("file:///path/to/video.mp4")
-        assert "video.mp4" in source
-    
-    def test_parse_video_source_youtube(self):
-        """Test parsing YouTube source."""
-        from backend_server import parse_video_source
-        source = parse_video_source("youtube:dQw4w9WgXcQ")
-        assert "dQw4w9WgXcQ" in source
+    @pytest.mark.parametrize("video_source,fragment", [
+        ("file:///path/to/video.mp4", "video.mp4"),
+        ("youtube:dQw4w9WgXcQ", "dQw4w9WgXcQ"),
+    ])
+    def test_parse_video_source_resolves_path(self, backend, video_source, fragment):
+        """Test file and YouTube sources resolve to a path or URL naming the source."""
+        assert fragment in backend.parse_video_source(video_source)
 
 
 @pytest.mark.unit
 class TestDetectionProcessing:
     """Test detection processing functions."""
     
-    def test_normalize_bbox(self):
+    def test_normalize_bbox(self, backend):
         """Test bounding box normalization."""
-        from backend_server import normalize_bbox
         # Image 640x480, bbox [100, 100, 200, 300]
-        normalized = normalize_bbox([100, 100, 200, 300], 640, 480)
+        normalized = backend.normalize_bbox([100, 100, 200, 300], 640, 480)
         assert len(normalized) == 4
         assert 0 <= normalized[0] <= 1
         assert 0 <= normalized[1] <= 1
@@ -137,11 +130,9 @@ class TestDetectionProcessing:
 class TestWebSocketConnection:
     """Test WebSocket connection and streaming."""
     
-    @patch('backend_server.YOLO_MODEL')
-    def test_websocket_detection_connection(self, mock_model, client):
+    @requires_camera
+    def test_websocket_detection_connection(self, client):
         """Test WebSocket detection stream connection."""
-        mock_model.return_value = MagicMock()
-        
         with client.websocket_connect("/ws/detections?source=webcam:0") as websocket:
             # Should receive connection info
             data = websocket.receive_json()
@@ -149,17 +140,15 @@ class TestWebSocketConnection:
             # Close cleanly
             websocket.close()
     
-    @patch('backend_server.GATE_CHECKER_AVAILABLE', False)
     def test_gate_check_unavailable_returns_error(self, client):
         """Test gate check returns error when not available."""
-        try:
+        from starlette.websockets import WebSocketDisconnect
+        with patch('backend_server.GATE_CHECKER_AVAILABLE', False):
             with client.websocket_connect("/ws/gate-check?source=webcam:0") as websocket:
-                data = websocket.receive_json()
-                # Should receive error or close connection
-                assert data is not None
-        except Exception:
-            # Expected if gate checker is not available
-            pass
+                assert websocket.receive_json() == {"type": "error", "message": "Gate checker not available"}
+                with pytest.raises(WebSocketDisconnect) as exc_info:
+                    websocket.receive_json()
+                assert exc_info.value.code == 1011
 
 
 @pytest.mark.unit
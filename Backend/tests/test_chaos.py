@@ -286,27 +286,15 @@ class TestEventDuplication:
     def test_event_deduplication_under_load(self):
         """Test event deduplication under high load"""
         from event_deduplication import EventDeduplicator
-        import threading
+        from concurrent.futures import ThreadPoolExecutor
         
         dedup = EventDeduplicator()
-        results = []
+        event = dict(camera_id="cam1", event_type="load_test", event_data={"test": "data"}, track_id=123)
+        events = [event] * 1000
         
-        def emit_events():
-            for _ in range(100):
-                event = dedup.emit_event(
-                    camera_id="cam1",
-                    event_type="load_test",
-                    event_data={"test": "data"},
-                    track_id=123
-                )
-                results.append(event is not None)
-        
-        # Run multiple threads
-        threads = [threading.Thread(target=emit_events) for _ in range(10)]
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
+        # Emit from 10 worker threads
+        with ThreadPoolExecutor(max_workers=10) as ex:
+            results = list(ex.map(lambda e: dedup.emit_event(**e) is not None, events))
         
         # Should have heavy deduplication
         emitted = sum(results)
@@ -0,0 +1,46 @@
+"""
+Unit Tests for Report Generation Tasks
+Runs the incident report chain eagerly, without a broker or result backend
+"""
+import pytest
+from unittest.mock import patch
+
+
+@pytest.fixture(scope="function")
+def eager_app(monkeypatch):
+    """Run Celery tasks in-process for the duration of a test."""
+    pytest.importorskip("celery")
+    from celery_app import app
+    monkeypatch.setitem(app.conf, "task_always_eager", True)
+    monkeypatch.setitem(app.conf, "task_eager_propagates", True)
+    return app
+
+
+@pytest.mark.unit
+class TestIncidentReport:
+    """Test the staged incident report task."""
+
+    def test_result_is_uploaded_report(self, eager_app):
+        """Test the replaced task still resolves to the upload result."""
+        from tasks.report_generation import generate_incident_report
+        with patch("tasks.report_generation.time.sleep"), \
+                patch("celery.app.task.Task.update_state"):
+            result = generate_incident_report.delay("S1", "id")
+
+        assert result.get() == {
+            "status": "success",
+            "report_id": "INC-S1",
+            "file_path": "/reports/Incident_S1_id.pdf",
+            "language": "id",
+        }
+
+    def test_every_stage_reports_progress_on_parent(self, eager_app):
+        """Test stage progress lands on the id the caller polls, in order."""
+        from tasks.report_generation import generate_incident_report
+        with patch("tasks.report_generation.time.sleep"), \
+                patch("celery.app.task.Task.update_state") as update_state:
+            result = generate_incident_report.delay("S1")
+
+        calls = [call.kwargs for call in update_state.call_args_list]
+        assert {call["task_id"] for call in calls} == {result.id}
+        assert [call["meta"]["progress"] for call in calls] == [0, 30, 70]
@@ -0,0 +1,722 @@
+"""
+Unit Tests for Reporting System
+Tests report queries against a temporary SQLite database
+"""
+import pytest
+from datetime import datetime, timedelta
+
+
+@pytest.fixture(scope="function")
+def reporting(tmp_path, monkeypatch):
+    """Create a reporting system backed by a temporary database."""
+    # Module import creates the default database in the working directory
+    monkeypatch.chdir(tmp_path)
+    from reporting_system import VeroluxReportingSystem
+    return VeroluxReportingSystem(db_path=str(tmp_path / "test_analytics.db"))
+
+
+@pytest.fixture(scope="function")
+def report_window():
+    """Time window covering the seeded detections."""
+    start = datetime(2025, 1, 1, 0, 0, 0)
+    return start, start + timedelta(days=1)
+
+
+@pytest.fixture(scope="function")
+def server_utc_plus_7(monkeypatch):
+    """Run the server as if its local time zone were UTC+7."""
+    import time
+    import reporting_system
+    monkeypatch.setenv("TZ", "ICT-7")
+    time.tzset()
+    # Parsed windows depend on the local zone
+    reporting_system._parse_window_strings.cache_clear()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+    reporting_system._parse_window_strings.cache_clear()
+
+
+def seed_detections(reporting, specs):
+    """Log (timestamp, camera_id, object_class, confidence) detections."""
+    from reporting_system import DetectionEvent
+    for timestamp, camera_id, object_class, confidence in specs:
+        reporting.log_detection(DetectionEvent(
+            timestamp=timestamp,
+            camera_id=camera_id,
+            object_class=object_class,
+            confidence=confidence,
+            bbox=[0.0, 0.0, 10.0, 10.0]
+        ))
+
+
+@pytest.mark.unit
+class TestReportQueries:
+    """Test report query result shapes."""
+
+    def test_object_counts(self, reporting, report_window):
+        """Test counts are grouped by object class."""
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=1), "cam1", "person", 0.9),
+            (start + timedelta(hours=2), "cam1", "person", 0.8),
+            (start + timedelta(hours=3), "cam2", "helmet", 0.7),
+        ])
+
+        assert reporting.get_object_counts(start, end) == {"person": 2, "helmet": 1}
+        assert reporting.get_object_counts(start, end, "cam2") == {"helmet": 1}
+
+    def test_peak_traffic_times(self, reporting, report_window):
+        """Test busiest hour is reported first."""
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=9), "cam1", "person", 0.9),
+            (start + timedelta(hours=9, minutes=30), "cam1", "person", 0.9),
+            (start + timedelta(hours=17), "cam1", "person", 0.9),
+        ])
+
+        result = reporting.get_peak_traffic_times("cam1", start, end)
+        assert result["busiest_hour"] == "09"
+        assert result["hourly_counts"] == {"09": 2, "17": 1}
+        assert result["total_detections"] == 3
+
+    def test_peak_traffic_times_empty(self, reporting, report_window):
+        """Test empty window returns empty peak data."""
+        start, end = report_window
+        assert reporting.get_peak_traffic_times("cam1", start, end) == {
+            "peak_hours": [], "hourly_counts": {}
+        }
+
+    def test_camera_summary(self, reporting, report_window):
+        """Test per-camera totals."""
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=1), "cam1", "person", 0.9),
+            (start + timedelta(hours=2), "cam1", "helmet", 0.7),
+            (start + timedelta(hours=3), "cam2", "person", 0.8),
+        ])
+
+        summary = reporting.get_camera_summary(start, end)
+        assert summary["total_cameras"] == 2
+        assert summary["total_events"] == 3
+        cameras = {camera["camera_id"]: camera for camera in summary["cameras"]}
+        assert cameras["cam1"]["unique_objects"] == 2
+
+    def test_compliance_report(self, reporting, report_window):
+        """Test compliance rate from PPE and person detections."""
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=1), "cam1", "person", 0.9),
+            (start + timedelta(hours=1), "cam1", "person", 0.9),
+            (start + timedelta(hours=1), "cam1", "helmet", 0.8),
+        ])
+
+        report = reporting.get_compliance_report(start, end)
+        assert report["total_persons"] == 2
+        assert report["total_ppe_detections"] == 1
+        assert report["compliance_rate"] == 50.0
+
+    def test_compliance_query_uses_class_index(self, reporting, report_window):
+        """Test PPE counts are index range lookups rather than a window scan."""
+        from reporting_system import _Q_PPE_DETECTIONS, PPE_CLASSES
+        start, end = report_window
+        conn = reporting._connect()
+        plan = [row["detail"] for row in conn.execute(
+            "EXPLAIN QUERY PLAN " + _Q_PPE_DETECTIONS, [*PPE_CLASSES, start, end]
+        )]
+        conn.close()
+
+        assert any("USING INDEX idx_det_class_ts" in detail for detail in plan)
+
+    def test_alert_metrics_empty(self, reporting, report_window):
+        """Test empty alert window."""
+        start, end = report_window
+        assert reporting.get_alert_metrics(start, end) == {
+            "alert_summary": [], "total_alerts": 0, "avg_response_time": 0
+        }
+
+    def test_shift_totals(self, reporting, report_window):
+        """Test detections are bucketed into shifts."""
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=8), "cam1", "person", 0.9),
+            (start + timedelta(hours=16), "cam1", "person", 0.9),
+            (start + timedelta(hours=16), "cam1", "helmet", 0.9),
+            (start + timedelta(hours=2), "cam1", "person", 0.9),
+        ])
+
+        assert reporting.get_shift_totals(start, end) == {
+            "morning": {"person": 1},
+            "afternoon": {"person": 1, "helmet": 1},
+            "night": {"person": 1},
+        }
+
+
+@pytest.mark.unit
+class TestAnomalySummary:
+    """Test anomaly detection against historical baseline."""
+
+    def test_spike_above_history_is_flagged(self, reporting, report_window):
+        """Test a class well above its historical daily rate is flagged."""
+        start, end = report_window
+        history = [(start - timedelta(days=day, hours=12), "cam1", "person", 0.9)
+                   for day in range(1, 8)]
+        spike = [(start + timedelta(hours=hour), "cam1", "person", 0.9)
+                 for hour in range(5)]
+        seed_detections(reporting, history + spike)
+
+        summary = reporting.get_anomaly_summary(start, end)
+        assert summary["baseline"]["person"]["normal_count"] == 5
+        assert len(summary["anomalies"]) == 1
+        assert summary["anomalies"][0]["object_class"] == "person"
+        assert summary["anomalies"][0]["severity"] == "high"
+
+    def test_steady_rate_not_flagged(self, reporting, report_window):
+        """Test a class at its historical rate is not flagged."""
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(days=1 - day, hours=12), "cam1", "person", 0.9)
+            for day in range(1, 9)
+        ])
+
+        summary = reporting.get_anomaly_summary(start, end)
+        assert summary["baseline"]["person"]["normal_count"] == 1
+        assert summary["anomalies"] == []
+
+    def test_noisy_history_widens_threshold(self, reporting, report_window):
+        """Test a count within two standard deviations of a noisy history is not flagged."""
+        start, end = report_window
+        daily = [1, 5, 1, 5, 1, 5, 1]
+        history = [(start - timedelta(days=day + 1) + timedelta(hours=12, minutes=n), "cam1", "person", 0.9)
+                   for day, count in enumerate(daily) for n in range(count)]
+        current = [(start + timedelta(hours=12, minutes=n), "cam1", "person", 0.9) for n in range(5)]
+        seed_detections(reporting, history + current)
+
+        assert reporting.get_anomaly_summary(start, end)["anomalies"] == []
+
+    def test_sub_hour_window_uses_history(self, reporting, report_window):
+        """Test a window inside one hour is compared with the same minutes on earlier days."""
+        start, _ = report_window
+        history = [(start - timedelta(days=day) + timedelta(hours=10, minutes=30), "cam1", "person", 0.9)
+                   for day in range(1, 8)]
+        spike = [(start + timedelta(hours=10, minutes=20 + n), "cam1", "person", 0.9) for n in range(3)]
+        seed_detections(reporting, history + spike)
+
+        window = (start + timedelta(hours=10, minutes=15), start + timedelta(hours=10, minutes=45))
+        anomalies = reporting.get_anomaly_summary(*window)["anomalies"]
+        assert [anomaly["expected_count"] for anomaly in anomalies] == [1.0]
+
+    def test_unaligned_window_history_matches_span(self, reporting, report_window):
+        """Test history for a window starting mid-hour covers exactly the same span."""
+        start, _ = report_window
+        # Each earlier day has one detection inside the span and one earlier in its first hour
+        history = [(start - timedelta(days=day) + timedelta(hours=9, minutes=minute), "cam1", "person", 0.9)
+                   for day in range(1, 8) for minute in (15, 45)]
+        current = [(start + timedelta(hours=9, minutes=45 + n), "cam1", "person", 0.9) for n in range(2)]
+        seed_detections(reporting, history + current)
+
+        window = (start + timedelta(hours=9, minutes=30), start + timedelta(hours=11, minutes=30))
+        anomalies = reporting.get_anomaly_summary(*window)["anomalies"]
+        assert [anomaly["expected_count"] for anomaly in anomalies] == [1.0]
+
+    def test_multi_day_window_history_does_not_overlap(self, reporting, report_window):
+        """Test windows longer than a day are compared with earlier windows of the same length."""
+        start, _ = report_window
+        window = (start, start + timedelta(days=2))
+        current = [(start + timedelta(hours=n), "cam1", "person", 0.9) for n in range(4)]
+        history = [(start - timedelta(days=2 * k - 1), "cam1", "person", 0.9) for k in range(1, 8)]
+        seed_detections(reporting, history + current)
+
+        anomalies = reporting.get_anomaly_summary(*window)["anomalies"]
+        assert [anomaly["expected_count"] for anomaly in anomalies] == [1.0]
+
+
+@pytest.mark.unit
+class TestSchemaMigration:
+    """Test upgrades of databases created by older versions."""
+
+    def test_hour_of_day_backfilled(self, reporting, tmp_path, report_window):
+        """Test legacy rows gain an hour_of_day value on startup."""
+        import sqlite3
+        from reporting_system import VeroluxReportingSystem
+        start, end = report_window
+        db_path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE detection_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME, camera_id TEXT, object_class TEXT,
+                confidence REAL, bbox_x1 REAL, bbox_y1 REAL, bbox_x2 REAL,
+                bbox_y2 REAL, zone_id TEXT, person_id TEXT
+            )
+        ''')
+        conn.execute(
+            "INSERT INTO detection_events (timestamp, camera_id, object_class, confidence) "
+            "VALUES (?, 'cam1', 'person', 0.9)",
+            (start + timedelta(hours=7),)
+        )
+        conn.commit()
+        conn.close()
+
+        legacy = VeroluxReportingSystem(db_path=db_path)
+        assert legacy.get_peak_traffic_times("cam1", start, end)["hourly_counts"] == {"07": 1}
+
+
+@pytest.mark.unit
+class TestParquetStore:
+    """Test the DuckDB/Parquet read path for flushed detections."""
+
+    def test_flush_writes_day_partitions(self, reporting, report_window, tmp_path):
+        """Test flushed detections land in dt= partitions once."""
+        pytest.importorskip("duckdb")
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=1), "cam1", "person", 0.9),
+            (start + timedelta(days=1, hours=1), "cam1", "person", 0.9),
+        ])
+
+        assert reporting.flush_to_parquet() == 2
+        assert reporting.flush_to_parquet() == 0
+        partitions = sorted(p.name for p in (tmp_path / "analytics" / "detections").iterdir())
+        assert partitions == ["dt=2025-01-01", "dt=2025-01-02"]
+
+    def test_flushed_window_matches_sqlite(self, reporting, report_window):
+        """Test columnar answers match SQLite answers for a flushed window."""
+        import sqlite3
+        pytest.importorskip("duckdb")
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=8), "cam1", "person", 0.9),
+            (start + timedelta(hours=8), "cam2", "helmet", 0.6),
+            (start + timedelta(hours=16), "cam1", "person", 0.8),
+            (end + timedelta(hours=1), "cam1", "person", 0.8),
+        ])
+        expected = (
+            reporting.get_object_counts(start, end),
+            reporting.get_peak_traffic_times("cam1", start, end),
+            reporting.get_shift_totals(start, end),
+            reporting.get_compliance_report(start, end),
+            reporting.get_camera_summary(start, end)["total_events"],
+        )
+
+        reporting.flush_to_parquet()
+        reporting.clear_report_cache()
+        with reporting._window_connection(end) as conn:
+            assert not isinstance(conn, sqlite3.Connection)
+
+        assert (
+            reporting.get_object_counts(start, end),
+            reporting.get_peak_traffic_times("cam1", start, end),
+            reporting.get_shift_totals(start, end),
+            reporting.get_compliance_report(start, end),
+            reporting.get_camera_summary(start, end)["total_events"],
+        ) == expected
+
+    def test_flush_in_bounded_chunks(self, reporting, report_window, tmp_path, monkeypatch):
+        """Test a flush larger than one chunk writes every row once."""
+        import reporting_system
+        pytest.importorskip("duckdb")
+        monkeypatch.setattr(reporting_system, "PARQUET_FLUSH_BATCH_SIZE", 2)
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=hour), "cam1", "person", 0.9) for hour in range(5)
+        ])
+
+        assert reporting.flush_to_parquet() == 5
+        parts = list((tmp_path / "analytics" / "detections").rglob("*.parquet"))
+        assert len(parts) == 3
+        reporting.clear_report_cache()
+        assert reporting.get_object_counts(start, start + timedelta(hours=12)) == {"person": 5}
+
+    def test_late_row_keeps_window_on_sqlite(self, reporting, report_window):
+        """Test a row logged after a flush with an earlier timestamp is still counted."""
+        import sqlite3
+        pytest.importorskip("duckdb")
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=8), "cam1", "person", 0.9),
+            (end + timedelta(hours=1), "cam1", "person", 0.9),
+        ])
+        reporting.flush_to_parquet()
+        seed_detections(reporting, [(start + timedelta(hours=9), "cam1", "person", 0.9)])
+
+        reporting.clear_report_cache()
+        with reporting._window_connection(end) as conn:
+            assert isinstance(conn, sqlite3.Connection)
+        assert reporting.get_object_counts(start, end) == {"person": 2}
+
+        reporting.flush_to_parquet()
+        reporting.clear_report_cache()
+        with reporting._window_connection(end) as conn:
+            assert not isinstance(conn, sqlite3.Connection)
+        assert reporting.get_object_counts(start, end) == {"person": 2}
+
+
+@pytest.mark.unit
+class TestReportCache:
+    """Test report result caching."""
+
+    def test_repeat_query_served_from_cache(self, reporting, report_window):
+        """Test a repeated window is not re-queried until the cache is cleared."""
+        start, end = report_window
+        seed_detections(reporting, [(start + timedelta(hours=1), "cam1", "person", 0.9)])
+        assert reporting.get_object_counts(start, end) == {"person": 1}
+
+        seed_detections(reporting, [(start + timedelta(hours=2), "cam1", "person", 0.9)])
+        assert reporting.get_object_counts(start, end) == {"person": 1}
+        assert reporting.get_object_counts(start, end, "cam1") == {"person": 2}
+
+        reporting.clear_report_cache()
+        assert reporting.get_object_counts(start, end) == {"person": 2}
+
+    def test_endpoint_etag_not_modified(self, reporting, report_window, monkeypatch):
+        """Test clients presenting the current ETag get 304."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        start, end = report_window
+        params = {"start_time": start.isoformat(), "end_time": end.isoformat()}
+
+        client = TestClient(reporting_system.app)
+        first = client.get("/reports/object-counts", params=params)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+
+        second = client.get("/reports/object-counts", params=params,
+                            headers={"If-None-Match": etag})
+        assert second.status_code == 304
+
+
+@pytest.mark.unit
+class TestReportExport:
+    """Test streamed report exports."""
+
+    def test_timeline_csv_streams_all_events(self, reporting, report_window, monkeypatch):
+        """Test timeline CSV export contains every event across fetch batches."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        monkeypatch.setattr(reporting_system, "EXPORT_BATCH_SIZE", 2)
+        start, end = report_window
+        seed_detections(reporting, [
+            (start + timedelta(minutes=minute), "cam1", "person", 0.9)
+            for minute in range(5)
+        ])
+
+        client = TestClient(reporting_system.app)
+        response = client.post("/reports/export", params={
+            "report_type": "timeline",
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "format": "csv",
+        })
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.strip().splitlines()
+        assert lines[0].split(",")[:3] == ["timestamp", "camera_id", "object_class"]
+        assert len(lines) == 6
+
+    @pytest.mark.parametrize("export_format", ["json", "csv"])
+    def test_report_export_runs_off_event_loop(self, reporting, report_window, monkeypatch, export_format):
+        """Test non-timeline exports generate the report outside the event loop."""
+        import asyncio
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        start, end = report_window
+
+        generate = reporting.generate_report
+        def generate_off_loop(*args, **kwargs):
+            with pytest.raises(RuntimeError):
+                asyncio.get_running_loop()
+            return generate(*args, **kwargs)
+        monkeypatch.setattr(reporting, "generate_report", generate_off_loop)
+
+        response = TestClient(reporting_system.app).post("/reports/export", params={
+            "report_type": "comprehensive",
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "format": export_format,
+        })
+        assert response.status_code == 200
+
+    def test_empty_timeline_csv_has_header(self, reporting, report_window, monkeypatch):
+        """Test exporting a window without events still returns the CSV header."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        start, end = report_window
+
+        response = TestClient(reporting_system.app).post("/reports/export", params={
+            "report_type": "timeline",
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "format": "csv",
+        })
+
+        assert response.status_code == 200
+        assert response.text.splitlines() == ["timestamp,camera_id,object_class,confidence,zone_id,person_id"]
+
+
+@pytest.mark.unit
+class TestHourlyRollup:
+    """Test rollup-backed peak and shift reports."""
+
+    def test_partial_hours_read_from_raw_events(self, reporting, report_window):
+        """Test window edges inside an hour are counted exactly."""
+        start, _ = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=8, minutes=20), "cam1", "person", 0.9),
+            (start + timedelta(hours=8, minutes=45), "cam1", "person", 0.9),
+            (start + timedelta(hours=9, minutes=10), "cam1", "person", 0.9),
+            (start + timedelta(hours=10, minutes=5), "cam1", "person", 0.9),
+            (start + timedelta(hours=10, minutes=30), "cam1", "person", 0.9),
+        ])
+
+        window = (start + timedelta(hours=8, minutes=30), start + timedelta(hours=10, minutes=15))
+        result = reporting.get_peak_traffic_times("cam1", *window)
+        assert result["hourly_counts"] == {"08": 1, "09": 1, "10": 1}
+        assert reporting.get_shift_totals(*window) == {"morning": {"person": 3}}
+
+    def test_rollup_refresh_is_incremental(self, reporting, report_window):
+        """Test detections logged after a refresh are folded in exactly once."""
+        import sqlite3
+        start, end = report_window
+        seed_detections(reporting, [(start + timedelta(hours=9), "cam1", "person", 0.9)])
+        reporting.refresh_rollup()
+        seed_detections(reporting, [(start + timedelta(hours=9, minutes=5), "cam1", "person", 0.7)])
+        reporting.refresh_rollup()
+        reporting.refresh_rollup()
+
+        conn = sqlite3.connect(reporting.db_path)
+        rows = conn.execute(
+            "SELECT bucket_start, count, sum_conf FROM detection_rollup_hourly"
+        ).fetchall()
+        conn.close()
+        assert rows == [("2025-01-01 09:00:00", 2, pytest.approx(1.6))]
+        assert reporting.get_peak_traffic_times("cam1", start, end)["hourly_counts"] == {"09": 2}
+
+    def test_ingest_counts_applied_without_rescan(self, reporting, report_window, monkeypatch):
+        """Test detections logged in-process reach the rollup from memory."""
+        import reporting_system
+        start, _ = report_window
+        seed_detections(reporting, [
+            (start + timedelta(hours=9), "cam1", "person", 0.9),
+            (start + timedelta(hours=9, minutes=30), "cam1", "person", 0.5),
+            (start + timedelta(hours=10), "cam2", "car", 0.8),
+        ])
+        monkeypatch.setattr(reporting_system, "_Q_ROLLUP_HOURLY", "SELECT raise(ABORT, 'rescan')")
+        reporting.refresh_rollup()
+
+        window = (start + timedelta(hours=9), start + timedelta(hours=11))
+        assert reporting.get_shift_totals(*window) == {"morning": {"person": 2, "car": 1}}
+
+    def test_other_writers_folded_from_events(self, reporting, report_window):
+        """Test rows the aggregator never saw are still folded exactly once."""
+        import sqlite3
+        start, end = report_window
+        seed_detections(reporting, [(start + timedelta(hours=9), "cam1", "person", 0.9)])
+        conn = sqlite3.connect(reporting.db_path)
+        conn.execute(
+            "INSERT INTO detection_events (timestamp, camera_id, object_class, confidence, hour_of_day) "
+            "VALUES (?, 'cam1', 'person', 0.9, 9)", [start + timedelta(hours=9, minutes=1)]
+        )
+        conn.commit()
+        conn.close()
+        seed_detections(reporting, [(start + timedelta(hours=9, minutes=2), "cam1", "person", 0.9)])
+
+        reporting.refresh_rollup()
+        reporting.refresh_rollup()
+        assert reporting.get_peak_traffic_times("cam1", start, end)["hourly_counts"] == {"09": 3}
+
+
+@pytest.mark.unit
+class TestReportJobs:
+    """Test background comprehensive report jobs."""
+
+    def test_comprehensive_job_completes(self, reporting, report_window, monkeypatch):
+        """Test a queued job can be polled to its result."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        start, end = report_window
+        seed_detections(reporting, [(start + timedelta(hours=1), "cam1", "person", 0.9)])
+
+        client = TestClient(reporting_system.app)
+        submitted = client.post("/reports/comprehensive", params={
+            "start_time": start.isoformat(), "end_time": end.isoformat()
+        })
+        assert submitted.status_code == 202
+
+        # TestClient runs background tasks before returning the response
+        job = client.get(submitted.json()["status_url"]).json()
+        assert job["status"] == "completed"
+        assert job["result"]["object_counts"] == {"person": 1}
+
+    def test_unknown_job_returns_404(self, reporting):
+        """Test polling an unknown job id."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+
+        client = TestClient(reporting_system.app)
+        assert client.get("/reports/jobs/missing").status_code == 404
+
+
+@pytest.mark.unit
+class TestWindowParsing:
+    """Test shared report window validation."""
+
+    @pytest.mark.parametrize("start_time,end_time", [
+        ("2025-01-02T00:00:00", "2025-01-01T00:00:00"),
+        ("not-a-date", "2025-01-01T00:00:00"),
+        ("2020-01-01T00:00:00", "2025-01-01T00:00:00"),
+        ("2025-01-02T12:00:00+07:00", "2025-01-01T00:00:00"),
+    ])
+    def test_invalid_window_rejected(self, reporting, start_time, end_time):
+        """Test reversed, malformed and oversized windows return 400."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+
+        client = TestClient(reporting_system.app)
+        response = client.get("/reports/compliance", params={
+            "start_time": start_time, "end_time": end_time
+        })
+        assert response.status_code == 400
+
+    def test_offset_window_converted_to_local_time(self, reporting, report_window, monkeypatch,
+                                                   server_utc_plus_7):
+        """Test offset-aware windows are queried in the server's local time."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        start, end = report_window
+        seed_detections(reporting, [(start + timedelta(hours=8), "cam1", "person", 0.9)])
+
+        response = TestClient(reporting_system.app).get("/reports/object-counts", params={
+            "start_time": "2025-01-01T00:00:00+00:00", "end_time": "2025-01-01T02:00:00+00:00"
+        })
+        assert response.status_code == 200
+        assert response.json() == {"person": 1}
+
+    def test_live_offset_window_not_cached_as_closed(self, reporting, monkeypatch, server_utc_plus_7):
+        """Test a window still open in UTC is not given the closed-window cache TTL."""
+        import time
+        from datetime import timezone
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        end = datetime.now(timezone.utc).replace(microsecond=0)
+
+        response = TestClient(reporting_system.app).get("/reports/object-counts", params={
+            "start_time": (end - timedelta(hours=1)).isoformat(), "end_time": end.isoformat()
+        })
+        assert response.status_code == 200
+        (expires, _), = reporting._report_cache.values()
+        assert expires - time.monotonic() <= reporting_system.REPORT_CACHE_TTL
+
+
+@pytest.mark.unit
+class TestConnectionReuse:
+    """Test report queries share one connection per report."""
+
+    def test_comprehensive_report_opens_one_connection(self, reporting, report_window, monkeypatch):
+        """Test every section of a comprehensive report runs on one connection per store."""
+        import sqlite3
+        import reporting_system
+        start, end = report_window
+        seed_detections(reporting, [(start + timedelta(hours=1), "cam1", "person", 0.9)])
+        # A detection past the window sends its aggregates to the Parquet store
+        seed_detections(reporting, [(end + timedelta(hours=1), "cam1", "person", 0.9)])
+        seed_detections(reporting, [(start + timedelta(hours=2), "cam1", "helmet", 0.9)])
+        reporting.flush_to_parquet()
+
+        opened = []
+        sqlite_connect = sqlite3.connect
+        monkeypatch.setattr(sqlite3, "connect", lambda *a, **k: opened.append("sqlite") or sqlite_connect(*a, **k))
+        if reporting_system.DUCKDB_AVAILABLE:
+            duckdb_connect = reporting_system.duckdb.connect
+            monkeypatch.setattr(reporting_system.duckdb, "connect",
+                                lambda *a, **k: opened.append("duckdb") or duckdb_connect(*a, **k))
+
+        report = reporting.generate_report("comprehensive", start, end)
+        assert report["shift_totals"] == {"night": {"person": 1, "helmet": 1}}
+        assert opened.count("sqlite") == 1
+        assert opened.count("duckdb") == int(reporting_system.DUCKDB_AVAILABLE)
+        assert reporting._local.conn is None
+
+    def test_report_without_new_detections_skips_write_lock(self, reporting, report_window):
+        """Test rollup reads do not take the write lock once the rollup is current."""
+        start, end = report_window
+        seed_detections(reporting, [(start + timedelta(hours=1), "cam1", "person", 0.9)])
+        reporting.refresh_rollup()
+
+        statements = []
+        with reporting.connection() as conn:
+            conn.set_trace_callback(statements.append)
+            reporting.get_shift_totals(start, end)
+        assert not any(statement.startswith("BEGIN") for statement in statements)
+
+    def test_queries_outside_block_use_own_connection(self, reporting, report_window):
+        """Test standalone queries still work without a shared connection."""
+        start, end = report_window
+        seed_detections(reporting, [(start + timedelta(hours=1), "cam1", "person", 0.9)])
+        with reporting.connection() as conn:
+            with reporting.connection() as nested:
+                assert nested is conn
+        assert reporting.get_camera_summary(start, end)["total_events"] == 1
+
+
+@pytest.mark.unit
+class TestTimelinePagination:
+    """Test keyset pagination of the event timeline."""
+
+    def test_pages_cover_window_without_overlap(self, reporting, report_window, monkeypatch):
+        """Test following next_cursor visits every event once, newest first."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        start, end = report_window
+        # Two events share each timestamp so the id tiebreak is exercised
+        seed_detections(reporting, [
+            (start + timedelta(hours=hour), f"cam{n}", "person", 0.9)
+            for hour in range(1, 4) for n in range(2)
+        ])
+
+        client = TestClient(reporting_system.app)
+        params = {"start_time": start.isoformat(), "end_time": end.isoformat(), "limit": 4}
+        seen = []
+        while True:
+            page = client.get("/reports/timeline", params=params).json()
+            seen.extend(event["id"] for event in page["events"])
+            if not page["next_cursor"]:
+                break
+            params["before"] = page["next_cursor"]
+
+        assert seen == [6, 5, 4, 3, 2, 1]
+
+    def test_cursor_query_uses_timestamp_index(self, reporting, report_window):
+        """Test later pages are an index range walk."""
+        from reporting_system import _Q_EVENT_TIMELINE_BEFORE
+        start, end = report_window
+        conn = reporting._connect()
+        plan = [row["detail"] for row in conn.execute(
+            "EXPLAIN QUERY PLAN " + _Q_EVENT_TIMELINE_BEFORE,
+            [start, end, str(end), 10, 100]
+        )]
+        conn.close()
+
+        assert any("USING INDEX idx_det_ts" in detail for detail in plan)
+        assert not any("TEMP B-TREE" in detail for detail in plan)
+
+    def test_invalid_cursor_rejected(self, reporting, report_window, monkeypatch):
+        """Test a malformed cursor returns 400."""
+        from fastapi.testclient import TestClient
+        import reporting_system
+        monkeypatch.setattr(reporting_system, "reporting_system", reporting)
+        start, end = report_window
+
+        response = TestClient(reporting_system.app).get("/reports/timeline", params={
+            "start_time": start.isoformat(), "end_time": end.isoformat(), "before": "garbage"
+        })
+        assert response.status_code == 400
@@ -0,0 +1,166 @@
+"""
+Unit Tests for Secret Rotation
+Tests rotation status and metadata persistence with the local file backend
+"""
+import pytest
+import time
+
+
+@pytest.fixture(scope="function")
+def manager(tmp_path, monkeypatch):
+    """Create a rotation manager writing under a temporary directory."""
+    # Local backend writes secrets relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    from secret_rotation import SecretRotationManager
+    return SecretRotationManager(metadata_file=str(tmp_path / "config" / "secret_metadata.json"))
+
+
+def age_secret(manager, name, days):
+    """Pretend a secret was last rotated `days` ago."""
+    manager.secrets[name].last_rotated = time.time() - days * 86400
+
+
+@pytest.mark.unit
+class TestRotationStatus:
+    """Test rotation status reporting."""
+
+    def test_rotation_summary_counts(self, manager):
+        """Test overdue, urgent and average age in the summary."""
+        from secret_rotation import SecretType
+        for name in ("db", "api", "jwt"):
+            manager.rotate_secret(name, SecretType.API_KEY)
+        age_secret(manager, "db", 100)
+        age_secret(manager, "api", 85)
+        age_secret(manager, "jwt", 15)
+
+        summary = manager.get_rotation_summary()
+        assert summary["total_secrets"] == 3
+        assert summary["needs_rotation"] == 1
+        assert summary["overdue"] == 1
+        assert summary["urgent"] == 1
+        assert summary["average_days_since_rotation"] == pytest.approx(200 / 3, abs=0.01)
+
+    def test_check_all_secrets(self, manager):
+        """Test per-secret urgency and days remaining."""
+        from secret_rotation import SecretType
+        manager.rotate_secret("api", SecretType.API_KEY)
+        age_secret(manager, "api", 70)
+
+        status = manager.check_all_secrets()["api"]
+        assert status["urgency"] == "soon"
+        assert status["needs_rotation"] is False
+        assert status["days_until_rotation"] == pytest.approx(20, abs=0.01)
+
+
+@pytest.mark.unit
+class TestMetadataPersistence:
+    """Test secret metadata is persisted."""
+
+    def test_batch_rotation_saves_once(self, manager, monkeypatch):
+        """Test rotating every due secret writes metadata a single time."""
+        import os
+        from secret_rotation import SecretRotationManager, SecretType
+        for name in ("db", "api", "jwt"):
+            manager.rotate_secret(name, SecretType.API_KEY)
+            age_secret(manager, name, 100)
+
+        saves = []
+        save = manager._save_metadata
+        monkeypatch.setattr(manager, "_save_metadata", lambda: saves.append(1) or save())
+        rotated = manager.rotate_all_due_secrets()
+
+        assert sorted(rotated) == ["api", "db", "jwt"]
+        assert len(saves) == 1
+        assert sorted(os.listdir(manager.metadata_dir)) == ["api.json", "db.json", "jwt.json"]
+        reloaded = SecretRotationManager(metadata_file=manager.metadata_file)
+        assert {name: meta.version for name, meta in reloaded.secrets.items()} == {"db": 2, "api": 2, "jwt": 2}
+
+    def test_rotation_rewrites_only_that_secret(self, manager, monkeypatch):
+        """Test a single rotation writes only the rotated secret's file."""
+        from secret_rotation import SecretType
+        for name in ("db", "api"):
+            manager.rotate_secret(name, SecretType.API_KEY)
+
+        written = []
+        write = manager._write_metadata_file
+        monkeypatch.setattr(manager, "_write_metadata_file",
+                            lambda name, record: written.append(name) or write(name, record))
+        manager.rotate_secret("api", SecretType.API_KEY)
+        assert written == ["api"]
+
+    def test_legacy_metadata_file_migrated(self, manager):
+        """Test a single-file store is loaded and split on the next save."""
+        import json
+        import os
+        from secret_rotation import SecretRotationManager, SecretType
+        manager.rotate_secret("db", SecretType.DATABASE_PASSWORD)
+        record = manager.secrets["db"].to_dict(manager.secrets["db"].last_rotated)
+        legacy_file = os.path.join(os.path.dirname(manager.metadata_file), "legacy.json")
+        with open(legacy_file, "w") as f:
+            json.dump({"db": record}, f)
+
+        legacy = SecretRotationManager(metadata_file=legacy_file)
+        assert legacy.secrets["db"].secret_type == SecretType.DATABASE_PASSWORD
+        legacy.rotate_secret("api", SecretType.API_KEY)
+        assert sorted(os.listdir(legacy.metadata_dir)) == ["api.json", "db.json"]
+
+    def test_path_style_secret_name_persisted(self, manager):
+        """Test secret names containing '/' are saved and reloaded."""
+        import os
+        from secret_rotation import SecretRotationManager, SecretType
+        manager.rotate_secret("prod/db/password", SecretType.DATABASE_PASSWORD)
+
+        assert os.listdir(manager.metadata_dir) == ["prod%2Fdb%2Fpassword.json"]
+        reloaded = SecretRotationManager(metadata_file=manager.metadata_file)
+        assert list(reloaded.secrets) == ["prod/db/password"]
+
+    def test_metadata_dict_uses_given_time(self, manager):
+        """Test to_dict measures age at the supplied timestamp."""
+        from secret_rotation import SecretType
+        manager.rotate_secret("api", SecretType.API_KEY)
+        meta = manager.secrets["api"]
+
+        record = meta.to_dict(meta.last_rotated + 95 * 86400)
+        assert record["days_since_rotation"] == pytest.approx(95)
+        assert record["needs_rotation"] is True
+        assert record["rotation_urgency"] == "overdue"
+
+
+@pytest.mark.unit
+class TestGlobalManager:
+    """Test the shared manager accessor."""
+
+    def test_manager_created_lazily(self, tmp_path, monkeypatch):
+        """Test the shared manager is built on first use and then reused."""
+        monkeypatch.chdir(tmp_path)
+        import secret_rotation
+        monkeypatch.setattr(secret_rotation, "_manager", None)
+
+        manager = secret_rotation.get_secret_rotation_manager()
+        assert secret_rotation.get_secret_rotation_manager() is manager
+
+
+@pytest.mark.unit
+class TestBackendClients:
+    """Test cloud backend clients are reused."""
+
+    def test_aws_client_created_once(self, manager, monkeypatch):
+        """Test rotating several secrets builds a single Secrets Manager client."""
+        boto3 = pytest.importorskip("boto3")
+        from secret_rotation import SecretBackend, SecretType
+
+        class RecordingClient:
+            def __init__(self):
+                self.stored = []
+
+            def put_secret_value(self, SecretId, SecretString):
+                self.stored.append(SecretId)
+
+        created = []
+        monkeypatch.setattr(boto3, "client", lambda service: created.append(RecordingClient()) or created[-1])
+        manager.backend = SecretBackend.AWS_SECRETS_MANAGER
+        for name in ("db", "api", "jwt"):
+            manager.rotate_secret(name, SecretType.API_KEY)
+
+        assert len(created) == 1
+        assert created[0].stored == ["verolux/db", "verolux/api", "verolux/jwt"]
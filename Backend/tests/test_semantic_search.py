@@ -0,0 +1,210 @@
+"""
+Unit Tests for Semantic Search
+Tests search ranking against a temporary SQLite database
+"""
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+
+class MockSentenceModel:
+    """Deterministic bag-of-words encoder standing in for SentenceTransformer."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, **kwargs):
+        import zlib
+        import numpy as np
+        self.encoded.append(len(texts))
+        embeddings = np.zeros((len(texts), 64), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.split():
+                embeddings[i, zlib.crc32(word.encode()) % 64] += 1.0
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+@pytest.fixture(scope="function")
+def search(tmp_path, monkeypatch):
+    """Semantic search module backed by sample data in a temporary database."""
+    import semantic_search
+    from semantic_search import EmbeddingIndex
+    monkeypatch.setattr(semantic_search, "DB_PATH", str(tmp_path / "search.db"))
+    monkeypatch.setattr(semantic_search, "EMBEDDING_CACHE_DIR", str(tmp_path / "embeddings"))
+    monkeypatch.setattr(semantic_search, "semantic_model", MockSentenceModel())
+    monkeypatch.setattr(semantic_search, "embedding_indexes",
+                        {table: EmbeddingIndex() for table in semantic_search.CORPUS_TEXT})
+    monkeypatch.setattr(semantic_search, "metadata_cache", {})
+    semantic_search.create_sample_data()
+    semantic_search.build_embedding_indexes()
+    return semantic_search
+
+
+@pytest.mark.unit
+class TestSemanticSearch:
+    """Test semantic search results."""
+
+    def test_query_ranks_matching_row_first(self, search):
+        """Test the closest row is returned first."""
+        from fastapi.testclient import TestClient
+        client = TestClient(search.app)
+        response = client.post("/search", json={"query": "vehicle parked in unauthorized area"})
+        assert response.status_code == 200
+        assert response.json()[0]["id"] == "vio_003"
+
+    def test_results_limited_and_ordered(self, search):
+        """Test only the top `limit` results come back, best first."""
+        from fastapi.testclient import TestClient
+        client = TestClient(search.app)
+        response = client.post("/search", json={"query": "person detected at main entrance", "limit": 3})
+        scores = [result["relevance_score"] for result in response.json()]
+        assert len(scores) == 3
+        assert scores == sorted(scores, reverse=True)
+
+    def test_keyword_candidates_reach_past_recent_rows(self, search):
+        """Test keyword matches are reranked even when they are not the newest rows."""
+        from fastapi.testclient import TestClient
+        client = TestClient(search.app)
+        response = client.post("/search", json={
+            "query": "loitering", "search_type": "violations", "limit": 1
+        })
+        assert [result["id"] for result in response.json()] == ["vio_002"]
+
+    def test_search_encodes_only_the_query(self, search):
+        """Test cached corpus rows are not re-encoded per request."""
+        from fastapi.testclient import TestClient
+        client = TestClient(search.app)
+        search.semantic_model.encoded.clear()
+        client.post("/search", json={"query": "person at main entrance"})
+        assert search.semantic_model.encoded == [1]
+
+    def test_new_rows_encoded_with_query_in_one_pass(self, search):
+        """Test uncached rows from every table share the query's encode call."""
+        import sqlite3
+        from fastapi.testclient import TestClient
+        conn = sqlite3.connect(search.DB_PATH)
+        timestamp = search.to_epoch("2024-01-16 08:00:00")
+        conn.execute("INSERT INTO detections VALUES ('det_100', ?, 'cam_004', 'person', 0.9, "
+                     "'Loading Dock', 'Person at loading dock', NULL)", [timestamp])
+        conn.execute("INSERT INTO violations VALUES ('vio_100', 'Tailgating', 'Person followed badge holder', "
+                     "'medium', 'Loading Dock', ?, 'pending', NULL)", [timestamp])
+        conn.commit()
+        conn.close()
+
+        search.semantic_model.encoded.clear()
+        response = TestClient(search.app).post("/search", json={"query": "loading dock"})
+        assert search.semantic_model.encoded == [3]
+        assert {"det_100", "vio_100"} <= {result["id"] for result in response.json()}
+
+    def test_metadata_parsed_once_per_row(self, search):
+        """Test searches reuse parsed metadata until the row's JSON changes."""
+        from fastapi.testclient import TestClient
+        parsed = {row_id: cached[1] for row_id, cached in search.metadata_cache.items()}
+        assert "vio_003" in parsed
+
+        client = TestClient(search.app)
+        response = client.post("/search", json={"query": "parking", "search_type": "violations"})
+        assert response.json()[0]["metadata"]
+        assert all(search.metadata_cache[row_id][1] is metadata for row_id, metadata in parsed.items())
+
+    def test_relevance_scores_are_cosine_similarity(self, search):
+        """Test quantized scoring stays within int8 error of cosine similarity."""
+        import numpy as np
+        embeddings = search.get_semantic_embeddings(["main entrance person", "parking lot", "vehicle"])
+        assert embeddings.dtype == np.float32 and embeddings.flags["C_CONTIGUOUS"]
+
+        codes, scales = search.quantize_embeddings(embeddings)
+        assert codes.dtype == np.int8
+
+        scores = search.calculate_relevance_scores(embeddings[0], codes, scales)
+        expected = [float(np.dot(embeddings[0], row) / np.linalg.norm(row)) for row in embeddings]
+        assert scores == pytest.approx(expected, abs=2e-2)
+
+    def test_connection_reused_per_thread(self, search):
+        """Test the thread's connection is reused and runs in WAL mode."""
+        conn = search.get_db_connection()
+        assert search.get_db_connection() is conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_preprocess_text_normalizes(self, search):
+        """Test punctuation runs and whitespace collapse to single spaces."""
+        assert search.preprocess_text("  Person!!  at   Main-Entrance... ") == "person at main entrance"
+
+    def test_saved_embeddings_mapped_on_restart(self, search, monkeypatch):
+        """Test a restart maps saved embeddings instead of re-encoding the corpus."""
+        import numpy as np
+        from semantic_search import EmbeddingIndex
+        before = search.embedding_indexes["reports"].vectors(["rep_001"])
+        monkeypatch.setattr(search, "embedding_indexes",
+                            {table: EmbeddingIndex() for table in search.CORPUS_TEXT})
+        search.semantic_model.encoded.clear()
+
+        search.build_embedding_indexes()
+        assert search.semantic_model.encoded == []
+        assert isinstance(search.embedding_indexes["reports"].codes, np.memmap)
+        after = search.embedding_indexes["reports"].vectors(["rep_001"])
+        assert np.array_equal(before[0], after[0]) and np.array_equal(before[1], after[1])
+
+
+    def test_save_leaves_mapped_index_intact(self, search, tmp_path):
+        """Test saving again writes new files instead of rewriting ones already mapped."""
+        import numpy as np
+        from semantic_search import EmbeddingIndex
+        prefix = str(tmp_path / "embeddings" / "reports")
+        encoder = f"{type(search.semantic_model).__name__}:{search.MODEL_NAME}"
+        mapped = EmbeddingIndex()
+        assert mapped.load(prefix, encoder)
+        before = np.array(mapped.codes)
+
+        index = search.embedding_indexes["reports"]
+        index.store({"rep_001": "rewritten report text"}, np.ones((1, 64), dtype=np.float32))
+        index.save(prefix, encoder)
+
+        assert np.array_equal(mapped.codes, before)
+        assert len(list((tmp_path / "embeddings").glob("reports.*.codes.npy"))) == 1
+        reloaded = EmbeddingIndex()
+        assert reloaded.load(prefix, encoder)
+        assert reloaded.texts == index.texts
+
+
+@pytest.mark.unit
+class TestSearchSchema:
+    """Test the search tables' timestamp storage."""
+
+    def test_timestamps_stored_as_epoch_and_returned_formatted(self, search):
+        """Test epoch storage round-trips to the original timestamp strings."""
+        from fastapi.testclient import TestClient
+        stored = search.get_db_connection().execute(
+            "SELECT timestamp FROM violations WHERE id = 'vio_003'").fetchone()[0]
+        assert isinstance(stored, int)
+
+        response = TestClient(search.app).post("/search", json={
+            "query": "vehicle parked in unauthorized area", "search_type": "violations"
+        })
+        assert response.json()[0]["timestamp"] == "2024-01-15 12:00:00"
+
+    def test_recent_rows_read_through_index(self, search):
+        """Test the recency query walks the timestamp index without sorting."""
+        plan = [row["detail"] for row in search.get_db_connection().execute(
+            "EXPLAIN QUERY PLAN " + search.DET_SQL, (5,))]
+        assert any("idx_detections_ts" in detail for detail in plan)
+        assert not any("TEMP B-TREE" in detail for detail in plan)
+
+    def test_text_timestamps_migrated(self, search):
+        """Test a database with TEXT timestamp columns is converted in place."""
+        import sqlite3
+        conn = sqlite3.connect(search.DB_PATH)
+        conn.execute("DROP TABLE reports")
+        conn.execute("CREATE TABLE reports (id TEXT PRIMARY KEY, title TEXT, content TEXT, report_type TEXT, "
+                     "created_at TEXT, author TEXT, status TEXT, metadata TEXT)")
+        conn.execute("INSERT INTO reports VALUES ('rep_900', 'Old', 'Old report', 'security', "
+                     "'2023-06-01 09:30:00', 'Ops', 'completed', NULL)")
+        conn.commit()
+        conn.close()
+
+        search.create_sample_data()
+        row = search.get_db_connection().execute(
+            "SELECT created_at FROM reports WHERE id = 'rep_900'").fetchone()
+        assert search.to_timestamp(row[0]) == "2023-06-01 09:30:00"
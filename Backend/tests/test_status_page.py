@@ -0,0 +1,118 @@
+"""
+Unit Tests for Status Page
+Tests overall status and the status summary
+"""
+import pytest
+
+pytest.importorskip("jinja2")
+
+
+@pytest.fixture(scope="function")
+def page():
+    """Create a status page with the default components."""
+    from status_page import StatusPage
+    return StatusPage()
+
+
+@pytest.mark.unit
+class TestStatusSummary:
+    """Test the status page summary."""
+
+    def test_summary_lists_components(self, page):
+        """Test every component is reported with its status value."""
+        from status_page import ComponentStatus
+        page.update_component_status("api", ComponentStatus.DEGRADED, response_time_ms=250.0)
+
+        summary = page.get_status_summary()
+        components = {comp["name"]: comp for comp in summary["components"]}
+        assert len(components) == 7
+        assert components["api"]["status"] == "degraded"
+        assert components["api"]["response_time_ms"] == 250.0
+        assert summary["overall_status"] == "degraded"
+
+    def test_active_and_recent_incidents(self, page):
+        """Test open incidents are always active and recent ones are newest first."""
+        from status_page import Incident
+        for i in range(12):
+            page.incidents[f"INC-{i}"] = Incident(f"INC-{i}", "Outage", "", "resolved", "minor", 1000.0 + i,
+                                                  resolved_at=1060.0 + i)
+        page.incidents["INC-0"].status = "investigating"
+
+        summary = page.get_status_summary()
+        assert [inc["incident_id"] for inc in summary["active_incidents"]] == ["INC-0"]
+        assert [inc["incident_id"] for inc in summary["recent_incidents"]] == [f"INC-{i}" for i in range(11, 1, -1)]
+        assert summary["recent_incidents"][0]["duration_minutes"] == 1.0
+
+    def test_open_incident_duration_uses_summary_time(self, page):
+        """Test open incidents are measured up to the summary timestamp."""
+        incident = page.create_incident("API errors", "Elevated 5xx rate")
+        incident.started_at -= 90
+
+        summary = page.get_status_summary()
+        expected = round((summary["timestamp"] - incident.started_at) / 60, 2)
+        assert summary["active_incidents"][0]["duration_minutes"] == expected
+
+    def test_status_endpoint_returns_summary(self):
+        """Test /status serves the encoded summary."""
+        from fastapi.testclient import TestClient
+        from status_page import app
+        response = TestClient(app).get("/status")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json()["overall_status"] == "operational"
+
+    def test_snapshot_reused_until_expired(self, page):
+        """Test the encoded snapshot is served until its TTL runs out."""
+        import json
+        import status_page
+        from status_page import ComponentStatus
+        snapshot = page.refresh_snapshot()
+        page.update_component_status("api", ComponentStatus.MAJOR_OUTAGE)
+        assert page.get_snapshot() is snapshot
+
+        page._snapshot = (page._snapshot[0] - status_page.SNAPSHOT_TTL, snapshot)
+        assert json.loads(page.get_snapshot())["overall_status"] == "major_outage"
+
+    def test_snapshot_warmed_on_startup(self, monkeypatch):
+        """Test the app builds the snapshot before serving requests."""
+        from fastapi.testclient import TestClient
+        import status_page
+        monkeypatch.setattr(status_page, "status_page", status_page.StatusPage())
+        with TestClient(status_page.app) as client:
+            snapshot = status_page.status_page._snapshot
+            assert snapshot is not None
+            assert client.get("/status").content == snapshot[1]
+
+
+@pytest.mark.unit
+class TestOverallStatus:
+    """Test overall status aggregation."""
+
+    def test_worst_component_status_wins(self, page):
+        """Test outages outrank degradation and maintenance."""
+        from status_page import ComponentStatus
+        assert page.get_overall_status() == ComponentStatus.OPERATIONAL
+        page.update_component_status("queue", ComponentStatus.MAINTENANCE)
+        assert page.get_overall_status() == ComponentStatus.MAINTENANCE
+        page.update_component_status("cameras", ComponentStatus.PARTIAL_OUTAGE)
+        page.update_component_status("api", ComponentStatus.DEGRADED)
+        assert page.get_overall_status() == ComponentStatus.PARTIAL_OUTAGE
+
+
+@pytest.mark.unit
+class TestIncidentUpdates:
+    """Test incident update history."""
+
+    def test_updates_encoded_as_objects(self, page, monkeypatch):
+        """Test updates serialize with their field names, with or without orjson."""
+        import json
+        import status_page
+        incident = page.create_incident("Camera offline", "Gate camera not responding")
+        incident.add_update("Power cycled the camera", "monitoring")
+        assert incident.status == "monitoring"
+
+        for use_orjson in (status_page.ORJSON_AVAILABLE, False):
+            monkeypatch.setattr(status_page, "ORJSON_AVAILABLE", use_orjson)
+            update = json.loads(page.get_status_json())["active_incidents"][0]["updates"][0]
+            assert update["message"] == "Power cycled the camera"
+            assert update["status"] == "monitoring"